@@ -0,0 +1,80 @@
+"""Calibrate the pre-grading thresholds on the grades in the grade cache.
+
+Run from the repository root, on the grade cache of a deployment:
+
+    python -m benchmarks.calibrate_grading --precision 0.95
+
+The grade cache keeps the vector score of each document graded by the LLM grader. The
+report has the `auto_accept_score` and `auto_reject_score` that agree with the grader
+on at least `--precision` of the documents they pre-grade, and the share of the graded
+documents each would have skipped. Collect the grades with both thresholds off (the
+default): once a tier is on, the documents it pre-grades are not graded by the LLM
+and the cache no longer has a sample of them.
+
+To try it offline, fill a grade cache with the end-to-end benchmark first:
+
+    python -m benchmarks.graph_e2e --config '{"grade_cache_enabled": true}'
+"""
+
+import argparse
+import json
+import sys
+
+from src.grant_writing_agent.cache import GradeCache, PersistentLRUCache
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.grading import calibrate_thresholds
+
+
+def calibrate(args: argparse.Namespace) -> dict:
+    cache = GradeCache(PersistentLRUCache(args.path, table="grades"))
+    graded = cache.scored_grades()
+    auto_accept_score, auto_reject_score = calibrate_thresholds(
+        graded, args.precision, args.min_documents
+    )
+
+    def share(pre_graded: int) -> float:
+        return round(pre_graded / len(graded), 3) if graded else 0.0
+
+    return {
+        "graded_documents": len(graded),
+        "relevant_documents": sum(is_relevant for _, is_relevant in graded),
+        "precision": args.precision,
+        "auto_accept_score": auto_accept_score,
+        "auto_reject_score": auto_reject_score,
+        "accepted_share": share(
+            0
+            if auto_accept_score is None
+            else sum(score >= auto_accept_score for score, _ in graded)
+        ),
+        "rejected_share": share(
+            0
+            if auto_reject_score is None
+            else sum(score <= auto_reject_score for score, _ in graded)
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--path",
+        default=Configuration.grade_cache_path,
+        help="SQLite file of the grade cache",
+    )
+    parser.add_argument("--precision", type=float, default=0.95)
+    parser.add_argument(
+        "--min-documents",
+        type=int,
+        default=50,
+        help="Graded documents a threshold is based on, at least",
+    )
+    args = parser.parse_args()
+
+    report = calibrate(args)
+    print(json.dumps(report, indent=2))
+    if not report["graded_documents"]:
+        sys.exit(f"No grade with a vector score in {args.path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""Checkpoint benchmark: bytes written per run with full vs slim `sections` updates.
+
+Run from the repository root:
+
+    python -m benchmarks.checkpoint_size --sections 5 10 20 --iterations 2
+
+Simulates the serial writing loop (generate_queries, retrieve_context and write_section
+for each section and search iteration) and serializes every state update the way the
+checkpointer does. With full updates each node writes the whole list of sections,
+so the bytes written grow quadratically with the number of sections; with slim
+updates (`slim_state_updates`) each node writes only the section it changed.
+"""
+
+import argparse
+import json
+import time
+
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from src.grant_writing_agent.state import ReplaceSections, Section, update_sections
+from src.grant_writing_agent.utils import compile_sections
+
+# Size of a simulated written section and of its retrieved chunk IDs
+SECTION_CONTENT_CHARS = 4_000
+DOCUMENTS_PER_SECTION = 15
+
+
+def make_sections(count: int) -> list[Section]:
+    return [
+        Section(
+            name=f"Section {i}",
+            description=f"Description of section {i}",
+            research=True,
+            content="",
+            is_written=False,
+            is_active=False,
+            search_queries=[],
+            documents=[],
+            source_str="",
+        )
+        for i in range(count)
+    ]
+
+
+def simulate_run(section_count: int, iterations: int, slim: bool) -> dict[str, float]:
+    """Serialize the state updates of one run and return the bytes and time spent."""
+    serde = JsonPlusSerializer()
+    sections: list[Section] = []
+    written = 0
+    elapsed = 0.0
+
+    def write(update: dict) -> None:
+        nonlocal sections, written, elapsed
+        start = time.perf_counter()
+        for value in update.values():
+            serialized = serde.dumps_typed(value)
+            serde.loads_typed(serialized)
+            written += len(serialized[1])
+        elapsed += time.perf_counter() - start
+        sections = update_sections(sections, update["sections"])
+
+    write({"sections": ReplaceSections(sections=make_sections(section_count))})
+
+    for index in range(section_count):
+        for _ in range(iterations):
+            # generate_queries, retrieve_context, then write_section
+            section = sections[index].model_copy()
+            write(
+                {"sections": [section] if slim else ReplaceSections(sections=sections)}
+            )
+
+            section = section.model_copy()
+            section.documents = [
+                f"{index:08x}{i:08x}" for i in range(DOCUMENTS_PER_SECTION)
+            ]
+            write(
+                {
+                    "sections": (
+                        [section]
+                        if slim
+                        else ReplaceSections(sections=_replace(sections, section))
+                    )
+                }
+            )
+
+            section = section.model_copy()
+            section.content = "x" * SECTION_CONTENT_CHARS
+            section.is_written = True
+            sections_after = _replace(sections, section)
+            update = {
+                "sections": (
+                    [section] if slim else ReplaceSections(sections=sections_after)
+                )
+            }
+            if not slim or index == section_count - 1:
+                update["final_grant_proposal"] = compile_sections(sections_after)
+            write(update)
+
+    return {"bytes": written, "serialize_ms": elapsed * 1000}
+
+
+def _replace(sections: list[Section], section: Section) -> list[Section]:
+    return [section if s.name == section.name else s for s in sections]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, nargs="+", default=[5, 10, 20])
+    parser.add_argument("--iterations", type=int, default=1)
+    args = parser.parse_args()
+
+    report = {}
+    for count in args.sections:
+        full = simulate_run(count, args.iterations, slim=False)
+        slim = simulate_run(count, args.iterations, slim=True)
+        report[f"{count} sections"] = {
+            "full": full,
+            "slim": slim,
+            "bytes_reduction": round(1 - slim["bytes"] / full["bytes"], 3),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
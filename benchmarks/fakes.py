@@ -0,0 +1,476 @@
+"""Deterministic local fakes of the chat models, embeddings, Atlas and Tavily.
+
+The fakes need no network access or credentials, and wait for a configurable latency
+to stand in for the remote calls. `install_fakes` wires them into the resource
+registry, so the compiled graph runs end to end against them.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, AsyncIterator, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import PrivateAttr
+
+from src.grant_writing_agent.resources import COLLECTION_NAME, DB_NAME
+
+WORDS = (
+    "climate water soil community farmers restoration funding training youth "
+    "women forest carbon health education impact monitoring budget partners "
+    "resilience energy solar harvest irrigation seedlings outreach evaluation"
+).split()
+
+
+@dataclass
+class FakeSettings:
+    """Shape of the fake workload and latency of the fake remote calls."""
+
+    sections: int = 5  # Number of sections planned
+    queries: int = 3  # Number of search queries per section
+    section_words: int = 400  # Length of a written section
+    relevance: float = 0.7  # Share of the graded documents found relevant
+    corpus_size: int = 500  # Number of client documents in the fake vector store
+    embedding_dims: int = 256
+    web_search: bool = True  # Whether the conversation calls the web search tool
+    llm_latency_ms: float = 200
+    embedding_latency_ms: float = 50
+    search_latency_ms: float = 20
+    web_search_latency_ms: float = 300
+    # Like OpenAI's automatic prompt caching: prefixes of at least this many tokens
+    # shared with an earlier prompt are cached, in blocks of `prompt_cache_block`
+    prompt_cache_min_tokens: int = 1024
+    prompt_cache_block: int = 128
+
+
+def _seed(text: str) -> int:
+    return int.from_bytes(hashlib.sha256(text.encode()).digest()[:8], "little")
+
+
+def fake_text(seed: str, words: int) -> str:
+    """Deterministic pseudo-random text of `words` words."""
+    rng = np.random.default_rng(_seed(seed))
+    return " ".join(WORDS[i] for i in rng.integers(0, len(WORDS), size=words))
+
+
+def _content(message: BaseMessage) -> str:
+    return message.content if isinstance(message.content, str) else str(message.content)
+
+
+class FakeChatModel(BaseChatModel):
+    """Chat model answering the graph's prompts with deterministic canned responses.
+
+    Structured outputs are answered with a tool call matching the requested schema, and
+    the conversation (the model bound to the graph tools) searches the web, looks up
+    the client and then hands over to the section writer, on every user message. Like
+    ChatOpenAI, streamed responses only report their token usage with `stream_usage`.
+    """
+
+    settings: FakeSettings
+    model_name: str = "fake"
+    stream_usage: bool = False
+    calls: int = 0
+    _prompts: list[str] = PrivateAttr(default_factory=list)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def bind_tools(self, tools, *, tool_choice: Optional[str] = None, **kwargs):
+        return self.bind(
+            tools=[convert_to_openai_tool(tool) for tool in tools],
+            tool_choice=tool_choice,
+            **kwargs,
+        )
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.settings.llm_latency_ms / 1000)
+        return self._respond(messages, **kwargs)
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, **kwargs
+    ) -> ChatResult:
+        await asyncio.sleep(self.settings.llm_latency_ms / 1000)
+        return self._respond(messages, **kwargs)
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, *, stream_usage=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.settings.llm_latency_ms / 1000)
+        message = self._respond(messages, **kwargs).generations[0].message
+
+        for word in re.findall(r"\S+\s*", _content(message)):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+        if message.tool_calls:
+            tool_call_chunks = [
+                {
+                    "name": call["name"],
+                    "args": json.dumps(call["args"]),
+                    "id": call["id"],
+                    "index": index,
+                }
+                for index, call in enumerate(message.tool_calls)
+            ]
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(content="", tool_call_chunks=tool_call_chunks)
+            )
+
+        # The usage comes in a last chunk, if asked for
+        if stream_usage if stream_usage is not None else self.stream_usage:
+            yield ChatGenerationChunk(
+                message=AIMessageChunk(
+                    content="", usage_metadata=message.usage_metadata
+                )
+            )
+
+    def _respond(
+        self,
+        messages: list[BaseMessage],
+        tools: Optional[list[dict]] = None,
+        tool_choice: Optional[str] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        self.calls += 1
+        prompt = "\n".join(_content(message) for message in messages)
+        tool_names = [tool["function"]["name"] for tool in tools or []]
+
+        if tool_choice and len(tool_names) == 1:
+            message = self._structured_output(tool_names[0], prompt)
+        elif tool_names:
+            message = self._conversation(messages)
+        else:
+            message = AIMessage(content=fake_text(prompt, self.settings.section_words))
+
+        completion = _content(message) + json.dumps(
+            [call["args"] for call in message.tool_calls]
+        )
+        message.usage_metadata = {
+            "input_tokens": len(prompt) // 4,
+            "output_tokens": len(completion) // 4,
+            "total_tokens": (len(prompt) + len(completion)) // 4,
+            "input_token_details": {"cache_read": self._cached_tokens(prompt)},
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _cached_tokens(self, prompt: str) -> int:
+        """Tokens of the longest prefix the prompt shares with one of the last prompts."""
+        shared = max(
+            (
+                len(os.path.commonprefix([prompt, previous]))
+                for previous in self._prompts
+            ),
+            default=0,
+        )
+        self._prompts = [*self._prompts[-255:], prompt]
+
+        tokens = shared // 4
+        if tokens < self.settings.prompt_cache_min_tokens:
+            return 0
+        return tokens - tokens % self.settings.prompt_cache_block
+
+    def _structured_output(self, schema: str, prompt: str) -> AIMessage:
+        if schema == "Sections":
+            args = {
+                "sections": [
+                    {
+                        "name": f"Section {i}",
+                        "description": fake_text(f"description {i}", 20),
+                        "research": True,
+                        "content": "",
+                        "is_written": False,
+                        "is_active": False,
+                        "search_queries": [],
+                        "documents": [],
+                        "source_str": "",
+                    }
+                    for i in range(self.settings.sections)
+                ]
+            }
+        elif schema == "Queries":
+            args = {
+                "queries": [
+                    {"search_query": fake_text(f"{prompt}{i}", 5)}
+                    for i in range(self.settings.queries)
+                ]
+            }
+        elif schema == "Feedback":
+            args = {"grade": "pass", "follow_up_queries": []}
+        elif schema == "GradeDocuments":
+            args = {"binary_score": self._grade(prompt)}
+        elif schema == "BatchGradeDocuments":
+            documents = re.findall(
+                r'<document index="(\d+)">(.*?)</document>', prompt, re.DOTALL
+            )
+            args = {
+                "scores": [
+                    {"index": int(index), "binary_score": self._grade(document)}
+                    for index, document in documents
+                ]
+            }
+        elif schema == "FundingRequirementsProjectIdea":
+            args = {
+                "project_idea": fake_text("project idea", 60),
+                "funding_requirements": fake_text("funding requirements", 60),
+            }
+        else:
+            raise ValueError(f"No fake response for the {schema} schema")
+
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": schema, "args": args, "id": f"call_{self.calls}"}],
+        )
+
+    def _grade(self, text: str) -> str:
+        relevant = _seed(text) % 1000 < self.settings.relevance * 1000
+        return "yes" if relevant else "no"
+
+    def _conversation(self, messages: list[BaseMessage]) -> AIMessage:
+        # Each user message starts the same script over
+        turn_start = max(
+            (i for i, message in enumerate(messages) if message.type == "human"),
+            default=0,
+        )
+        called = {
+            call["name"]
+            for message in messages[turn_start:]
+            if isinstance(message, AIMessage)
+            for call in message.tool_calls
+        }
+
+        if "generate_sections" in called:
+            return AIMessage(content=fake_text(f"reply {len(messages)}", 40))
+
+        if self.settings.web_search and not called:
+            tool_calls = [
+                {"name": "tavily_search", "args": {"query": "grant funders"}},
+                {"name": "retrieve_client_info", "args": {"query": "client mission"}},
+            ]
+        else:
+            tool_calls = [
+                {
+                    "name": "generate_sections",
+                    "args": {"transfer_message": "Write the grant proposal"},
+                }
+            ]
+        return AIMessage(
+            content="",
+            tool_calls=[
+                {**call, "id": f"call_{self.calls}_{i}"}
+                for i, call in enumerate(tool_calls)
+            ],
+        )
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic unit vectors seeded by the text."""
+
+    def __init__(self, settings: FakeSettings):
+        self.settings = settings
+        self.calls = 0
+
+    def _embed(self, text: str) -> list[float]:
+        rng = np.random.default_rng(_seed(text))
+        vector = rng.standard_normal(self.settings.embedding_dims)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        time.sleep(self.settings.embedding_latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        await asyncio.sleep(self.settings.embedding_latency_ms / 1000)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+def _matches(document: dict[str, Any], query: dict[str, Any]) -> bool:
+    """Whether a document matches a MongoDB filter ($and, $or, $eq, $ne, $in, $nin)."""
+    for key, condition in query.items():
+        if key == "$and":
+            if not all(_matches(document, sub_query) for sub_query in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(document, sub_query) for sub_query in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = document.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq" and value != operand:
+                    return False
+                if operator == "$ne" and value == operand:
+                    return False
+                if operator == "$in" and value not in operand:
+                    return False
+                if operator == "$nin" and value in operand:
+                    return False
+        elif document.get(key) != condition:
+            return False
+    return True
+
+
+class FakeAsyncCollection:
+    """In-memory collection answering `$vectorSearch` aggregations like Atlas.
+
+    Also answers the `find` and `$match`/`$group` (count and max `_id`) queries used to
+    read and fingerprint a client's documents.
+    """
+
+    def __init__(self, documents: list[dict[str, Any]], settings: FakeSettings):
+        self.settings = settings
+        self.documents = documents
+        self.embeddings = np.array([doc["embedding"] for doc in documents])
+        self.queries = 0
+
+    async def aggregate(self, pipeline: list[dict[str, Any]]) -> AsyncIterator[dict]:
+        self.queries += 1
+        await asyncio.sleep(self.settings.search_latency_ms / 1000)
+
+        if "$match" in pipeline[0]:
+            matched = [
+                doc for doc in self.documents if _matches(doc, pipeline[0]["$match"])
+            ]
+            if matched:
+                yield {
+                    "_id": None,
+                    "count": len(matched),
+                    "last_id": max(doc["_id"] for doc in matched),
+                }
+            return
+
+        vector_search = pipeline[0]["$vectorSearch"]
+        candidates = [
+            index
+            for index, document in enumerate(self.documents)
+            if _matches(document, vector_search.get("filter", {}))
+        ]
+        scores = self.embeddings[candidates] @ np.array(vector_search["queryVector"])
+        best = np.argsort(-scores)[: vector_search["limit"]]
+
+        for position in best:
+            document = dict(self.documents[candidates[position]])
+            document.pop("embedding")
+            # Atlas normalizes cosine similarities to [0, 1]
+            document["score"] = float((1 + scores[position]) / 2)
+            yield document
+
+    async def find(self, query: dict[str, Any]) -> AsyncIterator[dict]:
+        self.queries += 1
+        await asyncio.sleep(self.settings.search_latency_ms / 1000)
+        for document in self.documents:
+            if _matches(document, query):
+                yield dict(document)
+
+
+class FakeAsyncMongoClient:
+    """Stand-in for the Motor client, serving the vector store collection."""
+
+    def __init__(self, collection: FakeAsyncCollection):
+        self.collection = collection
+
+    def __getitem__(self, db_name: str):
+        if db_name != DB_NAME:
+            raise KeyError(db_name)
+        return {COLLECTION_NAME: self.collection}
+
+
+def make_corpus(
+    settings: FakeSettings, embeddings: FakeEmbeddings, client_id: str
+) -> list[dict[str, Any]]:
+    """Create the client documents of the fake vector store."""
+    documents = []
+    for i in range(settings.corpus_size):
+        text = fake_text(f"chunk {i}", 120)
+        documents.append(
+            {
+                "_id": f"{i:024x}",
+                "text": text,
+                "embedding": embeddings._embed(text),
+                "client_id": client_id,
+                "document_id": f"document-{i % 10}",
+            }
+        )
+    return documents
+
+
+def write_fake_local_index(fakes: "Fakes", root: str, client_id: str) -> None:
+    """Write the fake client documents to a local index under `root`."""
+    from src.grant_writing_agent.local_index import write_local_index
+
+    write_local_index(Path(root) / client_id, fakes.collection.documents)
+
+
+class FakeTavilySearch:
+    """Stand-in for the Tavily search tool."""
+
+    def __init__(self, max_results: int, settings: FakeSettings):
+        self.max_results = max_results
+        self.settings = settings
+
+    async def ainvoke(self, input: dict[str, Any]) -> list[dict[str, Any]]:
+        await asyncio.sleep(self.settings.web_search_latency_ms / 1000)
+        return [
+            {
+                "title": fake_text(f"title {input['query']} {i}", 5),
+                "url": f"https://example.org/{_seed(input['query']) % 1000}/{i}",
+                "content": fake_text(f"{input['query']} {i}", 80),
+                "score": 0.9 - i / 100,
+                "raw_content": fake_text(f"page {input['query']} {i}", 2000),
+            }
+            for i in range(self.max_results)
+        ]
+
+
+@dataclass
+class Fakes:
+    settings: FakeSettings
+    embeddings: FakeEmbeddings
+    collection: FakeAsyncCollection
+
+    def chat_models(self) -> list[FakeChatModel]:
+        from src.grant_writing_agent.models import _models
+
+        return [model for model in _models.values() if isinstance(model, FakeChatModel)]
+
+
+def install_fakes(settings: FakeSettings, client_id: str) -> Fakes:
+    """Replace the chat models, embeddings, Atlas and Tavily with local fakes."""
+    from src.grant_writing_agent.models import clear_model_cache
+    from src.grant_writing_agent.resources import registry
+
+    embeddings = FakeEmbeddings(settings)
+    collection = FakeAsyncCollection(
+        make_corpus(settings, embeddings, client_id), settings
+    )
+
+    registry.override(
+        "chat_model_factory",
+        lambda provider, model, params: FakeChatModel(
+            settings=settings, stream_usage=params.get("stream_usage", False)
+        ),
+    )
+    registry.override("embeddings", embeddings)
+    registry.override("async_mongo_client", FakeAsyncMongoClient(collection))
+    registry.override(
+        "tavily_search_factory",
+        lambda max_results: FakeTavilySearch(max_results, settings),
+    )
+    clear_model_cache()
+
+    return Fakes(settings=settings, embeddings=embeddings, collection=collection)
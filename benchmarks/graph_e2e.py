@@ -0,0 +1,210 @@
+"""End-to-end benchmark: run the compiled graph against local fakes.
+
+Run from the repository root (no network access or credentials needed):
+
+    python -m benchmarks.graph_e2e --sections 5 --queries 3 --docs 5 --runs 3
+
+Each run is a full conversation: the assistant searches the web and the client
+documents, then plans the sections, and researches, grades and writes each one. The
+chat models, embeddings, Atlas vector search and Tavily are the deterministic fakes of
+`benchmarks.fakes`, with the given latencies; `--backend local` searches a local index
+of the fake client documents instead of the fake Atlas, and `--backend snapshot` an
+in-memory snapshot read from the fake Atlas. Latency is measured over `--runs` runs
+and peak memory (tracemalloc) over one extra run, since tracing slows the graph down.
+
+Tokens are estimated unless TIKTOKEN_CACHE_DIR has the tiktoken encodings, so the
+benchmark never waits for a download.
+
+Pass the `--max-*` options to fail (exit code 1) when a budget is exceeded, e.g. to gate
+performance regressions in CI.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from benchmarks.fakes import FakeSettings, install_fakes, write_fake_local_index
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.context import OFFLINE_ENV_VAR
+from src.grant_writing_agent.graph import builder
+from src.grant_writing_agent.metrics import cached_prompt_ratios, recorder
+
+
+async def run_graph(graph, configurable: dict, sections: int) -> dict:
+    """Run one conversation through the graph and return its counters."""
+    config = {
+        "configurable": {**configurable, "thread_id": str(uuid.uuid4())},
+        "recursion_limit": 20 * sections + 50,
+    }
+
+    recorder.reset()
+    start = time.perf_counter()
+    await graph.ainvoke(
+        {"messages": [HumanMessage(content="Help me write a grant proposal")]}, config
+    )
+    latency = time.perf_counter() - start
+
+    state = (await graph.aget_state(config)).values
+    written = sum(section.is_written for section in state.get("sections", []))
+    if written != sections:
+        raise RuntimeError(f"Only {written} of {sections} sections were written")
+
+    summary = recorder.summary()
+    totals = {}
+    for counters in summary["nodes"].values():
+        for metric, value in counters.items():
+            totals[metric] = totals.get(metric, 0) + value
+    if totals.get("llm_calls_without_usage"):
+        raise RuntimeError(
+            f"{int(totals['llm_calls_without_usage'])} LLM calls reported no token "
+            "usage, their tokens and cost are not counted"
+        )
+
+    return {
+        "latency_seconds": latency,
+        "llm_calls": int(totals.get("llm_calls", 0)),
+        "grading_calls": int(totals.get("grading_calls", 0)),
+        "grading_calls_skipped": int(totals.get("grading_calls_skipped", 0)),
+        "grade_cache_hits": int(totals.get("grade_cache_hits", 0)),
+        "vector_queries": int(totals.get("vector_queries", 0)),
+        "prompt_tokens": int(totals.get("prompt_tokens", 0)),
+        "cached_prompt_tokens": int(totals.get("cached_prompt_tokens", 0)),
+        "completion_tokens": int(totals.get("completion_tokens", 0)),
+        "node_seconds": {
+            node: round(counters.get("wall_seconds", 0), 4)
+            for node, counters in summary["nodes"].items()
+        },
+        "node_cached_prompt_ratio": {
+            node: round(ratio, 3)
+            for node, ratio in cached_prompt_ratios(summary["nodes"]).items()
+        },
+    }
+
+
+async def benchmark(args: argparse.Namespace) -> dict:
+    settings = FakeSettings(
+        sections=args.sections,
+        queries=args.queries,
+        corpus_size=args.corpus_size,
+        web_search=not args.no_web_search,
+        llm_latency_ms=args.llm_latency_ms,
+        embedding_latency_ms=args.embedding_latency_ms,
+        search_latency_ms=args.search_latency_ms,
+        web_search_latency_ms=args.web_search_latency_ms,
+    )
+    client_id = Configuration().client_id
+    fakes = install_fakes(settings, client_id)
+    index_root = tempfile.mkdtemp(prefix="vector_index-")
+    if args.backend == "local":
+        write_fake_local_index(fakes, index_root, client_id)
+
+    graph = builder.compile(checkpointer=MemorySaver())
+    configurable = {
+        "client_id": client_id,
+        "number_of_queries": args.queries,
+        "max_vector_results": args.docs,
+        "parallel_section_writing": args.parallel,
+        "grade_cache_enabled": False,
+        "web_search_cache_enabled": False,
+        "retrieval_backend": args.backend,
+        "local_index_path": index_root,
+        **json.loads(args.config),
+    }
+
+    runs = [
+        await run_graph(graph, configurable, args.sections) for _ in range(args.runs)
+    ]
+
+    tracemalloc.start()
+    await run_graph(graph, configurable, args.sections)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = [run["latency_seconds"] for run in runs]
+    return {
+        "workload": {
+            "sections": args.sections,
+            "queries": args.queries,
+            "docs": args.docs,
+            "corpus_size": args.corpus_size,
+            "parallel": args.parallel,
+            "backend": args.backend,
+        },
+        "latency_seconds": {
+            "median": statistics.median(latencies),
+            "min": min(latencies),
+            "max": max(latencies),
+        },
+        "peak_memory_mb": peak / 2**20,
+        **{key: value for key, value in runs[-1].items() if key != "latency_seconds"},
+    }
+
+
+def check_budgets(report: dict, args: argparse.Namespace) -> list[str]:
+    """Get the budgets exceeded by the benchmark."""
+    exceeded = []
+    if args.max_latency_seconds and (
+        report["latency_seconds"]["median"] > args.max_latency_seconds
+    ):
+        exceeded.append(
+            f"median latency {report['latency_seconds']['median']:.2f}s"
+            f" > {args.max_latency_seconds}s"
+        )
+    if args.max_llm_calls and report["llm_calls"] > args.max_llm_calls:
+        exceeded.append(f"{report['llm_calls']} LLM calls > {args.max_llm_calls}")
+    if args.max_peak_memory_mb and report["peak_memory_mb"] > args.max_peak_memory_mb:
+        exceeded.append(
+            f"peak memory {report['peak_memory_mb']:.1f}MB"
+            f" > {args.max_peak_memory_mb}MB"
+        )
+    return exceeded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sections", type=int, default=5, help="Sections planned")
+    parser.add_argument("--queries", type=int, default=3, help="Queries per section")
+    parser.add_argument("--docs", type=int, default=5, help="Documents per query")
+    parser.add_argument("--corpus-size", type=int, default=500)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--parallel", action="store_true", help="Draft in parallel")
+    parser.add_argument("--no-web-search", action="store_true")
+    parser.add_argument(
+        "--backend", choices=["atlas", "local", "snapshot"], default="atlas"
+    )
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--embedding-latency-ms", type=float, default=50)
+    parser.add_argument("--search-latency-ms", type=float, default=20)
+    parser.add_argument("--web-search-latency-ms", type=float, default=300)
+    parser.add_argument(
+        "--config", default="{}", help="JSON of extra configurable values"
+    )
+    parser.add_argument("--max-latency-seconds", type=float)
+    parser.add_argument("--max-llm-calls", type=int)
+    parser.add_argument("--max-peak-memory-mb", type=float)
+    args = parser.parse_args()
+
+    if "TIKTOKEN_CACHE_DIR" not in os.environ:
+        os.environ.setdefault(OFFLINE_ENV_VAR, "1")
+
+    report = asyncio.run(benchmark(args))
+    print(json.dumps(report, indent=2))
+
+    exceeded = check_budgets(report, args)
+    if exceeded:
+        print("Budget exceeded: " + "; ".join(exceeded), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+"""Microbenchmark: render time and size of the prompts.
+
+Run from the repository root:
+
+    python -m benchmarks.prompt_render --turns 10 --iterations 2000
+
+Compares `str.format` on the raw templates with the parsed templates of
+`src.grant_writing_agent.templates` (`render`, and `render_static` for the parts of
+the prompts repeated across calls), and the `repr` of a conversation, which the
+project idea extraction prompt used to quote, with `format_conversation`.
+"""
+
+import argparse
+import json
+import time
+import uuid
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from benchmarks.fakes import fake_text
+from src.grant_writing_agent import prompts
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.templates import format_conversation, get_template
+
+
+def make_conversation(turns: int) -> list:
+    """A funding research chat: each turn searches the web and answers."""
+    messages = []
+    for turn in range(turns):
+        call_id = f"call_{uuid.uuid4().hex[:24]}"
+        results = [
+            {
+                "url": f"https://example.org/{turn}/{i}",
+                "content": fake_text(f"result {turn} {i}", 80),
+            }
+            for i in range(5)
+        ]
+        metadata = {
+            "token_usage": {"prompt_tokens": 1200, "completion_tokens": 80},
+            "model_name": "gpt-4o-mini-2024-07-18",
+            "finish_reason": "tool_calls",
+        }
+        messages += [
+            HumanMessage(content=fake_text(f"question {turn}", 30)),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "tavily_search",
+                        "args": {"query": fake_text(f"query {turn}", 6)},
+                        "id": call_id,
+                    }
+                ],
+                response_metadata=metadata,
+                id=str(uuid.uuid4()),
+            ),
+            ToolMessage(
+                content=json.dumps(results),
+                name="tavily_search",
+                tool_call_id=call_id,
+                id=str(uuid.uuid4()),
+            ),
+            AIMessage(
+                content=fake_text(f"answer {turn}", 60),
+                response_metadata={**metadata, "finish_reason": "stop"},
+                id=str(uuid.uuid4()),
+            ),
+        ]
+    return messages
+
+
+def time_per_call(function, iterations: int) -> float:
+    """Average time of a call of `function`, in microseconds."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        function()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def benchmark_template(name: str, values: dict, iterations: int) -> dict:
+    raw = getattr(prompts, name)
+    template = get_template(name)
+    rendered = template.render(**values)
+    assert rendered == raw.format(**values)
+    return {
+        "chars": len(rendered),
+        "str_format_us": time_per_call(lambda: raw.format(**values), iterations),
+        "render_us": time_per_call(lambda: template.render(**values), iterations),
+        "render_static_us": time_per_call(
+            lambda: template.render_static(**values), iterations
+        ),
+    }
+
+
+def benchmark_conversation(turns: int, iterations: int) -> dict:
+    messages = make_conversation(turns)
+    template = get_template("extract_project_idea_and_funding_requirements_prompt")
+    return {
+        "messages": len(messages),
+        "repr_prompt_chars": len(
+            template.render(conversation=messages, user_name="Jane")
+        ),
+        "compact_prompt_chars": len(
+            template.render(
+                conversation=format_conversation(messages), user_name="Jane"
+            )
+        ),
+        "repr_us": time_per_call(lambda: str(messages), iterations),
+        "compact_us": time_per_call(lambda: format_conversation(messages), iterations),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--turns", type=int, default=10, help="Turns of the chat")
+    parser.add_argument("--iterations", type=int, default=2000)
+    args = parser.parse_args()
+
+    configurable = Configuration()
+    static_values = {
+        "gather_prompt": {
+            "client_name": configurable.client_name,
+            "about_client": configurable.about_client,
+        },
+        "report_planner_instructions": {
+            "client_name": configurable.client_name,
+            "about_client": configurable.about_client,
+            "grant_proposal_structure": configurable.grant_proposal_structure,
+            "number_of_queries": configurable.number_of_queries,
+        },
+        "section_writer_instructions": {
+            "client_name": configurable.client_name,
+            "grant_proposal_structure": configurable.grant_proposal_structure,
+        },
+    }
+
+    report = {
+        "templates": {
+            name: benchmark_template(name, values, args.iterations)
+            for name, values in static_values.items()
+        },
+        "conversation": benchmark_conversation(args.turns, args.iterations // 10),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""Scraping benchmark: scrape pages served by a local HTTP server.
+
+Run from the repository root (no network access needed):
+
+    python -m benchmarks.scraping --pages 10 --hosts 2 --latency-ms 300
+
+The local server serves funder-like pages (navigation, header, footer, scripts and
+an article) with a latency, and answers conditional requests with a 304 when the
+page's ETag matches. Each page is scraped three times: cold, from the fresh cache,
+and revalidated once the cache is stale. The report has the time of each pass, the
+requests the server saw, its maximum concurrent requests per host, and the size of
+the pages before and after boilerplate stripping. The benchmark fails if a fresh page
+is requested, a stale one is not revalidated, or a host gets too many requests at once;
+the behaviour itself is tested in `tests/test_scraping.py`.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.fakes import fake_text
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.scraping import ascrape_pages
+
+
+def make_page(path: str, words: int) -> bytes:
+    """A funder page: the article among the usual boilerplate."""
+    return f"""<!doctype html>
+<html><head><title>Funding call {path}</title>
+<style>body {{ font-family: sans-serif; }}</style>
+<script>window.analytics = {json.dumps(fake_text(path, 200))};</script></head>
+<body>
+<header><nav>{" | ".join(fake_text(f"menu {i}", 2) for i in range(30))}</nav></header>
+<aside>{fake_text(f"sidebar {path}", 150)}</aside>
+<main><article><h1>Funding call {path}</h1>
+{"".join(f"<p>{fake_text(f'{path} {i}', words // 10)}</p>" for i in range(10))}
+</article></main>
+<footer>{fake_text(f"footer {path}", 100)}</footer>
+</body></html>""".encode()
+
+
+class FixtureServer:
+    """Local HTTP server counting the requests it serves."""
+
+    def __init__(self, words: int, latency_seconds: float):
+        self.requests = 0
+        self.not_modified = 0
+        self.bytes_sent = 0
+        self.active: dict[str, int] = {}
+        self.max_active: dict[str, int] = {}
+        self._lock = threading.Lock()
+        fixture = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                host = self.headers.get("Host", "")
+                with fixture._lock:
+                    fixture.requests += 1
+                    fixture.active[host] = fixture.active.get(host, 0) + 1
+                    fixture.max_active[host] = max(
+                        fixture.max_active.get(host, 0), fixture.active[host]
+                    )
+                try:
+                    time.sleep(latency_seconds)
+                    body = make_page(self.path, words)
+                    etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+                    if self.headers.get("If-None-Match") == etag:
+                        with fixture._lock:
+                            fixture.not_modified += 1
+                        self.send_response(304)
+                        self.send_header("ETag", etag)
+                        self.end_headers()
+                        return
+
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/html; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    self.wfile.write(body)
+                    with fixture._lock:
+                        fixture.bytes_sent += len(body)
+                finally:
+                    with fixture._lock:
+                        fixture.active[host] -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+
+
+async def timed_scrape(urls: list[str], configurable: Configuration) -> tuple:
+    start = time.perf_counter()
+    pages = await ascrape_pages(urls, configurable)
+    return pages, time.perf_counter() - start
+
+
+async def benchmark(args: argparse.Namespace) -> dict:
+    fixture = FixtureServer(args.words, args.latency_ms / 1000)
+    # Two host names of the same server, to exercise the per-host limit
+    hosts = ["127.0.0.1", "localhost"][: args.hosts]
+    urls = [
+        f"http://{hosts[i % len(hosts)]}:{fixture.port}/call-{i}"
+        for i in range(args.pages)
+    ]
+    configurable = Configuration(
+        scrape_cache_path=tempfile.mkdtemp(prefix="page_cache-") + "/pages.sqlite",
+        scrape_max_concurrent_per_host=args.per_host,
+    )
+
+    try:
+        cold, cold_seconds = await timed_scrape(urls, configurable)
+        cold_requests = fixture.requests
+        _, fresh_seconds = await timed_scrape(urls, configurable)
+        fresh_requests = fixture.requests - cold_requests
+
+        configurable.scrape_cache_fresh_seconds = 0
+        revalidated, revalidated_seconds = await timed_scrape(urls, configurable)
+    finally:
+        fixture.close()
+
+    errors = [page.error for page in cold + revalidated if page.error]
+    if errors:
+        raise RuntimeError(f"Scraping failed: {errors}")
+    if fresh_requests:
+        raise RuntimeError(f"{fresh_requests} requests for pages in the fresh cache")
+    if fixture.not_modified != len(urls):
+        raise RuntimeError(
+            f"{fixture.not_modified} of {len(urls)} stale pages were revalidated"
+        )
+    if max(fixture.max_active.values()) > args.per_host:
+        raise RuntimeError(
+            f"Over {args.per_host} requests per host: {fixture.max_active}"
+        )
+
+    return {
+        "workload": {
+            "pages": args.pages,
+            "hosts": len(hosts),
+            "latency_ms": args.latency_ms,
+            "max_concurrent_per_host": args.per_host,
+        },
+        "cold_seconds": cold_seconds,
+        "fresh_cache_seconds": fresh_seconds,
+        "revalidated_seconds": revalidated_seconds,
+        "requests": {
+            "cold": cold_requests,
+            "fresh_cache": fresh_requests,
+            "not_modified": fixture.not_modified,
+        },
+        "max_active_requests_per_host": fixture.max_active,
+        "page_bytes": fixture.bytes_sent // args.pages,
+        "page_text_chars": sum(len(page.text) for page in cold) // args.pages,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", type=int, default=10, help="URLs scraped at once")
+    parser.add_argument("--hosts", type=int, choices=[1, 2], default=2)
+    parser.add_argument("--words", type=int, default=1000, help="Words per article")
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--per-host", type=int, default=2)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(benchmark(args)), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""Startup benchmark: graph import time and cold-start time of the shared resources.
+
+Run from the repository root:
+
+    python -m benchmarks.startup --runs 5
+
+Import time is measured in fresh interpreters, so it includes every module the graph
+pulls in at import time. Cold-start times are those recorded by the resource
+registry when each resource is first used (no network call is made).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import src.grant_writing_agent.graph
+print(time.perf_counter() - start)
+"""
+
+
+def measure_import_time(runs: int) -> list[float]:
+    """Import the graph in `runs` fresh interpreters and return the import times."""
+    env = {**os.environ}
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-W", "ignore", "-c", IMPORT_SNIPPET],
+            capture_output=True,
+            text=True,
+            check=True,
+            env=env,
+        ).stdout
+        timings.append(float(output.strip().splitlines()[-1]))
+    return timings
+
+
+def measure_cold_start() -> dict[str, float]:
+    """Create every shared resource once and return the registry's cold-start report."""
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    from src.grant_writing_agent.configuration import Configuration
+    from src.grant_writing_agent.models import get_planner_model, get_writer_model
+    from src.grant_writing_agent.resources import (
+        registry,
+        get_mongo_client,
+        get_embeddings,
+    )
+
+    start = time.perf_counter()
+    get_mongo_client()
+    get_embeddings()
+    get_writer_model(Configuration())
+    get_planner_model(Configuration())
+    report = registry.cold_start_report()
+    report["total"] = time.perf_counter() - start
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="Number of fresh imports")
+    args = parser.parse_args()
+
+    import_times = measure_import_time(args.runs)
+    report = {
+        "import_seconds": {
+            "median": statistics.median(import_times),
+            "min": min(import_times),
+            "max": max(import_times),
+        },
+        "cold_start_seconds": measure_cold_start(),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Iterable, Optional, Union
+
+CacheValue = Union[str, bytes]
+
+
+# Number of keys looked up per SQLite query
+READ_BATCH_SIZE = 500
+
+
+class PersistentLRUCache:
+    """In-memory LRU cache backed by an optional SQLite table.
+
+    Entries expire after `ttl_seconds` (if set). The memory tier keeps at most
+    `max_memory_entries` entries and the SQLite tier at most `max_entries`, the least
+    recently used entries being evicted first. Hits and misses are counted so callers
+    can report how much work the cache saved.
+
+    Writes, and the access times of the hits (memory hits included, so eviction follows
+    the actual use), are kept in memory until `flush`, which writes them to SQLite in a
+    single transaction. Async callers look up with `aget`/`aget_many` and write with
+    `aflush` at the end of each pass, so the SQLite I/O runs outside the event loop.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        table: str = "cache",
+        max_entries: int = 100_000,
+        max_memory_entries: int = 10_000,
+        ttl_seconds: Optional[float] = None,
+    ):
+        self.path = path
+        self.table = table
+        self.max_entries = max_entries
+        self.max_memory_entries = max_memory_entries
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+
+        self._memory: OrderedDict[str, tuple[CacheValue, Optional[float]]] = (
+            OrderedDict()
+        )
+        # Writes and access times not flushed to SQLite yet
+        self._pending: dict[str, tuple[CacheValue, Optional[float], float]] = {}
+        self._accessed: dict[str, float] = {}
+        self._expired: set[str] = set()
+        self._lock = threading.Lock()  # Guards the memory tier and the pending writes
+        self._connection = None
+        self._connection_lock = threading.Lock()
+
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False)
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "key TEXT PRIMARY KEY, value BLOB, expires_at REAL, accessed_at REAL)"
+            )
+            self._connection.execute(
+                f"CREATE INDEX IF NOT EXISTS {table}_accessed_at ON {table} (accessed_at)"
+            )
+            self._connection.commit()
+
+    def get(self, key: str) -> Optional[CacheValue]:
+        """Get a value from the cache, or None if it is missing or expired."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: Iterable[str]) -> dict[str, CacheValue]:
+        """Get the values of the keys found in the cache (and not expired)."""
+        found, missing = self._get_from_memory(keys)
+        if missing:
+            found.update(self._get_from_disk(missing))
+        return found
+
+    async def aget(self, key: str) -> Optional[CacheValue]:
+        """Get a value from the cache, reading SQLite outside of the event loop."""
+        return (await self.aget_many([key])).get(key)
+
+    async def aget_many(self, keys: Iterable[str]) -> dict[str, CacheValue]:
+        """Get the values of the keys found in the cache, reading SQLite in a thread."""
+        found, missing = self._get_from_memory(keys)
+        if missing:
+            found.update(await asyncio.to_thread(self._get_from_disk, missing))
+        return found
+
+    def set(self, key: str, value: CacheValue) -> None:
+        """Store a value in the memory tier, and in SQLite on the next `flush`."""
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        with self._lock:
+            self._remember(key, value, expires_at)
+            if self._connection is not None:
+                self._pending[key] = (value, expires_at, now)
+                self._accessed.pop(key, None)
+                self._expired.discard(key)
+
+    def flush(self) -> None:
+        """Write the pending values and access times to SQLite in one transaction."""
+        if self._connection is None:
+            return
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            accessed, self._accessed = self._accessed, {}
+            expired, self._expired = self._expired, set()
+        if not (pending or accessed or expired):
+            return
+
+        with self._connection_lock, self._connection:
+            self._connection.executemany(
+                f"DELETE FROM {self.table} WHERE key = ? AND expires_at <= ?",
+                [(key, time.time()) for key in expired],
+            )
+            self._connection.executemany(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(key, *entry) for key, entry in pending.items()],
+            )
+            self._connection.executemany(
+                f"UPDATE {self.table} SET accessed_at = MAX(accessed_at, ?) WHERE key = ?",
+                [(accessed_at, key) for key, accessed_at in accessed.items()],
+            )
+            if pending:
+                # Evict the least recently used entries beyond the size bound
+                self._connection.execute(
+                    f"DELETE FROM {self.table} WHERE key IN ("
+                    f"SELECT key FROM {self.table} ORDER BY accessed_at ASC "
+                    f"LIMIT MAX(0, (SELECT COUNT(*) FROM {self.table}) - ?))",
+                    (self.max_entries,),
+                )
+
+    async def aflush(self) -> None:
+        """Write the pending values and access times to SQLite, in a thread."""
+        if self._pending or self._accessed or self._expired:
+            await asyncio.to_thread(self.flush)
+
+    def values(self) -> list[CacheValue]:
+        """Get all the values of the cache that are not expired (flushed first)."""
+        if self._connection is None:
+            now = time.time()
+            with self._lock:
+                return [
+                    value
+                    for value, expires_at in self._memory.values()
+                    if expires_at is None or expires_at > now
+                ]
+
+        self.flush()
+        with self._connection_lock:
+            rows = self._connection.execute(
+                f"SELECT value FROM {self.table} "
+                "WHERE expires_at IS NULL OR expires_at > ?",
+                (time.time(),),
+            ).fetchall()
+        return [value for (value,) in rows]
+
+    def stats(self) -> dict[str, int]:
+        """Get the hit and miss counters of the cache."""
+        return {"hits": self.hits, "misses": self.misses, "size": len(self._memory)}
+
+    def _get_from_memory(
+        self, keys: Iterable[str]
+    ) -> tuple[dict[str, CacheValue], list[str]]:
+        """Get the values found in the memory tier, and the keys to look up on disk."""
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for key in keys:
+                entry = self._memory.get(key)
+                if entry is None and key in self._pending:
+                    # Evicted from memory before it was flushed
+                    entry = self._pending[key][:2]
+                if entry is not None:
+                    value, expires_at = entry
+                    if expires_at is None or expires_at > now:
+                        self._remember(key, value, expires_at)
+                        self._touch(key, now)
+                        self.hits += 1
+                        found[key] = value
+                        continue
+                    self._memory.pop(key, None)
+
+                if self._connection is None:
+                    self.misses += 1
+                elif key not in missing:
+                    missing.append(key)
+        return found, missing
+
+    def _get_from_disk(self, keys: list[str]) -> dict[str, CacheValue]:
+        """Get the values of keys missing from the memory tier from SQLite."""
+        rows = []
+        with self._connection_lock:
+            for start in range(0, len(keys), READ_BATCH_SIZE):
+                batch = keys[start : start + READ_BATCH_SIZE]
+                rows += self._connection.execute(
+                    f"SELECT key, value, expires_at FROM {self.table} "
+                    f"WHERE key IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key, value, expires_at in rows:
+                if expires_at is None or expires_at > now:
+                    self._remember(key, value, expires_at)
+                    self._touch(key, now)
+                    found[key] = value
+                else:
+                    self._expired.add(key)
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def _touch(self, key: str, now: float) -> None:
+        """Record the access time of a hit, written to SQLite on the next flush."""
+        if key in self._pending:
+            self._pending[key] = (*self._pending[key][:2], now)
+        elif self._connection is not None:
+            self._accessed[key] = now
+
+    def _remember(
+        self, key: str, value: CacheValue, expires_at: Optional[float]
+    ) -> None:
+        """Store a value in the memory tier, evicting the least recently used entries."""
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+
+def normalize_text(text: str) -> str:
+    """Normalize text for use in cache keys (case and whitespace insensitive)."""
+    return " ".join(text.lower().split())
+
+
+class GradeCache:
+    """Cache of document relevance grades keyed by (query, document, grader model).
+
+    Grades are stored as "yes" or "no", followed by the vector score of the document
+    when it is known, so the pre-grading thresholds can be calibrated on them (see
+    `scored_grades`).
+    """
+
+    def __init__(self, cache: PersistentLRUCache):
+        self.cache = cache
+
+    @staticmethod
+    def key(question: str, document: str, model_name: str) -> str:
+        """Hash the normalized question, the document content and the grader model name."""
+        return hashlib.sha256(
+            "\0".join([normalize_text(question), document, model_name]).encode()
+        ).hexdigest()
+
+    def get(self, question: str, document: str, model_name: str) -> Optional[bool]:
+        """Get the cached grade of a document, or None if it was never graded."""
+        value = self.cache.get(self.key(question, document, model_name))
+        if value is None:
+            return None
+        return _is_relevant(value)
+
+    async def aget_many(
+        self, candidates: list[tuple[str, str]], model_name: str
+    ) -> list[Optional[bool]]:
+        """Get the cached grades of (question, document) pairs, None if never graded."""
+        keys = [
+            self.key(question, document, model_name)
+            for question, document in candidates
+        ]
+        values = await self.cache.aget_many(keys)
+        return [_is_relevant(values[key]) if key in values else None for key in keys]
+
+    def set(
+        self,
+        question: str,
+        document: str,
+        model_name: str,
+        is_relevant: bool,
+        score: Optional[float] = None,
+    ) -> None:
+        """Cache the grade of a document (written to disk on `aflush`)."""
+        value = "yes" if is_relevant else "no"
+        if score is not None:
+            value += f" {score:.6f}"
+        self.cache.set(self.key(question, document, model_name), value)
+
+    def scored_grades(self) -> list[tuple[float, bool]]:
+        """Get the (vector score, grade) of the cached grades stored with a score."""
+        graded = []
+        for value in self.cache.values():
+            parts = _text(value).split()
+            if len(parts) == 2:
+                graded.append((float(parts[1]), parts[0] == "yes"))
+        return graded
+
+    async def aflush(self) -> None:
+        """Write the new grades to disk, outside of the event loop."""
+        await self.cache.aflush()
+
+    def stats(self) -> dict[str, int]:
+        """Get the hit and miss counters, i.e. the grading calls saved and made."""
+        return self.cache.stats()
+
+
+def _text(value: CacheValue) -> str:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _is_relevant(value: CacheValue) -> bool:
+    return _text(value).split(" ", 1)[0] == "yes"
+
+
+@lru_cache
+def get_grade_cache(
+    path: Optional[str], max_entries: int, ttl_seconds: Optional[float]
+) -> GradeCache:
+    """Get the grade cache shared by the process for the given settings."""
+    return GradeCache(
+        PersistentLRUCache(
+            path=path or None,
+            table="grades",
+            max_entries=max_entries,
+            max_memory_entries=min(max_entries, 10_000),
+            ttl_seconds=ttl_seconds,
+        )
+    )
+
+
+def web_search_key(query: str, search_depth: str, max_results: int) -> str:
+    """Hash the normalized query, the search depth and the number of results."""
+    return hashlib.sha256(
+        "\0".join([normalize_text(query), search_depth, str(max_results)]).encode()
+    ).hexdigest()
+
+
+@lru_cache
+def get_web_search_cache(
+    path: Optional[str], max_entries: int, ttl_seconds: Optional[float]
+) -> PersistentLRUCache:
+    """Get the web search results cache shared by the process for the given settings."""
+    return PersistentLRUCache(
+        path=path or None,
+        table="web_searches",
+        max_entries=max_entries,
+        max_memory_entries=min(max_entries, 1_000),
+        ttl_seconds=ttl_seconds,
+    )
+
+
+# Scraped pages are kept this long to be revalidated with conditional requests
+PAGE_CACHE_TTL_SECONDS = 30 * 24 * 60 * 60
+
+
+@lru_cache
+def get_page_cache(path: Optional[str], max_entries: int) -> PersistentLRUCache:
+    """Get the scraped pages cache shared by the process for the given settings."""
+    return PersistentLRUCache(
+        path=path or None,
+        table="pages",
+        max_entries=max_entries,
+        max_memory_entries=min(max_entries, 200),
+        ttl_seconds=PAGE_CACHE_TTL_SECONDS,
+    )
@@ -201,6 +201,11 @@ class WriterProvider(Enum):
     GOOGLE = "google"
     DEEPSEEK = "deepseek"
 
+class RetrievalBackend(Enum):
+    ATLAS = "atlas"  # MongoDB Atlas vector search
+    LOCAL = "local"  # In-process index per client, memory-mapped from disk
+    SNAPSHOT = "snapshot"  # In-memory snapshot per client, read once from Atlas
+
 class ScraperProvider(Enum):
     FIRECREW = "firecrew"
 
@@ -218,7 +223,54 @@ class Configuration:
     number_of_queries: int = 10  # Number of search queries to generate per iteration
     max_search_depth: int = 2 # Maximum number of reflection + search iterations
     max_web_results: int = 10  # Maximum number of web results to return
+    web_search_max_tokens: int = 4000  # Token budget of the web search results returned to the assistant
     max_vector_results: int = 5  # Maximum number of vector results to return
+    section_context_max_tokens: int = 6000  # Token budget of the sources given to the section writer
+    client_info_max_chars: int = 8000  # Maximum length of the client information returned to the assistant
+    client_info_cache_ttl_seconds: int = 300  # A thread reuses the client information retrieved for the same query for this long, so changed documents are seen after it
+    history_max_tokens: int = 12000  # Token ceiling of the conversation history sent to the assistant (0 sends it all)
+    history_tool_output_max_tokens: int = 500  # Tool outputs of earlier turns are cut to this many tokens in the assistant's prompt
+    history_summary_max_tokens: int = 400  # Length of the rolling summary of the turns left out of the assistant's prompt
+    retrieval_backend: RetrievalBackend = RetrievalBackend.ATLAS  # Where client documents are searched
+    local_index_path: str = ".cache/vector_index"  # Directory of the local indexes, one per client
+    snapshot_dtype: str = "float32"  # Embeddings dtype of the client snapshots ("float16" halves memory)
+    snapshot_check_interval_seconds: int = 60  # How often a client snapshot is checked for changed documents
+    snapshot_max_clients: int = 20  # Maximum number of client snapshots kept in memory, the least recently used are dropped
+    snapshot_idle_seconds: int = 3600  # Client snapshots unused for this long are dropped
+
+    parallel_section_writing: bool = False  # Draft all sections concurrently via Send fan-out, final_grant_proposal is written once all sections are done
+    max_concurrent_sections: int = 4  # Maximum number of sections of a run drafted at the same time
+    incremental_section_updates: bool = True  # When the sections are planned again, keep the written ones the planner left unchanged
+    stream_section_tokens: bool = True  # Stream section tokens on the custom stream channel
+    slim_state_updates: bool = False  # Nodes only write the sections they changed to the checkpoint, final_grant_proposal is written once all sections are done
+    report_checkpoint_stats: bool = False  # Record the checkpoint bytes and serialization time per node
+
+    max_grading_candidates: int = 20  # Maximum number of fused search results graded per section attempt (0 for all)
+    auto_accept_score: Optional[float] = None  # Vector score (cosine, in [0, 1]) at or above which a document is relevant without LLM grading, calibrate it on the grade cache with `python -m benchmarks.calibrate_grading` (off by default; above 1 also turns it off, None is ignored in a RunnableConfig)
+    auto_reject_score: Optional[float] = None  # Vector score at or below which a document is irrelevant without LLM grading, calibrated like auto_accept_score (off by default; below 0 also turns it off)
+    max_concurrent_gradings: int = 10  # Maximum number of document grading calls in flight
+    batch_document_grading: bool = False  # Grade several documents per structured-output call
+    document_grading_batch_size: int = 10  # Number of documents per batched grading call
+
+    grade_cache_enabled: bool = True  # Reuse document grades across retries, sections and threads
+    grade_cache_path: str = ".cache/grade_cache.sqlite"  # SQLite file backing the grade cache
+    grade_cache_max_entries: int = 100_000  # Maximum number of cached grades
+    grade_cache_ttl_seconds: int = 7 * 24 * 60 * 60  # Time to live of a cached grade
+
+    web_search_cache_enabled: bool = True  # Reuse web search results across calls, threads and restarts
+    web_search_cache_path: str = ".cache/web_search_cache.sqlite"  # SQLite file backing the web search cache
+    web_search_cache_max_entries: int = 10_000  # Maximum number of cached web searches
+    web_search_cache_ttl_seconds: int = 24 * 60 * 60  # Time to live of cached web search results
+
+    scrape_timeout_seconds: float = 15  # Timeout of each scraped page request
+    scrape_max_concurrent_per_host: int = 2  # Maximum number of pages scraped from the same host at a time
+    scrape_max_page_tokens: int = 3000  # Scraped pages are cut to this many tokens
+    scrape_cache_enabled: bool = True  # Cache scraped pages and revalidate them with conditional requests
+    scrape_cache_path: str = ".cache/page_cache.sqlite"  # SQLite file backing the page cache
+    scrape_cache_max_entries: int = 5_000  # Maximum number of cached pages
+    scrape_cache_fresh_seconds: int = 60 * 60  # Cached pages younger than this are not requested again
+
+    blocking_call_threshold_ms: int = 0  # Debug: report event loop blocking calls longer than this (0 disables)
     
     planner_model: str = "gpt-4o-mini"  # Defaults to OpenAI o3-mini as planner model
     writer_model: str = "gpt-4o-mini"  # Defaults to Anthropic as provider
@@ -243,4 +295,4 @@ class Configuration:
             for f in fields(cls)
             if f.init
         }
-        return cls(**{k: v for k, v in values.items() if v})
+        return cls(**{k: v for k, v in values.items() if v is not None})
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Encoding used for the models tiktoken doesn't know (e.g. non-OpenAI models)
+DEFAULT_ENCODING = "o200k_base"
+
+# Estimate used when no tiktoken encoding can be loaded (e.g. offline)
+CHARS_PER_TOKEN = 4
+
+# tiktoken downloads the encodings on first use, with no timeout. Set TIKTOKEN_CACHE_DIR
+# to a directory with the encodings already downloaded to load them offline, or
+# TOKENIZER_OFFLINE=1 to use the estimate without trying to download them.
+OFFLINE_ENV_VAR = "TOKENIZER_OFFLINE"
+
+# Time the async callers wait for an encoding to load before using the estimate
+ENCODING_LOAD_TIMEOUT_SECONDS = 10
+
+_encodings: dict[str, Optional[Any]] = {}
+# Encodings being loaded, shared by the concurrent callers of an event loop
+_loading: dict[tuple[Any, str], asyncio.Future] = {}
+_lock = threading.Lock()
+
+
+def _load_encoding(model: str) -> Optional[Any]:
+    if os.environ.get(OFFLINE_ENV_VAR, "").lower() in ("1", "true", "yes"):
+        logger.info(
+            "Tokenizer offline, estimating %d characters per token", CHARS_PER_TOKEN
+        )
+        return None
+
+    try:
+        import tiktoken
+
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as error:
+        logger.warning(
+            "No tokenizer for %s (%s), estimating %d characters per token",
+            model,
+            error,
+            CHARS_PER_TOKEN,
+        )
+        return None
+
+
+def get_encoding(model: str) -> Optional[Any]:
+    """Get the tiktoken encoding of a model, or None if it can't be loaded.
+
+    The first call may download the encoding: async code loads it with
+    `aget_encoding` first, so the event loop is never blocked.
+    """
+    if model not in _encodings:
+        encoding = _load_encoding(model)
+        with _lock:
+            _encodings.setdefault(model, encoding)
+    return _encodings[model]
+
+
+async def aget_encoding(model: str) -> Optional[Any]:
+    """Load the tiktoken encoding of a model in a thread, without blocking the loop.
+
+    If it takes over `ENCODING_LOAD_TIMEOUT_SECONDS` (e.g. the download hangs), tokens
+    are estimated until the encoding is loaded.
+    """
+    if model in _encodings:
+        return _encodings[model]
+
+    def load() -> None:
+        encoding = _load_encoding(model)
+        with _lock:
+            # Replaces the estimate used while the load timed out
+            _encodings[model] = encoding
+
+    key = (asyncio.get_running_loop(), model)
+    if key not in _loading:
+        _loading[key] = asyncio.ensure_future(asyncio.to_thread(load))
+        _loading[key].add_done_callback(lambda _: _loading.pop(key, None))
+    try:
+        await asyncio.wait_for(
+            asyncio.shield(_loading[key]), ENCODING_LOAD_TIMEOUT_SECONDS
+        )
+    except TimeoutError:
+        logger.warning(
+            "Loading the tokenizer for %s takes over %d seconds, estimating %d "
+            "characters per token until it is loaded",
+            model,
+            ENCODING_LOAD_TIMEOUT_SECONDS,
+            CHARS_PER_TOKEN,
+        )
+        with _lock:
+            _encodings.setdefault(model, None)
+    return _encodings[model]
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Count the tokens of a text for a model."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, model: str) -> str:
+    """Truncate a text to at most `max_tokens` tokens of a model."""
+    encoding = get_encoding(model)
+    if encoding is None:
+        return text[: max_tokens * CHARS_PER_TOKEN]
+
+    tokens = encoding.encode(text, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return text
+    return encoding.decode(tokens[:max_tokens])
+
+
+@dataclass
+class AssembledContext:
+    """Sources packed into a prompt, and the sources left out for lack of budget."""
+
+    text: str
+    tokens: int
+    included: list[str] = field(default_factory=list)
+    dropped: list[str] = field(default_factory=list)
+
+
+def format_source(chunk_id: str, content: str) -> str:
+    return f'<source id="{chunk_id}">\n{content}\n</source>'
+
+
+def assemble_context(
+    chunk_ids: list[str],
+    document_store: dict[str, str],
+    max_tokens: int,
+    model: str,
+) -> AssembledContext:
+    """Pack a section's retrieved chunks into a token budget.
+
+    Chunks are taken in order of relevance (the order of `chunk_ids`, as ranked by
+    retrieval) and each one that fits in the remaining budget is included, so a long
+    chunk doesn't keep the shorter ones after it out.
+
+    Args:
+        chunk_ids: IDs of the chunks, most relevant first.
+        document_store: Content of the chunks by ID.
+        max_tokens: Token budget of the context.
+        model: Model the context is written for, whose tokenizer counts the tokens.
+
+    Returns:
+        AssembledContext: The formatted context, its token count, and the IDs of the
+            included and dropped chunks.
+    """
+    separator_tokens = count_tokens("\n\n", model)
+    context = AssembledContext(text="", tokens=0)
+    sources = []
+
+    for chunk_id in chunk_ids:
+        if chunk_id not in document_store:
+            continue
+
+        source = format_source(chunk_id, document_store[chunk_id])
+        tokens = count_tokens(source, model) + (separator_tokens if sources else 0)
+        if context.tokens + tokens > max_tokens:
+            context.dropped.append(chunk_id)
+            continue
+
+        sources.append(source)
+        context.included.append(chunk_id)
+        context.tokens += tokens
+
+    context.text = "\n\n".join(sources)
+    return context
@@ -0,0 +1,193 @@
+import asyncio
+import functools
+import inspect
+import logging
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import defaultdict
+from typing import Any, Callable
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import Command
+
+from src.grant_writing_agent.configuration import Configuration
+
+logger = logging.getLogger(__name__)
+
+# Keep references to the heartbeat tasks so they are not garbage collected
+_heartbeats: set[asyncio.Task] = set()
+
+
+class BlockingCallMonitor:
+    """Detect calls that block an event loop for longer than a threshold.
+
+    A heartbeat task on the monitored loop records when the loop last got to run, and a
+    watchdog thread checks the heartbeat. When the loop has not run for more than
+    `threshold_ms`, the stack of the loop thread (i.e. the blocking call) is logged once
+    per stall, together with how long the loop was blocked.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold_ms: int):
+        self.threshold = threshold_ms / 1000
+        self.interval = self.threshold / 4
+        self.stalls = 0
+
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stall_stack = None
+        self._stop = threading.Event()
+
+        # Only keep a weak reference to the loop so it can be garbage collected
+        self._loop = weakref.ref(loop)
+        heartbeat = loop.create_task(self._beat())
+        _heartbeats.add(heartbeat)
+        heartbeat.add_done_callback(_heartbeats.discard)
+        self._watchdog = threading.Thread(
+            target=self._watch, name="blocking-call-monitor", daemon=True
+        )
+        self._watchdog.start()
+
+    async def _beat(self) -> None:
+        """Record that the loop is running, and report the stall that just ended."""
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if self._stall_stack is not None:
+                self.stalls += 1
+                logger.warning(
+                    "Event loop was blocked for %.0f ms (threshold %.0f ms) by:\n%s",
+                    (now - self._last_beat - self.interval) * 1000,
+                    self.threshold * 1000,
+                    self._stall_stack,
+                )
+                self._stall_stack = None
+            self._last_beat = now
+            await asyncio.sleep(self.interval)
+
+    def _watch(self) -> None:
+        """Capture the stack of the loop thread when the heartbeat is late."""
+        while not self._stop.wait(self.interval):
+            loop = self._loop()
+            if loop is None or loop.is_closed():
+                return
+            late = time.monotonic() - self._last_beat - self.interval
+            if late > self.threshold and self._stall_stack is None:
+                frame = sys._current_frames().get(self._loop_thread_id)
+                self._stall_stack = "".join(traceback.format_stack(frame))
+
+    def stop(self) -> None:
+        """Stop monitoring the loop."""
+        self._stop.set()
+
+
+_monitors: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def ensure_blocking_call_monitor(threshold_ms: int) -> None:
+    """Monitor the running event loop for blocking calls, if `threshold_ms` is set.
+
+    Calling this more than once on the same loop is a no-op.
+    """
+    if not threshold_ms or threshold_ms <= 0:
+        return
+
+    loop = asyncio.get_running_loop()
+    if loop not in _monitors:
+        _monitors[loop] = BlockingCallMonitor(loop, threshold_ms)
+
+
+class CheckpointStats:
+    """Size and serialization time of the state updates written by each node.
+
+    Every update a node returns is written to the checkpoint, so its serialized size
+    and the time spent serializing and deserializing it are a good proxy of the
+    checkpoint overhead of the node.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget the recorded updates."""
+        self.nodes: dict[str, dict[str, Any]] = defaultdict(
+            lambda: {"calls": 0, "bytes": 0, "serialize_ms": 0.0, "keys": {}}
+        )
+
+    def record(self, node: str, update: Any) -> dict[str, int]:
+        """Serialize a state update like the checkpointer does, and record its size.
+
+        Returns:
+            dict[str, int]: The serialized size in bytes of each key of the update.
+        """
+        from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+        # The update of a `Command` is what gets written to the checkpoint
+        if isinstance(update, Command):
+            update = update.update
+        if not isinstance(update, dict):
+            return {}
+
+        serde = JsonPlusSerializer()
+        sizes = {}
+        start = time.perf_counter()
+        for key, value in update.items():
+            serialized = serde.dumps_typed(value)
+            serde.loads_typed(serialized)
+            sizes[key] = len(serialized[1])
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        with self._lock:
+            stats = self.nodes[node]
+            stats["calls"] += 1
+            stats["bytes"] += sum(sizes.values())
+            stats["serialize_ms"] += elapsed_ms
+            for key, size in sizes.items():
+                stats["keys"][key] = stats["keys"].get(key, 0) + size
+
+        logger.info(
+            "%s wrote %d bytes to the checkpoint (%.2f ms to serialize): %s",
+            node,
+            sum(sizes.values()),
+            elapsed_ms,
+            sizes,
+        )
+        return sizes
+
+    def report(self) -> dict[str, dict[str, Any]]:
+        """Get the recorded calls, bytes, serialization time and bytes per key of each node."""
+        with self._lock:
+            return {node: dict(stats) for node, stats in self.nodes.items()}
+
+
+checkpoint_stats = CheckpointStats()
+
+
+def track_checkpoint_size(node: Callable) -> Callable:
+    """Record the checkpoint size of the updates of a node in `checkpoint_stats`.
+
+    Nothing is recorded unless the run is configured with `report_checkpoint_stats`.
+    """
+    name = node.__name__
+
+    if inspect.iscoroutinefunction(node):
+
+        @functools.wraps(node)
+        async def async_wrapper(state: Any, config: RunnableConfig) -> Any:
+            update = await node(state, config)
+            if Configuration.from_runnable_config(config).report_checkpoint_stats:
+                checkpoint_stats.record(name, update)
+            return update
+
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state: Any, config: RunnableConfig) -> Any:
+        update = node(state, config)
+        if Configuration.from_runnable_config(config).report_checkpoint_stats:
+            checkpoint_stats.record(name, update)
+        return update
+
+    return wrapper
@@ -0,0 +1,98 @@
+import hashlib
+from array import array
+from typing import Optional
+
+from langchain_core.embeddings import Embeddings
+
+from src.grant_writing_agent.cache import PersistentLRUCache
+
+
+class CachedEmbeddings(Embeddings):
+    """Content-addressed cache in front of an embedding model.
+
+    Vectors are keyed by a hash of the model name and the exact text, and stored as
+    compact float32 arrays in a `PersistentLRUCache` (memory + SQLite on disk). Texts
+    missing from the cache are embedded together in a single request.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: PersistentLRUCache,
+        model_name: Optional[str] = None,
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.model_name = model_name or getattr(embeddings, "model", "") or ""
+
+    def key(self, text: str) -> str:
+        """Hash the model name and the text to embed."""
+        return hashlib.sha256(f"{self.model_name}\0{text}".encode()).hexdigest()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed texts, embedding the ones missing from the cache in one request."""
+        vectors, missing = self._lookup(texts, self.cache.get_many(self._keys(texts)))
+        if missing:
+            missing_vectors = self.embeddings.embed_documents(missing)
+            vectors = self._store(texts, vectors, missing, missing_vectors)
+        self.cache.flush()
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        """Embed a query text."""
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        """Embed texts, embedding the ones missing from the cache in one request."""
+        cached = await self.cache.aget_many(self._keys(texts))
+        vectors, missing = self._lookup(texts, cached)
+        if missing:
+            missing_vectors = await self.embeddings.aembed_documents(missing)
+            vectors = self._store(texts, vectors, missing, missing_vectors)
+        await self.cache.aflush()
+        return vectors
+
+    async def aembed_query(self, text: str) -> list[float]:
+        """Embed a query text."""
+        return (await self.aembed_documents([text]))[0]
+
+    def stats(self) -> dict[str, int]:
+        """Get the hit and miss counters of the cache."""
+        return self.cache.stats()
+
+    def _keys(self, texts: list[str]) -> list[str]:
+        return [self.key(text) for text in texts]
+
+    def _lookup(
+        self, texts: list[str], cached: dict[str, bytes]
+    ) -> tuple[list[Optional[list[float]]], list[str]]:
+        """Get the cached vectors of texts and the (unique) texts missing from the cache."""
+        vectors = []
+        missing = []
+        for text in texts:
+            value = cached.get(self.key(text))
+            if value is None:
+                vectors.append(None)
+                if text not in missing:
+                    missing.append(text)
+            else:
+                vector = array("f")
+                vector.frombytes(value)
+                vectors.append(vector.tolist())
+        return vectors, missing
+
+    def _store(
+        self,
+        texts: list[str],
+        vectors: list[Optional[list[float]]],
+        missing: list[str],
+        missing_vectors: list[list[float]],
+    ) -> list[list[float]]:
+        """Cache the vectors of the missing texts as float32 arrays and fill them in."""
+        embedded = dict(zip(missing, missing_vectors))
+        for text, vector in embedded.items():
+            self.cache.set(self.key(text), array("f", vector).tobytes())
+        return [
+            vector if vector is not None else embedded[text]
+            for text, vector in zip(texts, vectors)
+        ]
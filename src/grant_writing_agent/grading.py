@@ -0,0 +1,293 @@
+import asyncio
+import logging
+from typing import Optional
+
+from langchain_core.documents import Document
+
+from src.grant_writing_agent.templates import get_template
+from src.grant_writing_agent.cache import GradeCache, get_grade_cache
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.metrics import record
+from src.grant_writing_agent.models import get_structured_model
+from src.grant_writing_agent.state import GradeDocuments, BatchGradeDocuments
+
+logger = logging.getLogger(__name__)
+
+
+def get_configured_grade_cache(configurable: Configuration) -> Optional[GradeCache]:
+    """Get the grade cache for the configuration, or None if grade caching is disabled."""
+    if not configurable.grade_cache_enabled:
+        return None
+    return get_grade_cache(
+        configurable.grade_cache_path,
+        configurable.grade_cache_max_entries,
+        configurable.grade_cache_ttl_seconds,
+    )
+
+
+def get_model_name(model) -> str:
+    """Get the name of a chat model, used to key cached grades."""
+    return getattr(model, "model_name", None) or getattr(model, "model", "") or ""
+
+
+async def _grade_document(
+    question: str,
+    document: Document,
+    structured_llm_grader,
+    semaphore: asyncio.Semaphore,
+) -> bool:
+    """Grade the relevance of a single document to its question"""
+
+    # Grade documents
+    grade_prompt = get_template("grade_document_prompt").render(
+        question=question,
+        document=document.page_content,
+    )
+
+    async with semaphore:
+        record("grading_calls")
+        score = await structured_llm_grader.ainvoke(grade_prompt)
+
+    return score.binary_score == "yes"
+
+
+async def _grade_document_batch(
+    batch: list[tuple[str, Document]],
+    structured_llm_batch_grader,
+    structured_llm_grader,
+    semaphore: asyncio.Semaphore,
+) -> list[bool]:
+    """Grade a batch of (question, document) pairs with one structured-output call"""
+
+    documents = "\n".join(
+        f'<document index="{index}">\n'
+        f"<user_question>\n{question}\n</user_question>\n"
+        f"<content>\n{document.page_content}\n</content>\n"
+        f"</document>"
+        for index, (question, document) in enumerate(batch)
+    )
+    grade_prompt = get_template("batch_grade_document_prompt").render(
+        documents=documents
+    )
+
+    async with semaphore:
+        record("grading_calls")
+        result = await structured_llm_batch_grader.ainvoke(grade_prompt)
+
+    grades = {
+        score.index: score.binary_score == "yes"
+        for score in result.scores
+        if 0 <= score.index < len(batch)
+    }
+
+    # Grade the documents the model skipped one at a time
+    missing = [index for index in range(len(batch)) if index not in grades]
+    if missing:
+        fallback_grades = await asyncio.gather(
+            *(
+                _grade_document(*batch[index], structured_llm_grader, semaphore)
+                for index in missing
+            )
+        )
+        grades.update(zip(missing, fallback_grades))
+
+    return [grades[index] for index in range(len(batch))]
+
+
+def pre_grade(
+    score: Optional[float],
+    auto_accept_score: Optional[float] = None,
+    auto_reject_score: Optional[float] = None,
+) -> Optional[bool]:
+    """Grade a document from its vector score alone, if the score is conclusive.
+
+    Returns:
+        Optional[bool]: True at or above `auto_accept_score`, False at or below
+            `auto_reject_score`, None in between (the LLM grader decides).
+    """
+    if score is None:
+        return None
+    if auto_accept_score is not None and score >= auto_accept_score:
+        return True
+    if auto_reject_score is not None and score <= auto_reject_score:
+        return False
+    return None
+
+
+def calibrate_thresholds(
+    graded: list[tuple[float, bool]], precision: float = 0.95, min_documents: int = 50
+) -> tuple[Optional[float], Optional[float]]:
+    """Calibrate the pre-grading thresholds on documents graded by the LLM grader.
+
+    The accept threshold is the lowest score at or above which at least `precision` of
+    the documents were graded relevant, and the reject threshold the highest score at
+    or below which at least `precision` were graded irrelevant. A threshold needs
+    `min_documents` graded documents on its side.
+
+    Args:
+        graded: (vector score, is relevant) of the documents, e.g. from
+            `GradeCache.scored_grades`.
+        precision: Share of the pre-graded documents the LLM grader agrees with.
+        min_documents: Minimum number of documents a threshold is based on.
+
+    Returns:
+        tuple[Optional[float], Optional[float]]: The (auto_accept_score,
+            auto_reject_score), None when no threshold reaches the precision.
+    """
+    graded = sorted(graded)
+
+    auto_accept_score = None
+    relevant = 0
+    for count, (score, is_relevant) in enumerate(reversed(graded), start=1):
+        relevant += is_relevant
+        if count >= min_documents and relevant / count >= precision:
+            auto_accept_score = score
+
+    auto_reject_score = None
+    irrelevant = 0
+    for count, (score, is_relevant) in enumerate(graded, start=1):
+        irrelevant += not is_relevant
+        if count >= min_documents and irrelevant / count >= precision:
+            auto_reject_score = score
+
+    return auto_accept_score, auto_reject_score
+
+
+async def grade_documents(
+    grader_model,
+    candidates: list[tuple[str, Document]],
+    max_concurrency: int = 10,
+    batch_size: Optional[int] = None,
+    cache: Optional[GradeCache] = None,
+    scores: Optional[list[float]] = None,
+    auto_accept_score: Optional[float] = None,
+    auto_reject_score: Optional[float] = None,
+) -> list[bool]:
+    """Grade the relevance of retrieved documents to the questions they were retrieved for.
+
+    Documents whose vector score is conclusive are graded from the score alone (see
+    `pre_grade`). The others are graded concurrently, with at most `max_concurrency`
+    grading calls in flight. When `batch_size` is set, candidates are graded
+    `batch_size` at a time with a single structured-output call per batch.
+
+    Args:
+        grader_model: Chat model used to grade the documents.
+        candidates: List of (question, document) pairs to grade.
+        max_concurrency: Maximum number of grading calls in flight.
+        batch_size: Number of documents graded per call, or None to grade one by one.
+        cache: Cache of previous grades; only the candidates missing from it are graded.
+        scores: Vector score of each candidate for its question, if known.
+        auto_accept_score: Score at or above which a candidate is relevant without LLM grading.
+        auto_reject_score: Score at or below which a candidate is irrelevant without LLM grading.
+
+    Returns:
+        list[bool]: Whether each candidate is relevant ('yes'), in the order of `candidates`.
+    """
+    if not candidates:
+        return []
+
+    model_name = get_model_name(grader_model)
+    grades: list[Optional[bool]] = [None] * len(candidates)
+
+    # Grade the candidates with a conclusive vector score without the LLM
+    if scores is not None:
+        for index, score in enumerate(scores):
+            grades[index] = pre_grade(score, auto_accept_score, auto_reject_score)
+        pre_graded = sum(grade is not None for grade in grades)
+        if pre_graded:
+            record("grading_calls_skipped", pre_graded)
+            logger.info(
+                "Pre-graded %d of %d documents from their vector score (%d accepted)",
+                pre_graded,
+                len(candidates),
+                sum(grade is True for grade in grades),
+            )
+
+    # Reuse the grades of documents already graded for the same query
+    if cache is not None:
+        ungraded = [index for index, grade in enumerate(grades) if grade is None]
+        cached_grades = await cache.aget_many(
+            [
+                (candidates[index][0], candidates[index][1].page_content)
+                for index in ungraded
+            ],
+            model_name,
+        )
+        for index, grade in zip(ungraded, cached_grades):
+            grades[index] = grade
+        hits = sum(grade is not None for grade in cached_grades)
+        record("grade_cache_hits", hits)
+        record("grade_cache_misses", len(ungraded) - hits)
+
+    missing = [index for index, grade in enumerate(grades) if grade is None]
+    if missing:
+        new_grades = await _grade_candidates(
+            grader_model,
+            [candidates[index] for index in missing],
+            max_concurrency,
+            batch_size,
+        )
+        for index, is_relevant in zip(missing, new_grades):
+            grades[index] = is_relevant
+            if cache is not None:
+                question, document = candidates[index]
+                cache.set(
+                    question,
+                    document.page_content,
+                    model_name,
+                    is_relevant,
+                    score=scores[index] if scores is not None else None,
+                )
+
+    if cache is not None:
+        await cache.aflush()
+        logger.info(
+            "Graded %d documents, %d with the LLM grader (cache stats: %s)",
+            len(candidates),
+            len(missing),
+            cache.stats(),
+        )
+
+    return grades
+
+
+async def _grade_candidates(
+    grader_model,
+    candidates: list[tuple[str, Document]],
+    max_concurrency: int,
+    batch_size: Optional[int],
+) -> list[bool]:
+    """Grade candidates with the LLM grader, one by one or in batches"""
+
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    structured_llm_grader = get_structured_model(grader_model, GradeDocuments)
+
+    if not batch_size or batch_size <= 1:
+        return list(
+            await asyncio.gather(
+                *(
+                    _grade_document(
+                        question, document, structured_llm_grader, semaphore
+                    )
+                    for question, document in candidates
+                )
+            )
+        )
+
+    structured_llm_batch_grader = get_structured_model(
+        grader_model, BatchGradeDocuments
+    )
+    batches = [
+        candidates[start : start + batch_size]
+        for start in range(0, len(candidates), batch_size)
+    ]
+    batch_grades = await asyncio.gather(
+        *(
+            _grade_document_batch(
+                batch, structured_llm_batch_grader, structured_llm_grader, semaphore
+            )
+            for batch in batches
+        )
+    )
+
+    return [grade for grades in batch_grades for grade in grades]
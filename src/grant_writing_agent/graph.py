@@ -1,12 +1,12 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
 from typing import Literal
 
-from langchain_anthropic import ChatAnthropic
 from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
 from langchain_core.runnables import RunnableConfig
-from langchain_openai import ChatOpenAI
-from langchain_groq import ChatGroq
-from langchain_core.prompts import ChatPromptTemplate
 
+from langgraph.config import get_stream_writer
 from langgraph.constants import Send
 from langgraph.graph import START, END, StateGraph
 from langgraph.types import interrupt, Command
@@ -22,36 +22,101 @@ from src.grant_writing_agent.tools import (
 from src.grant_writing_agent.state import (
     AgentStateInput,
     AgentStateOutput,
+    Section,
     Sections,
+    SearchQuery,
     AgentState,
     SectionState,
     SectionOutputState,
     Queries,
     Feedback,
-    GradeDocuments,
-)
-from src.grant_writing_agent.prompts import (
-    report_planner_query_writer_instructions,
-    report_planner_instructions,
-    query_writer_instructions,
-    section_writer_instructions,
-    final_section_writer_instructions,
-    section_grader_instructions,
-    gather_prompt,
-    grade_document_prompt,
+    ReplaceDocuments,
+    ReplaceSections,
 )
+from src.grant_writing_agent.templates import get_template
 from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.context import aget_encoding, assemble_context
+from src.grant_writing_agent.history import acompact_history
+from src.grant_writing_agent.prompting import layered_system_message
+from src.grant_writing_agent.metrics import (
+    record,
+    set_section,
+    start_run,
+    track_node_metrics,
+)
+from src.grant_writing_agent.diagnostics import (
+    ensure_blocking_call_monitor,
+    track_checkpoint_size,
+)
+from src.grant_writing_agent.grading import (
+    grade_documents,
+    get_configured_grade_cache,
+)
+from src.grant_writing_agent.models import (
+    get_planner_model,
+    get_writer_model,
+    get_structured_model,
+    get_model_with_tools,
+)
+from src.grant_writing_agent.retrieval import (
+    afused_search,
+    aget_vector_index,
+    warm_vector_index,
+)
 from src.grant_writing_agent.utils import (
     deduplicate_and_format_sources,
     format_sections,
-    vector_store,
+    format_section_plan,
+    compile_sections,
+    chunk_id,
+    proposal_inputs_hash,
+    rename_duplicate_sections,
+    reuse_unchanged_sections,
 )
 
 from langchain_core.documents import Document
 
-# Set writer model
-# writer_model = ChatOpenAI(model="o1", reasoning_effort="medium", temperature=0)
-writer_model = ChatOpenAI(model=Configuration.writer_model, temperature=0)
+logger = logging.getLogger(__name__)
+
+# Semaphores bounding parallel section drafting, one per fan-out of sections and the
+# number of drafts holding or waiting for it
+_section_semaphores: dict[tuple, tuple[asyncio.Semaphore, int]] = {}
+
+
+def _section_fan_out_key(config: RunnableConfig) -> tuple:
+    """Identify the fan-out a section draft is part of: its run, graph and step."""
+    configurable = config.get("configurable", {})
+    metadata = config.get("metadata", {})
+    parent_namespace = configurable.get("checkpoint_ns", "").rpartition("|")[0]
+    return (
+        asyncio.get_running_loop(),
+        metadata.get("run_id") or configurable.get("thread_id"),
+        parent_namespace,
+        metadata.get("langgraph_step"),
+    )
+
+
+@asynccontextmanager
+async def _section_slot(config: RunnableConfig, max_concurrent_sections: int):
+    """Wait for one of the `max_concurrent_sections` drafting slots of a run.
+
+    The slots are shared by the sections of one fan-out only, so the runs of other
+    threads and users do not wait for each other.
+    """
+    key = (*_section_fan_out_key(config), max_concurrent_sections)
+    semaphore, drafts = _section_semaphores.get(
+        key, (asyncio.Semaphore(max(1, max_concurrent_sections)), 0)
+    )
+    _section_semaphores[key] = (semaphore, drafts + 1)
+    try:
+        async with semaphore:
+            yield
+    finally:
+        semaphore, drafts = _section_semaphores[key]
+        if drafts == 1:
+            del _section_semaphores[key]
+        else:
+            _section_semaphores[key] = (semaphore, drafts - 1)
 
 
 # Chat with the user
@@ -59,7 +124,16 @@ tools = [generate_sections, tavily_search, scrape_webpages, retrieve_client_info
 tool_node = ToolNode(tools)
 
 
+@track_checkpoint_size
+@track_node_metrics
+async def call_tools(state: AgentState, config: RunnableConfig):
+    """Run the tools called by the model"""
+    return await tool_node.ainvoke(state, config)
+
+
 # Grant genie is the main node that gathers the project idea and funding requirements from the user.
+@track_checkpoint_size
+@track_node_metrics
 async def gather_requirement(
     state: AgentState, config
 ) -> Command[Literal["tools", "generate_sections", END]]:
@@ -67,37 +141,71 @@ async def gather_requirement(
 
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
+    ensure_blocking_call_monitor(configurable.blocking_call_threshold_ms)
+
+    # A new user message starts a new run, count its metrics from scratch
+    if isinstance(state["messages"][-1], HumanMessage):
+        start_run()
+
+    # Read the client's documents while the conversation goes on
+    warm_vector_index(configurable)
     user_name = configurable.user_name
     organization_name = configurable.client_name
     about_client = configurable.about_client
 
-    # Format system message
-    system_message = gather_prompt.format(
-        user_name=user_name, client_name=organization_name, about_client=about_client
+    # Fit the history in the prompt's token ceiling, the state keeps all the messages
+    history = await acompact_history(
+        state["messages"],
+        state.get("conversation_summary", ""),
+        state.get("summarized_messages", 0),
+        configurable,
     )
 
-    model = writer_model.bind_tools(tools)
-    response = await model.ainvoke(
-        [SystemMessage(content=system_message)] + state["messages"]
+    # Format system message, with the prompt shared by the client's conversations first
+    conversation_context = get_template("gather_prompt_context").render(
+        user_name=user_name, client_name=organization_name
+    )
+    if history.summary:
+        conversation_context += get_template("conversation_summary_context").render(
+            user_name=user_name, summary=history.summary
+        )
+    system_message = layered_system_message(
+        configurable.writer_provider,
+        [
+            get_template("gather_prompt").render_static(
+                client_name=organization_name, about_client=about_client
+            )
+        ],
+        conversation_context,
     )
+
+    model = get_model_with_tools(get_writer_model(configurable), tools)
+    response = await model.ainvoke([system_message] + history.messages)
     state["messages"] = [response]
 
     last_message = state["messages"][-1]
 
+    update = {"messages": [response]}
+    if history.summarized_messages != state.get("summarized_messages", 0):
+        update["conversation_summary"] = history.summary
+        update["summarized_messages"] = history.summarized_messages
+
     if last_message.tool_calls:
-        return Command(goto="tools", update={"messages": [response]})
+        return Command(goto="tools", update=update)
 
     elif state.get("start_writing_sections"):
-        return Command(goto="generate_sections", update={"messages": [response]})
+        return Command(goto="generate_sections", update=update)
 
     else:
-        return Command(goto=END, update={"messages": [response]})
+        return Command(goto=END, update=update)
 
 
 # Nodes
+@track_checkpoint_size
+@track_node_metrics
 async def generate_sections(
     state: AgentState, config: RunnableConfig
-) -> Command[Literal["generate_queries"]]:
+) -> Command[Literal["generate_queries", "draft_section", "compile_grant_proposal"]]:
     """Generate the grant proposal sections"""
 
     # Get state
@@ -112,25 +220,33 @@ async def generate_sections(
     grant_proposal_structure = configurable.grant_proposal_structure
     about_client = configurable.about_client
     number_of_queries = configurable.number_of_queries
-    # Format system instructions
-    system_instructions_sections = report_planner_instructions.format(
-        project_idea=project_idea,
-        funding_requirements=funding_requirements,
-        grant_proposal_structure=grant_proposal_structure,
-        about_client=about_client,
-        user_name=user_name,
-        client_name=client_name,
-        feedback_from_review=feedback,
-        number_of_queries=number_of_queries,
+    # Format system instructions, with the prompt shared by the client's proposals first
+    system_instructions_sections = layered_system_message(
+        configurable.planner_provider,
+        [
+            get_template("report_planner_instructions").render_static(
+                grant_proposal_structure=grant_proposal_structure,
+                about_client=about_client,
+                client_name=client_name,
+                number_of_queries=number_of_queries,
+            )
+        ],
+        get_template("report_planner_context").render(
+            project_idea=project_idea,
+            funding_requirements=funding_requirements,
+            user_name=user_name,
+            feedback_from_review=feedback or "None",
+            current_sections=format_section_plan(state.get("sections") or []),
+        ),
     )
 
     # Set the planner model
-    planner_llm = ChatOpenAI(model=configurable.planner_model)
+    planner_llm = get_planner_model(configurable)
 
     # Generate sections
-    structured_llm = planner_llm.with_structured_output(Sections)
+    structured_llm = get_structured_model(planner_llm, Sections)
     report_sections = await structured_llm.ainvoke(
-        [SystemMessage(content=system_instructions_sections)]
+        [system_instructions_sections]
         + [
             HumanMessage(
                 content="Generate the sections of the grant proposal. Your response must include a 'sections' field containing a list of sections. Each section must have: name, description, plan, research, and content fields."
@@ -138,13 +254,325 @@ async def generate_sections(
         ]
     )
 
-    # Get sections
-    sections = report_sections.sections
+    # Get sections, with a unique name each
+    sections = rename_duplicate_sections(report_sections.sections)
+
+    # Keep the written sections the planner kept as they were (same name and
+    # description), unless the configured proposal structure or client profile changed
+    inputs_hash = proposal_inputs_hash(grant_proposal_structure, about_client)
+    previous_sections = state.get("sections") or []
+    if (
+        configurable.incremental_section_updates
+        and previous_sections
+        and state.get("proposal_inputs_hash") == inputs_hash
+    ):
+        sections = reuse_unchanged_sections(previous_sections, sections)
+        reused = sum(section.is_written for section in sections)
+        record("sections_reused", reused)
+        logger.info("Reused %d of %d written sections", reused, len(sections))
+
+    update = {
+        "sections": ReplaceSections(sections=sections),
+        "proposal_inputs_hash": inputs_hash,
+        "final_grant_proposal": compile_sections(sections),
+    }
+
+    # Drop the chunks of the replaced and redrafted sections from the document store
+    document_store = state.get("document_store") or {}
+    referenced = {chunk for section in sections for chunk in section.documents}
+    if document_store.keys() - referenced:
+        update["document_store"] = ReplaceDocuments(
+            documents={
+                chunk: content
+                for chunk, content in document_store.items()
+                if chunk in referenced
+            }
+        )
+        logger.info(
+            "Dropped %d of %d chunks from the document store",
+            len(document_store.keys() - referenced),
+            len(document_store),
+        )
+
+    # Draft every unwritten section concurrently, each in its own section subgraph
+    if configurable.parallel_section_writing:
+        if all(section.is_written for section in sections):
+            return Command(goto="compile_grant_proposal", update=update)
+
+        return Command(
+            goto=[
+                Send(
+                    "draft_section",
+                    {
+                        "section": section.model_copy(),
+                        "section_index": sections.index(section),
+                        "search_iterations": 0,
+                        "project_idea": project_idea,
+                        "funding_requirements": funding_requirements,
+                    },
+                )
+                for section in sections
+                if not section.is_written
+            ],
+            update=update,
+        )
+
+    return Command(goto="generate_queries", update=update)
+
+
+def _sections_update(
+    sections: list[Section], section: Section, configurable: Configuration
+) -> list[Section] | ReplaceSections:
+    """Get the `sections` update of a node that changed one section.
+
+    In slim mode only the changed section is written (the `sections` reducer merges it
+    by name), otherwise the whole list replaces the previous one.
+    """
+    if configurable.slim_state_updates:
+        return [section]
+    return ReplaceSections(sections=sections)
+
+
+# Section helpers shared by the serial writing loop and the parallel section subgraph
+async def _generate_section_queries(
+    section: Section, configurable: Configuration
+) -> list[SearchQuery]:
+    """Generate the vector search queries for a section"""
+
+    # Generate queries
+    structured_llm = get_structured_model(get_writer_model(configurable), Queries)
+
+    # Format system instructions
+    system_instructions = get_template("query_writer_instructions").render(
+        section_description=section.description,
+        number_of_queries=configurable.number_of_queries,
+        user_name=configurable.user_name,
+        client_name=configurable.client_name,
+    )
+
+    # Generate queries
+    queries = await structured_llm.ainvoke(
+        [SystemMessage(content=system_instructions)]
+        + [HumanMessage(content="Generate search queries on the provided topic.")]
+    )
+
+    return queries.queries
+
+
+async def _retrieve_section_documents(
+    search_queries: list[SearchQuery], configurable: Configuration
+) -> dict[str, str]:
+    """Retrieve and grade the client documents for a section's search queries.
 
-    return Command(goto="generate_queries", update={"sections": sections})
+    Each attempt searches deeper (`max_vector_results` more documents per query) and
+    only grades the chunks not graded yet. Returns the relevant chunks keyed by chunk ID
+    (a hash of their content), in retrieval order, or an empty dict when no relevant
+    document was found within `max_search_depth` attempts.
+    """
 
+    document_ids = configurable.context_document_ids
+    client_id = configurable.client_id
+    max_vector_results = configurable.max_vector_results
+    max_search_depth = configurable.max_search_depth
+
+    # Extract the search query strings
+    query_strs = [
+        query.search_query if hasattr(query, "search_query") else str(query)
+        for query in search_queries
+    ]
+
+    if document_ids:
+        pre_filter = {"document_id": {"$in": document_ids}}
+    else:
+        pre_filter = {"client_id": client_id}
 
-def generate_queries(
+    # Local index of the client, or None to search Atlas
+    index = await aget_vector_index(configurable)
+
+    graded = set()
+    for attempt in range(max_search_depth):
+        # Search all the queries at once, keeping the best unique candidates, each
+        # with the query that ranked it highest. Each attempt searches deeper.
+        fused = await afused_search(
+            query_strs,
+            k=max_vector_results * (attempt + 1),
+            pre_filter=pre_filter,
+            index=index,
+        )
+
+        # Only grade the chunks the earlier attempts did not grade
+        candidates = [
+            (query_str, doc, score)
+            for query_str, doc, score in fused
+            if chunk_id(doc.page_content) not in graded
+        ][: configurable.max_grading_candidates or None]
+        if not candidates:
+            break
+        graded.update(chunk_id(doc.page_content) for _, doc, _ in candidates)
+
+        # Grade all the candidates concurrently, skipping the conclusive vector scores
+        grades = await grade_documents(
+            get_writer_model(configurable),
+            [(query_str, doc) for query_str, doc, _ in candidates],
+            max_concurrency=configurable.max_concurrent_gradings,
+            batch_size=(
+                configurable.document_grading_batch_size
+                if configurable.batch_document_grading
+                else None
+            ),
+            cache=get_configured_grade_cache(configurable),
+            scores=[score for _, _, score in candidates],
+            auto_accept_score=configurable.auto_accept_score,
+            auto_reject_score=configurable.auto_reject_score,
+        )
+
+        # Deduplicate the relevant chunks by content hash
+        relevant_chunks = {}
+        for (query_str, doc, _), is_relevant in zip(candidates, grades):
+            if is_relevant:
+                relevant_chunks.setdefault(chunk_id(doc.page_content), doc.page_content)
+
+        if relevant_chunks:  # Moved outside query loop to check all collected docs
+            return relevant_chunks
+
+    return {}
+
+
+async def _write_section_content(
+    section: Section,
+    section_index: int,
+    document_store: dict[str, str],
+    project_idea: str,
+    funding_requirements: str,
+    configurable: Configuration,
+) -> str:
+    """Write the content of a section from its retrieved sources.
+
+    With `stream_section_tokens`, the tokens are streamed on the custom stream channel
+    as they are generated, tagged with the section name and index.
+    """
+
+    # Pack the most relevant sources into the section's token budget
+    await aget_encoding(configurable.writer_model)
+    context = assemble_context(
+        section.documents,
+        document_store,
+        configurable.section_context_max_tokens,
+        configurable.writer_model,
+    )
+    record("context_tokens", context.tokens)
+    if context.dropped:
+        record("context_chunks_dropped", len(context.dropped))
+        logger.info(
+            "Dropped %d of %d sources of section %s over the %d token budget: %s",
+            len(context.dropped),
+            len(section.documents),
+            section.name,
+            configurable.section_context_max_tokens,
+            context.dropped,
+        )
+
+    # Format system instructions, from the prompt shared by all the sections to the
+    # section's own requirements and sources
+    system_instructions = layered_system_message(
+        configurable.writer_provider,
+        [
+            get_template("section_writer_instructions").render_static(
+                client_name=configurable.client_name,
+                grant_proposal_structure=configurable.grant_proposal_structure,
+            ),
+            get_template("section_writer_proposal_context").render_static(
+                funding_requirements=funding_requirements,
+                project_idea=project_idea,
+            ),
+        ],
+        get_template("section_writer_context").render(
+            section_description=section.description,
+            context=context.text,
+            section_content=section.content,
+            user_name=configurable.user_name,
+            client_name=configurable.client_name,
+            section_name=section.name,
+        ),
+    )
+
+    messages = [system_instructions] + [
+        HumanMessage(content="Generate a report section based on the provided sources.")
+    ]
+
+    writer_model = get_writer_model(configurable)
+
+    if not configurable.stream_section_tokens:
+        # Generate section
+        section_content = await writer_model.ainvoke(messages)
+        return section_content.content
+
+    # Generate section, streaming the tokens to the client
+    stream_writer = get_stream_writer()
+    section_content = None
+    async for chunk in writer_model.astream(messages):
+        section_content = chunk if section_content is None else section_content + chunk
+        if chunk.content and isinstance(chunk.content, str):
+            stream_writer(
+                {
+                    "event": "section_token",
+                    "section": section.name,
+                    "index": section_index,
+                    "token": chunk.content,
+                }
+            )
+
+    return section_content.content if section_content is not None else ""
+
+
+def _emit_section_written(section: Section, section_index: int) -> None:
+    """Stream a written section on the custom stream channel
+
+    This is the progressive signal of the drafting in every mode: final_grant_proposal
+    is only updated per section in serial mode without slim state updates, and is
+    otherwise compiled once all the sections are written.
+    """
+    get_stream_writer()(
+        {
+            "event": "section_written",
+            "section": section.name,
+            "index": section_index,
+            "content": section.content,
+        }
+    )
+
+
+async def _grade_section(section: Section, configurable: Configuration) -> Feedback:
+    """Grade a written section and suggest follow-up queries for missing information"""
+
+    # Section grading prompt
+    section_grader_instructions_formatted = get_template(
+        "section_grader_instructions"
+    ).render(
+        section_topic=section.description,
+        section=section.content,
+    )
+
+    # Feedback
+    structured_llm = get_structured_model(get_writer_model(configurable), Feedback)
+
+    return await structured_llm.ainvoke(
+        [
+            SystemMessage(
+                content=section_grader_instructions_formatted,
+            )
+        ]
+        + [
+            HumanMessage(
+                content="Grade the report and consider follow-up questions for missing information:"
+            )
+        ]
+    )
+
+
+@track_checkpoint_size
+@track_node_metrics
+async def generate_queries(
     state: AgentState, config: RunnableConfig
 ) -> Command[Literal["retrieve_context"]]:
     """Generate search queries for a report section"""
@@ -164,35 +592,21 @@ def generate_queries(
             goto="write_section",
             update={"messages": [AIMessage(content="No sections require research")]},
         )
+    set_section(section.name)
 
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
-    number_of_queries = configurable.number_of_queries
-    client_name = configurable.client_name
-    user_name = configurable.user_name
-
-    # Generate queries
-    structured_llm = writer_model.with_structured_output(Queries)
 
-    # Format system instructions
-    system_instructions = query_writer_instructions.format(
-        section_description=section.description,
-        number_of_queries=number_of_queries,
-        user_name=user_name,
-        client_name=client_name,
-    )
+    section.search_queries = await _generate_section_queries(section, configurable)
 
-    # Generate queries
-    queries = structured_llm.invoke(
-        [SystemMessage(content=system_instructions)]
-        + [HumanMessage(content="Generate search queries on the provided topic.")]
+    return Command(
+        goto="retrieve_context",
+        update={"sections": _sections_update(sections, section, configurable)},
     )
 
-    section.search_queries = queries.queries
-
-    return Command(goto="retrieve_context", update={"sections": sections})
-
 
+@track_checkpoint_size
+@track_node_metrics
 async def retrieve_context(
     state: AgentState, config: RunnableConfig
 ) -> Command[Literal["write_section"]]:
@@ -212,74 +626,35 @@ async def retrieve_context(
             goto="write_section",
             update={"messages": [AIMessage(content="No active section found")]},
         )
+    set_section(section.name)
 
     # Get Configuration
     configurable = Configuration.from_runnable_config(config)
-    document_ids = configurable.context_document_ids
-    client_id = configurable.client_id
-    max_vector_results = configurable.max_vector_results
-    max_search_depth = configurable.max_search_depth
-
-    search_queries = section.search_queries
 
-    for attempt in range(max_search_depth):
-        all_docs = []  # Moved outside the query loop to collect docs from all queries
-        source_str = ""
-
-        for query in search_queries:
-            # Extract the search query string
-            query_str = (
-                query.search_query if hasattr(query, "search_query") else str(query)
-            )
-
-            if document_ids:
-                docs = vector_store.similarity_search(
-                    query=query_str,
-                    k=max_vector_results,
-                    pre_filter={"document_id": {"$in": document_ids}},
-                )
-            else:
-                docs = vector_store.similarity_search(
-                    query=query_str,
-                    k=max_vector_results,
-                    pre_filter={"client_id": client_id},
-                )
-
-            # Grade documents
-            for doc in docs:
-                doc_content = doc.page_content
-
-                # Grade documents
-                grade_prompt = grade_document_prompt.format(
-                    question=query_str,
-                    document=doc_content,
-                )
-
-                structured_llm_grader = writer_model.with_structured_output(
-                    GradeDocuments
-                )
-
-                score = await structured_llm_grader.ainvoke(grade_prompt)
-
-                if score.binary_score == "yes":
-                    # Check if the document is already in the all_docs list
-                    if doc not in all_docs:
-                        all_docs.append(doc)
-                        source_str += doc.page_content
+    relevant_chunks = await _retrieve_section_documents(
+        section.search_queries, configurable
+    )
 
-        if all_docs:  # Moved outside query loop to check all collected docs
-            section.documents = all_docs
-            section.source_str = source_str
-            return Command(goto="write_section", update={"sections": sections})
+    if relevant_chunks:
+        # The section only keeps the chunk IDs, the chunks go to the shared store
+        section.documents = list(relevant_chunks)
+        return Command(
+            goto="write_section",
+            update={
+                "sections": _sections_update(sections, section, configurable),
+                "document_store": relevant_chunks,
+            },
+        )
 
-        if attempt == max_search_depth - 1:
-            # Interrupt to request more documents
-            return Command(
-                goto="write_section",
-                update={"messages": [HumanMessage(content="No documents found")]},
-            )
+    # Interrupt to request more documents
+    return Command(
+        goto="write_section",
+        update={"messages": [HumanMessage(content="No documents found")]},
+    )
 
 
+@track_checkpoint_size
+@track_node_metrics
 async def write_section(
     state: AgentState, config: RunnableConfig
 ) -> Command[Literal["generate_queries", "retrieve_context", "gather_requirement"]]:
@@ -294,9 +669,6 @@ async def write_section(
     # Get project idea
     project_idea = state["project_idea"]
 
-    # Get final grant proposal
-    final_grant_proposal = state.get("final_grant_proposal", "")
-
     # Initialize search_iterations if it doesn't exist
     iterations = state.get("search_iterations", 0)
 
@@ -325,73 +697,28 @@ async def write_section(
                 ],
                 # Set the start_writing_sections to False
                 "start_writing_sections": False,
+                # In slim mode the proposal may not have been compiled yet
+                "final_grant_proposal": compile_sections(sections),
             },
         )
+    set_section(section.name)
 
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
 
-    # Get user name
-    user_name = configurable.user_name
-
-    # get client name
-    client_name = configurable.client_name
-
-    # Get proposal structure
-    grant_proposal_structure = configurable.grant_proposal_structure
-
-    # Format system instructions
-    system_instructions = section_writer_instructions.format(
-        section_title=section.name,
-        section_description=section.description,
-        context=section.source_str,
-        section_content=section.content,
-        user_name=user_name,
-        client_name=client_name,
-        section_name=section.name,
-        grant_proposal_structure=grant_proposal_structure,
-        funding_requirements=funding_requirements,
-        project_idea=project_idea,
-    )
-
-    # Generate section
-    section_content = await writer_model.ainvoke(
-        [
-            SystemMessage(
-                content=system_instructions,
-            )
-        ]
-        + [
-            HumanMessage(
-                content="Generate a report section based on the provided sources."
-            )
-        ]
-    )
-
     # Write content to the section object
-    section.content = section_content.content
-
-    # Section grading prompt
-    section_grader_instructions_formatted = section_grader_instructions.format(
-        section_topic=section.description,
-        section=section.content,
+    section_index = sections.index(section)
+    section.content = await _write_section_content(
+        section,
+        section_index,
+        state.get("document_store", {}),
+        project_idea,
+        funding_requirements,
+        configurable,
     )
 
     # Feedback
-    structured_llm = writer_model.with_structured_output(Feedback)
-
-    feedback = structured_llm.invoke(
-        [
-            SystemMessage(
-                content=section_grader_instructions_formatted,
-            )
-        ]
-        + [
-            HumanMessage(
-                content="Grade the report and consider follow-up questions for missing information:"
-            )
-        ]
-    )
+    feedback = await _grade_section(section, configurable)
 
     if feedback.grade == "pass" or iterations >= configurable.max_search_depth:
         # Reset search_iterations for next section
@@ -403,26 +730,29 @@ async def write_section(
         # mark the section as inactive since we dont want to write it again
         section.is_active = False
 
-        # Append the completed section to final_grant_proposal
-        final_grant_proposal += f"\n\n{section.content}"
+        # Rebuild final_grant_proposal from the written sections, in plan order
+        final_grant_proposal = compile_sections(sections)
+        _emit_section_written(section, section_index)
 
         # Check if there are more sections that require research
         has_unwritten_research_sections = any(s for s in sections if not s.is_written)
 
         if has_unwritten_research_sections:
-            return Command(
-                goto="generate_queries",
-                update={
-                    "sections": sections,
-                    "final_grant_proposal": final_grant_proposal,
-                    "search_iterations": iterations,
-                },
-            )
+            update = {
+                "sections": _sections_update(sections, section, configurable),
+                "search_iterations": iterations,
+            }
+            # In slim mode the proposal is only written once all sections are done,
+            # clients follow the drafting through the section_written stream events
+            if not configurable.slim_state_updates:
+                update["final_grant_proposal"] = final_grant_proposal
+
+            return Command(goto="generate_queries", update=update)
         else:
             return Command(
-                goto="grant_genie",
+                goto="gather_requirement",
                 update={
-                    "sections": sections,
+                    "sections": _sections_update(sections, section, configurable),
                     "final_grant_proposal": final_grant_proposal,
                     "start_writing_sections": False,
                     "search_iterations": iterations,
@@ -442,13 +772,159 @@ async def write_section(
         return Command(
             goto="retrieve_context",
             update={
-                "sections": sections,
+                "sections": _sections_update(sections, section, configurable),
                 "search_iterations": iterations
                 + 1,  # Use iterations variable instead of accessing state directly
             },
         )
 
 
+# Section subgraph nodes -- research and write a single section (parallel drafting)
+@track_node_metrics
+async def section_generate_queries(state: SectionState, config: RunnableConfig) -> dict:
+    """Generate search queries for the section being drafted"""
+
+    section = state["section"]
+
+    # Sections that don't require research are written without retrieved sources
+    if not section.research:
+        return {}
+
+    # Get configuration
+    configurable = Configuration.from_runnable_config(config)
+
+    section.search_queries = await _generate_section_queries(section, configurable)
+
+    return {"section": section}
+
+
+@track_node_metrics
+async def section_retrieve_context(state: SectionState, config: RunnableConfig) -> dict:
+    """Retrieve and grade the client documents for the section being drafted"""
+
+    section = state["section"]
+
+    # Get configuration
+    configurable = Configuration.from_runnable_config(config)
+
+    relevant_chunks = await _retrieve_section_documents(
+        section.search_queries, configurable
+    )
+
+    if relevant_chunks:
+        # The section only keeps the chunk IDs, the chunks go to the shared store
+        section.documents = list(relevant_chunks)
+
+    return {"section": section, "document_store": relevant_chunks}
+
+
+@track_node_metrics
+async def section_write(
+    state: SectionState, config: RunnableConfig
+) -> Command[Literal["section_retrieve_context", END]]:
+    """Write and grade the section being drafted"""
+
+    section = state["section"]
+    iterations = state.get("search_iterations", 0)
+
+    # Get configuration
+    configurable = Configuration.from_runnable_config(config)
+
+    # Write content to the section object
+    section.content = await _write_section_content(
+        section,
+        state["section_index"],
+        state.get("document_store", {}),
+        state["project_idea"],
+        state["funding_requirements"],
+        configurable,
+    )
+
+    # Feedback
+    feedback = await _grade_section(section, configurable)
+
+    if feedback.grade == "pass" or iterations >= configurable.max_search_depth:
+        # mark section as written
+        section.is_written = True
+        section.is_active = False
+
+        _emit_section_written(section, state["section_index"])
+
+        # Hand the section back to the parent graph
+        return Command(
+            goto=END,
+            update={"section": section, "completed_sections": [section]},
+        )
+
+    # update search queries and research again
+    section.search_queries = feedback.follow_up_queries
+
+    return Command(
+        goto="section_retrieve_context",
+        update={"section": section, "search_iterations": iterations + 1},
+    )
+
+
+@track_checkpoint_size
+async def draft_section(state: SectionState, config: RunnableConfig) -> dict:
+    """Run the section subgraph, bounded by `max_concurrent_sections`"""
+
+    # Get configuration
+    configurable = Configuration.from_runnable_config(config)
+
+    async with _section_slot(config, configurable.max_concurrent_sections):
+        return await section_graph.ainvoke(state, config)
+
+
+@track_checkpoint_size
+@track_node_metrics
+def compile_grant_proposal(
+    state: AgentState, config: RunnableConfig
+) -> Command[Literal["gather_requirement"]]:
+    """Join the sections drafted in parallel into the final grant proposal
+
+    The sections are drafted concurrently, so final_grant_proposal is only written
+    here; the section_written stream events report each section as it is written.
+    """
+
+    # Keep the planned order of the sections, and the sections reused from a previous draft
+    completed_sections = {s.name: s for s in state.get("completed_sections", [])}
+    sections = [
+        s if s.is_written else completed_sections.get(s.name, s)
+        for s in state["sections"]
+    ]
+
+    final_grant_proposal = compile_sections(sections)
+
+    return Command(
+        goto="gather_requirement",
+        update={
+            "sections": ReplaceSections(sections=sections),
+            "final_grant_proposal": final_grant_proposal,
+            "start_writing_sections": False,
+            "search_iterations": 0,
+            "messages": [
+                AIMessage(
+                    content="Respond to user with the following message: Successfully generated a grant proposal draft. Let's start editing the draft"
+                )
+            ],
+        },
+    )
+
+
+# Section subgraph --
+section_builder = StateGraph(SectionState, output=SectionOutputState)
+section_builder.add_node("section_generate_queries", section_generate_queries)
+section_builder.add_node("section_retrieve_context", section_retrieve_context)
+section_builder.add_node("section_write", section_write)
+
+section_builder.add_edge(START, "section_generate_queries")
+section_builder.add_edge("section_generate_queries", "section_retrieve_context")
+section_builder.add_edge("section_retrieve_context", "section_write")
+
+section_graph = section_builder.compile()
+
+
 # Outer graph --
 builder = StateGraph(
     AgentState,
@@ -457,15 +933,18 @@ builder = StateGraph(
     config_schema=Configuration,
 )
 builder.add_node("gather_requirement", gather_requirement)
-builder.add_node("tools", tool_node)
+builder.add_node("tools", call_tools)
 builder.add_node("generate_sections", generate_sections)
 builder.add_node("generate_queries", generate_queries)
 builder.add_node("write_section", write_section)
 builder.add_node("retrieve_context", retrieve_context)
+builder.add_node("draft_section", draft_section)
+builder.add_node("compile_grant_proposal", compile_grant_proposal)
 
 # Add edges
 builder.add_edge(START, "gather_requirement")
 
 builder.add_edge("tools", "gather_requirement")
+builder.add_edge("draft_section", "compile_grant_proposal")
 
 graph = builder.compile()
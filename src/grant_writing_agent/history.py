@@ -0,0 +1,186 @@
+import json
+import logging
+from dataclasses import dataclass
+from typing import Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
+
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.context import (
+    aget_encoding,
+    count_tokens,
+    truncate_to_tokens,
+)
+from src.grant_writing_agent.metrics import record
+from src.grant_writing_agent.models import get_writer_model
+from src.grant_writing_agent.templates import format_conversation, get_template
+
+logger = logging.getLogger(__name__)
+
+# Rough number of words per token, to ask for a summary of a given length
+WORDS_PER_TOKEN = 0.75
+
+# Share of the token ceiling the history is brought down to when turns are folded
+# into the summary, so the summary is not rewritten on every turn
+COMPACTION_TARGET = 0.5
+
+
+@dataclass
+class CompactedHistory:
+    """The messages sent to the assistant, and the summary of the ones left out."""
+
+    messages: list[BaseMessage]
+    summary: str
+    summarized_messages: int  # Number of leading messages of the state in the summary
+
+
+def message_tokens(message: BaseMessage, model: str) -> int:
+    """Count the tokens of the text and tool calls of a message."""
+    text = message.content if isinstance(message.content, str) else str(message.content)
+    if isinstance(message, AIMessage) and message.tool_calls:
+        text += json.dumps([call["args"] for call in message.tool_calls])
+    return count_tokens(text, model)
+
+
+def _truncate_tool_output(message: ToolMessage, max_tokens: int, model: str):
+    """Get a copy of a tool message with its output cut to `max_tokens` tokens."""
+    content = (
+        message.content if isinstance(message.content, str) else str(message.content)
+    )
+    truncated = truncate_to_tokens(content, max_tokens, model)
+    if truncated == content:
+        return message
+    return message.model_copy(
+        update={"content": truncated + "\n[Truncated earlier tool output]"}
+    )
+
+
+def _truncate_tool_outputs(
+    messages: Sequence[BaseMessage], keep_from: int, max_tokens: int, model: str
+) -> list[BaseMessage]:
+    """Truncate the tool outputs of the messages before position `keep_from`."""
+    return [
+        (
+            _truncate_tool_output(message, max_tokens, model)
+            if isinstance(message, ToolMessage) and position < keep_from
+            else message
+        )
+        for position, message in enumerate(messages)
+    ]
+
+
+def _last_turn_start(messages: Sequence[BaseMessage]) -> int:
+    """Get the position of the last user message (0 if there is none)."""
+    for position in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[position], HumanMessage):
+            return position
+    return 0
+
+
+def _cut_position(messages: Sequence[BaseMessage], max_tokens: int, model: str) -> int:
+    """Get the first user turn from which the messages fit in `max_tokens` tokens.
+
+    Messages are only cut before a user message, so a tool call is never separated
+    from its output. The last turn is always kept.
+    """
+    tokens = 0
+    cut = _last_turn_start(messages)
+    for position in range(len(messages) - 1, -1, -1):
+        tokens += message_tokens(messages[position], model)
+        if tokens > max_tokens:
+            break
+        if isinstance(messages[position], HumanMessage):
+            cut = min(cut, position)
+    return cut
+
+
+async def _asummarize(
+    previous_summary: str, messages: Sequence[BaseMessage], configurable: Configuration
+) -> str:
+    """Fold messages into the rolling summary of the conversation."""
+    prompt = get_template("conversation_summary_prompt").render(
+        user_name=configurable.user_name,
+        client_name=configurable.client_name,
+        previous_summary=previous_summary or "(none)",
+        conversation=format_conversation(messages),
+        max_words=int(configurable.history_summary_max_tokens * WORDS_PER_TOKEN),
+    )
+    response = await get_writer_model(configurable).ainvoke(
+        [HumanMessage(content=prompt)]
+    )
+    record("history_summaries")
+    return response.content if isinstance(response.content, str) else ""
+
+
+async def acompact_history(
+    messages: Sequence[BaseMessage],
+    summary: str,
+    summarized_messages: int,
+    configurable: Configuration,
+) -> CompactedHistory:
+    """Fit the conversation history in the token ceiling of the assistant's prompt.
+
+    The state keeps every message. Only the prompt is compacted:
+
+    1. The messages already in the rolling summary are left out.
+    2. Tool outputs of the earlier turns (e.g. web search results and scraped pages)
+       are truncated to `history_tool_output_max_tokens` tokens; those of the last
+       turn, which the assistant is working on, are kept whole.
+    3. If the history is still over `history_max_tokens`, its oldest turns are folded
+       into the rolling summary, which replaces them in the prompt.
+
+    Args:
+        messages: All the messages of the conversation.
+        summary: Rolling summary of the first `summarized_messages` messages.
+        summarized_messages: Number of leading messages in the summary.
+        configurable: Configuration with the token budgets and the writer model.
+
+    Returns:
+        CompactedHistory: The messages to send and the (possibly updated) summary.
+    """
+    if not configurable.history_max_tokens:
+        return CompactedHistory(list(messages), summary, summarized_messages)
+
+    if summarized_messages > len(messages):
+        # The messages were replaced since they were summarized
+        summary, summarized_messages = "", 0
+
+    model = configurable.writer_model
+    await aget_encoding(model)
+    recent = list(messages[summarized_messages:])
+    recent = _truncate_tool_outputs(
+        recent,
+        _last_turn_start(recent),
+        configurable.history_tool_output_max_tokens,
+        model,
+    )
+
+    budget = configurable.history_max_tokens - count_tokens(summary, model)
+    if sum(message_tokens(message, model) for message in recent) > budget:
+        # Leave room for the summary the oldest turns are folded into
+        cut = _cut_position(
+            recent,
+            int((budget - configurable.history_summary_max_tokens) * COMPACTION_TARGET),
+            model,
+        )
+        if cut:
+            summary = await _asummarize(summary, recent[:cut], configurable)
+            summarized_messages += cut
+            recent = recent[cut:]
+
+    tokens = sum(message_tokens(message, model) for message in recent)
+    if tokens > configurable.history_max_tokens:
+        # The last turn alone is over the ceiling, truncate its tool outputs too
+        recent = _truncate_tool_outputs(
+            recent, len(recent), configurable.history_tool_output_max_tokens, model
+        )
+        logger.warning(
+            "The last turn of the conversation has %d tokens, over the %d token "
+            "ceiling of the history; truncated its tool outputs",
+            tokens,
+            configurable.history_max_tokens,
+        )
+        tokens = sum(message_tokens(message, model) for message in recent)
+
+    record("history_tokens", tokens)
+    return CompactedHistory(recent, summary, summarized_messages)
@@ -0,0 +1,268 @@
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Iterable, Optional
+
+import numpy as np
+from bson import ObjectId
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+EMBEDDINGS_FILE = "embeddings.npy"
+DOCUMENTS_FILE = "documents.jsonl"
+
+# Maximum number of pre-filter masks kept per index
+MAX_CACHED_FILTERS = 64
+
+
+def _matches(metadata: dict[str, Any], pre_filter: dict[str, Any]) -> bool:
+    """Whether a document matches a pre-filter, with the semantics of Atlas filters.
+
+    Supports field equality, `$eq`, `$ne`, `$in`, `$nin`, `$and` and `$or`, which covers
+    the `client_id`/`document_id` pre-filters used for retrieval.
+    """
+    for key, condition in pre_filter.items():
+        if key == "$and":
+            if not all(_matches(metadata, sub_filter) for sub_filter in condition):
+                return False
+        elif key == "$or":
+            if not any(_matches(metadata, sub_filter) for sub_filter in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for operator, operand in condition.items():
+                if operator == "$eq":
+                    matched = value == operand
+                elif operator == "$ne":
+                    matched = value != operand
+                elif operator == "$in":
+                    matched = value in operand
+                elif operator == "$nin":
+                    matched = value not in operand
+                else:
+                    raise ValueError(f"Unsupported pre-filter operator: {operator}")
+                if not matched:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+class LocalVectorIndex:
+    """In-process vector index of a client's documents.
+
+    The index holds the normalized embeddings as a matrix and the documents (text and
+    metadata) in the same order. On disk, it is a directory with the embeddings as a
+    float32 `.npy` file (memory-mapped when loaded) and the documents as JSON lines.
+    Queries are answered by exact cosine similarity over the documents matching the
+    pre-filter, which takes microseconds to a few milliseconds for a client's documents.
+    """
+
+    def __init__(self, embeddings: np.ndarray, documents: list[dict[str, Any]]):
+        self.embeddings = embeddings
+        self.documents = documents
+        self._candidates: dict[str, Optional[np.ndarray]] = {}
+
+    @classmethod
+    def load(cls, path: str | os.PathLike) -> "LocalVectorIndex":
+        """Load an index written by `write_local_index`, memory-mapping its embeddings."""
+        path = Path(path)
+        with open(path / DOCUMENTS_FILE, encoding="utf-8") as file:
+            documents = [json.loads(line) for line in file]
+        return cls(np.load(path / EMBEDDINGS_FILE, mmap_mode="r"), documents)
+
+    @classmethod
+    def from_documents(
+        cls, documents: Iterable[dict[str, Any]], dtype: str = "float32"
+    ) -> "LocalVectorIndex":
+        """Build an in-memory index from documents with a `text`, an `embedding` and metadata.
+
+        `float16` embeddings take half the memory of `float32` ones, but are converted
+        back to `float32` to be searched.
+        """
+        records, embeddings = _split_documents(documents)
+        return cls(_normalize(embeddings).astype(dtype), records)
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def _filter_candidates(
+        self, pre_filter: Optional[dict[str, Any]]
+    ) -> Optional[np.ndarray]:
+        """Get the positions of the documents matching a pre-filter (None for all)."""
+        if not pre_filter:
+            return None
+
+        key = json.dumps(pre_filter, sort_keys=True, default=str)
+        if key not in self._candidates:
+            if len(self._candidates) >= MAX_CACHED_FILTERS:
+                self._candidates.pop(next(iter(self._candidates)))
+            candidates = np.array(
+                [
+                    position
+                    for position, document in enumerate(self.documents)
+                    if _matches(document["metadata"], pre_filter)
+                ],
+                dtype=np.int64,
+            )
+            # Search the whole matrix, without copying it, when all documents match
+            self._candidates[key] = None if len(candidates) == len(self) else candidates
+        return self._candidates[key]
+
+    def search_many_with_score(
+        self,
+        query_vectors: list[list[float]],
+        k: int,
+        pre_filter: Optional[dict[str, Any]] = None,
+    ) -> list[list[tuple[Document, float]]]:
+        """Get the `k` documents closest to each query vector, and their scores.
+
+        Scores are cosine similarities normalized to [0, 1], like Atlas scores.
+        """
+        if not query_vectors:
+            return []
+
+        candidates = self._filter_candidates(pre_filter)
+        if len(self) == 0 or (candidates is not None and len(candidates) == 0):
+            return [[] for _ in query_vectors]
+
+        queries = np.asarray(query_vectors, dtype=np.float32)
+        queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        matrix = self.embeddings if candidates is None else self.embeddings[candidates]
+        if matrix.dtype != np.float32:
+            matrix = matrix.astype(np.float32)
+
+        # Score all the queries against all the candidates at once
+        scores = queries @ matrix.T
+        k = min(k, scores.shape[1])
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+        results = []
+        for query_scores, query_top in zip(scores, top):
+            ranked = query_top[np.argsort(-query_scores[query_top])]
+            results.append(
+                [
+                    (
+                        self._to_document(
+                            ranked_position
+                            if candidates is None
+                            else candidates[ranked_position]
+                        ),
+                        float((1 + query_scores[ranked_position]) / 2),
+                    )
+                    for ranked_position in ranked
+                ]
+            )
+        return results
+
+    def _to_document(self, position: int) -> Document:
+        document = self.documents[position]
+        return Document(
+            page_content=document["text"], metadata=dict(document["metadata"])
+        )
+
+
+def _split_documents(
+    documents: Iterable[dict[str, Any]],
+) -> tuple[list[dict[str, Any]], list[list[float]]]:
+    """Split vector store documents into (text and metadata) records and embeddings."""
+    records, embeddings = [], []
+    for document in documents:
+        metadata = {
+            key: str(value) if isinstance(value, ObjectId) else value
+            for key, value in document.items()
+            if key not in ("text", "embedding")
+        }
+        records.append({"text": document.get("text", ""), "metadata": metadata})
+        embeddings.append(document["embedding"])
+    return records, embeddings
+
+
+def _normalize(embeddings: list[list[float]]) -> np.ndarray:
+    """Get the embeddings as a float32 matrix of unit rows."""
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def write_local_index(
+    path: str | os.PathLike, documents: Iterable[dict[str, Any]]
+) -> int:
+    """Write a local index from documents with a `text`, an `embedding` and metadata.
+
+    The index is written to a temporary directory first and then moved in place, so
+    readers never see a partially written index.
+
+    Returns:
+        int: The number of documents indexed.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+
+    records, embeddings = _split_documents(documents)
+    tmp_path = Path(tempfile.mkdtemp(dir=path.parent, prefix=f".{path.name}-"))
+    try:
+        with open(tmp_path / DOCUMENTS_FILE, "w", encoding="utf-8") as file:
+            for record in records:
+                file.write(json.dumps(record, default=str) + "\n")
+        np.save(tmp_path / EMBEDDINGS_FILE, _normalize(embeddings))
+
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    return len(records)
+
+
+def export_client_index(path: str | os.PathLike, client_id: str) -> int:
+    """Export a client's documents from the Atlas collection to a local index.
+
+    Returns:
+        int: The number of documents exported.
+    """
+    from src.grant_writing_agent.resources import (
+        DB_NAME,
+        COLLECTION_NAME,
+        get_mongo_client,
+    )
+
+    collection = get_mongo_client()[DB_NAME][COLLECTION_NAME]
+    count = write_local_index(path, collection.find({"client_id": client_id}))
+    logger.info("Exported %d documents of client %s to %s", count, client_id, path)
+    return count
+
+
+_indexes: dict[Path, LocalVectorIndex] = {}
+_lock = threading.Lock()
+
+
+def get_local_index(root: str | os.PathLike, client_id: str) -> LocalVectorIndex:
+    """Get the local index of a client, exporting it from Atlas on first use.
+
+    Indexes are loaded once per process. This blocks on disk (and network on first
+    export), so call it from a worker thread in async code.
+    """
+    path = Path(root) / client_id
+    if path in _indexes:
+        return _indexes[path]
+
+    with _lock:
+        if path not in _indexes:
+            if not (path / EMBEDDINGS_FILE).exists():
+                export_client_index(path, client_id)
+            _indexes[path] = LocalVectorIndex.load(path)
+        return _indexes[path]
+
+
+def clear_local_indexes() -> None:
+    """Forget the loaded indexes, e.g. after rewriting them."""
+    with _lock:
+        _indexes.clear()
@@ -0,0 +1,317 @@
+import dataclasses
+import functools
+import inspect
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Any, Callable, Optional, Union
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langgraph.types import Command
+
+# Counters recorded for each node (and section, in the run metrics)
+METRICS = (
+    "calls",
+    "wall_seconds",
+    "llm_calls",
+    "llm_calls_without_usage",
+    "prompt_tokens",
+    "cached_prompt_tokens",
+    "completion_tokens",
+    "cost_usd",
+    "vector_queries",
+    "grading_calls",
+    "grading_calls_skipped",
+    "grade_cache_hits",
+    "grade_cache_misses",
+    "context_tokens",
+    "context_chunks_dropped",
+    "sections_reused",
+    "history_tokens",
+    "history_summaries",
+    "web_searches",
+    "web_searches_cached",
+    "pages_fetched",
+    "pages_cached",
+)
+
+# Prices in USD per million (prompt, completion) tokens, used to estimate the cost of
+# the LLM calls. Models missing from the table are counted with a cost of 0.
+MODEL_PRICES: dict[str, tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "o3-mini": (1.10, 4.40),
+    "claude-3-5-sonnet-latest": (3.00, 15.00),
+    "claude-3-7-sonnet-latest": (3.00, 15.00),
+    "claude-3-5-haiku-latest": (0.80, 4.00),
+}
+
+# Prefix of the exported Prometheus metrics
+PROMETHEUS_PREFIX = "grant_writing_agent"
+
+
+class _NodeScope:
+    """Counters of one node invocation, labelled with the section it works on."""
+
+    def __init__(self, node: str, section: str = ""):
+        self.node = node
+        self.section = section
+        self.new_run = False
+        self.values: dict[str, float] = defaultdict(float)
+
+
+_scope: ContextVar[Optional[_NodeScope]] = ContextVar("metrics_scope", default=None)
+
+
+class MetricsRecorder:
+    """Process-wide counters per node, exported for Prometheus.
+
+    The counters are only labelled with the node: section names are free text written
+    by the planner, so they are kept in the `run_metrics` of each thread instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values: dict[tuple[str, str], float] = defaultdict(float)
+
+    def add(self, node: str, metric: str, value: float) -> None:
+        with self._lock:
+            self._values[(node, metric)] += value
+
+    def reset(self) -> None:
+        """Forget the recorded counters."""
+        with self._lock:
+            self._values.clear()
+
+    def summary(self) -> dict[str, dict[str, dict[str, float]]]:
+        """Get the counters as `{"nodes": {node: {metric: value}}}`."""
+        with self._lock:
+            values = list(self._values.items())
+
+        summary = {"nodes": {}}
+        for (node, metric), value in values:
+            _add_value(summary["nodes"], node or "(none)", metric, value)
+        return summary
+
+    def prometheus_text(self) -> str:
+        """Export the counters in the Prometheus text exposition format."""
+        with self._lock:
+            values = sorted(self._values.items())
+
+        lines = []
+        for metric in METRICS:
+            name = f"{PROMETHEUS_PREFIX}_{metric}_total"
+            samples = [(node, value) for (node, key), value in values if key == metric]
+            if not samples:
+                continue
+            lines.append(f"# TYPE {name} counter")
+            for node, value in samples:
+                lines.append(f'{name}{{node="{_escape(node)}"}} {float(value)}')
+        return "\n".join(lines) + "\n"
+
+
+recorder = MetricsRecorder()
+
+
+def _escape(label: str) -> str:
+    return label.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _add_value(
+    summary: dict[str, dict[str, float]], key: str, metric: str, value: float
+) -> None:
+    summary.setdefault(key, {})
+    summary[key][metric] = summary[key].get(metric, 0) + value
+
+
+@dataclasses.dataclass
+class ResetRunMetrics:
+    """Update of the `run_metrics` channel starting the counters of a new run.
+
+    The counters of the earlier runs of the thread are replaced by `run_metrics`.
+    """
+
+    run_metrics: dict[str, dict[str, dict[str, float]]]
+
+
+def merge_run_metrics(
+    left: Optional[dict[str, dict[str, dict[str, float]]]],
+    right: Union[dict[str, dict[str, dict[str, float]]], ResetRunMetrics, None],
+) -> dict[str, dict[str, dict[str, float]]]:
+    """Reducer of the `run_metrics` channel: sum the counters of both summaries."""
+    if isinstance(right, ResetRunMetrics):
+        left, right = None, right.run_metrics
+
+    merged = {"nodes": {}, "sections": {}}
+    for summary in (left or {}, right or {}):
+        for group, counters in summary.items():
+            for key, values in counters.items():
+                for metric, value in values.items():
+                    _add_value(merged.setdefault(group, {}), key, metric, value)
+    return merged
+
+
+def cached_prompt_ratios(
+    counters: dict[str, dict[str, float]],
+) -> dict[str, float]:
+    """Get the share of the prompt tokens read from the prompt cache, per node or section.
+
+    `counters` is a group of a summary, e.g. `recorder.summary()["nodes"]`. In
+    Prometheus, divide the `cached_prompt_tokens` counter by the `prompt_tokens` one.
+    """
+    return {
+        key: values.get("cached_prompt_tokens", 0) / values["prompt_tokens"]
+        for key, values in counters.items()
+        if values.get("prompt_tokens")
+    }
+
+
+def record(metric: str, value: float = 1) -> None:
+    """Add to a counter of the node (and section) currently running."""
+    scope = _scope.get()
+    if scope is None:
+        recorder.add("", metric, value)
+        return
+
+    scope.values[metric] += value
+    recorder.add(scope.node, metric, value)
+
+
+def set_section(section: str) -> None:
+    """Label the counters recorded from now on in the running node with a section."""
+    scope = _scope.get()
+    if scope is not None:
+        scope.section = section
+
+
+def start_run() -> None:
+    """Start the run metrics of the thread over from the node currently running.
+
+    Called by the entry node on a new user message, so the `run_metrics` of the graph
+    output only count the current run and not every earlier turn of the thread.
+    """
+    scope = _scope.get()
+    if scope is not None:
+        scope.new_run = True
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    """Count the LLM calls, tokens and cost of a chat model."""
+
+    # Run in the node's context so the calls are counted for the right node
+    run_inline = True
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        prompt_tokens = cached_prompt_tokens = completion_tokens = 0
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    prompt_tokens += usage.get("input_tokens", 0)
+                    completion_tokens += usage.get("output_tokens", 0)
+                    # Prompt tokens read from the provider's prompt cache
+                    details = usage.get("input_token_details") or {}
+                    cached_prompt_tokens += details.get("cache_read") or 0
+
+        # Some providers only report the usage in the LLM output
+        if not prompt_tokens and not completion_tokens:
+            usage = (response.llm_output or {}).get("token_usage") or {}
+            prompt_tokens = usage.get("prompt_tokens", 0)
+            completion_tokens = usage.get("completion_tokens", 0)
+            details = usage.get("prompt_tokens_details") or {}
+            cached_prompt_tokens = details.get("cached_tokens") or 0
+
+        prompt_price, completion_price = MODEL_PRICES.get(self.model_name, (0, 0))
+
+        record("llm_calls")
+        if not prompt_tokens and not completion_tokens:
+            # e.g. a streamed response of a model not asked for its usage
+            record("llm_calls_without_usage")
+        record("prompt_tokens", prompt_tokens)
+        record("cached_prompt_tokens", cached_prompt_tokens)
+        record("completion_tokens", completion_tokens)
+        record(
+            "cost_usd",
+            (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6,
+        )
+
+
+def _with_run_metrics(update: Any, run_metrics: dict, new_run: bool) -> Any:
+    """Add the counters of a node to its state update."""
+    if isinstance(update, dict):
+        run_metrics = merge_run_metrics(update.get("run_metrics"), run_metrics)
+    if new_run:
+        run_metrics = ResetRunMetrics(run_metrics)
+
+    if isinstance(update, Command):
+        return dataclasses.replace(
+            update, update={**(update.update or {}), "run_metrics": run_metrics}
+        )
+    if isinstance(update, list):
+        return [*update, Command(update={"run_metrics": run_metrics})]
+    if isinstance(update, dict):
+        return {**update, "run_metrics": run_metrics}
+    return update
+
+
+def track_node_metrics(node: Callable) -> Callable:
+    """Record the wall time and counters of a node, and add them to its state update.
+
+    The counters of each invocation are written to the `run_metrics` state key, so the
+    summary of the run is part of the graph output. In `run_metrics`, a node working on
+    a single section (i.e. with a `section` in its state) is also counted for that
+    section.
+    """
+
+    def start(state: Any, config: RunnableConfig) -> tuple[_NodeScope, Any, float]:
+        # Label the counters with the name of the node in the graph
+        name = (config or {}).get("metadata", {}).get("langgraph_node", node.__name__)
+        section = state.get("section") if isinstance(state, dict) else None
+        scope = _NodeScope(name, getattr(section, "name", ""))
+        return scope, _scope.set(scope), time.perf_counter()
+
+    def finish(scope: _NodeScope, token: Any, started: float, update: Any) -> Any:
+        _scope.reset(token)
+        scope.values["calls"] += 1
+        scope.values["wall_seconds"] += time.perf_counter() - started
+        recorder.add(scope.node, "calls", 1)
+        recorder.add(scope.node, "wall_seconds", scope.values["wall_seconds"])
+
+        run_metrics = {"nodes": {scope.node: dict(scope.values)}, "sections": {}}
+        if scope.section:
+            run_metrics["sections"][scope.section] = dict(scope.values)
+        return _with_run_metrics(update, run_metrics, scope.new_run)
+
+    if inspect.iscoroutinefunction(node):
+
+        @functools.wraps(node)
+        async def async_wrapper(state: Any, config: RunnableConfig) -> Any:
+            scope, token, started = start(state, config)
+            try:
+                update = await node(state, config)
+            except BaseException:
+                _scope.reset(token)
+                raise
+            return finish(scope, token, started, update)
+
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state: Any, config: RunnableConfig) -> Any:
+        scope, token, started = start(state, config)
+        try:
+            update = node(state, config)
+        except BaseException:
+            _scope.reset(token)
+            raise
+        return finish(scope, token, started, update)
+
+    return wrapper
@@ -0,0 +1,140 @@
+import threading
+from enum import Enum
+from typing import Any, Callable, Union
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.runnables import Runnable
+
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.metrics import MetricsCallbackHandler
+from src.grant_writing_agent.resources import registry
+
+# Connection pool limits of the HTTP clients shared by all the OpenAI models
+HTTP_MAX_CONNECTIONS = 100
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_KEEPALIVE_EXPIRY = 60  # seconds
+
+# `init_chat_model` provider names of the providers without a dedicated client below
+INIT_CHAT_MODEL_PROVIDERS = {
+    "ollama": "ollama",
+    "google": "google_genai",
+    "deepseek": "deepseek",
+}
+
+# Parameters the models of a provider are created with, unless overridden. ChatOpenAI
+# only reports the token usage of streamed responses by default when it creates its
+# own HTTP clients, and it is passed the shared ones below.
+PROVIDER_PARAMS: dict[str, dict[str, Any]] = {"openai": {"stream_usage": True}}
+
+_models: dict[tuple, BaseChatModel] = {}
+_bound_models: dict[tuple, Runnable] = {}
+_lock = threading.Lock()
+
+
+def _create_http_clients() -> tuple[Any, Any]:
+    import httpx
+
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.Client(limits=limits), httpx.AsyncClient(limits=limits)
+
+
+def _create_chat_model(
+    provider: str, model: str, params: dict[str, Any]
+) -> BaseChatModel:
+    """Create a chat model client for a provider"""
+    if provider == "openai":
+        from langchain_openai import ChatOpenAI
+
+        http_client, http_async_client = registry.get("http_clients")
+        return ChatOpenAI(
+            model=model,
+            http_client=http_client,
+            http_async_client=http_async_client,
+            **params,
+        )
+
+    if provider == "anthropic":
+        from langchain_anthropic import ChatAnthropic
+
+        return ChatAnthropic(model=model, **params)
+
+    if provider == "groq":
+        from langchain_groq import ChatGroq
+
+        return ChatGroq(model=model, **params)
+
+    if provider in INIT_CHAT_MODEL_PROVIDERS:
+        from langchain.chat_models import init_chat_model
+
+        return init_chat_model(
+            model, model_provider=INIT_CHAT_MODEL_PROVIDERS[provider], **params
+        )
+
+    raise ValueError(f"Unsupported model provider: {provider}")
+
+
+registry.register("http_clients", _create_http_clients)
+registry.register("chat_model_factory", lambda: _create_chat_model)
+
+
+def get_chat_model(
+    provider: Union[str, Enum], model: str, **params: Any
+) -> BaseChatModel:
+    """Get the chat model client for (provider, model, params), created once per process."""
+    provider = provider.value if isinstance(provider, Enum) else str(provider)
+    params = {**PROVIDER_PARAMS.get(provider, {}), **params}
+    key = (provider, model, tuple(sorted(params.items())))
+
+    if key not in _models:
+        with _lock:
+            if key not in _models:
+                factory: Callable[..., BaseChatModel] = registry.get(
+                    "chat_model_factory"
+                )
+                chat_model = factory(provider, model, params)
+                # Count the calls and tokens of the model per graph node
+                chat_model.callbacks = [
+                    *(chat_model.callbacks or []),
+                    MetricsCallbackHandler(model),
+                ]
+                _models[key] = chat_model
+    return _models[key]
+
+
+def get_planner_model(configurable: Configuration) -> BaseChatModel:
+    """Get the planner model of the configuration"""
+    return get_chat_model(configurable.planner_provider, configurable.planner_model)
+
+
+def get_writer_model(configurable: Configuration) -> BaseChatModel:
+    """Get the writer model of the configuration"""
+    return get_chat_model(
+        configurable.writer_provider, configurable.writer_model, temperature=0
+    )
+
+
+def get_structured_model(model: BaseChatModel, schema: type) -> Runnable:
+    """Get `model.with_structured_output(schema)`, bound once per model and schema."""
+    key = (id(model), "structured_output", schema)
+    if key not in _bound_models:
+        _bound_models[key] = model.with_structured_output(schema)
+    return _bound_models[key]
+
+
+def get_model_with_tools(model: BaseChatModel, tools: list) -> Runnable:
+    """Get `model.bind_tools(tools)`, bound once per model and list of tools."""
+    key = (id(model), "tools", tuple(tool.name for tool in tools))
+    if key not in _bound_models:
+        _bound_models[key] = model.bind_tools(tools)
+    return _bound_models[key]
+
+
+def clear_model_cache() -> None:
+    """Forget the created models, e.g. after overriding the chat model factory."""
+    with _lock:
+        _models.clear()
+        _bound_models.clear()
@@ -0,0 +1,46 @@
+from enum import Enum
+from typing import Sequence, Union
+
+from langchain_core.messages import SystemMessage
+
+# Providers caching the prompt prefixes ending at explicit cache breakpoints. The
+# other providers (e.g. OpenAI) cache the longest prefix shared with earlier prompts on
+# their own, so for them only the order of the prompt matters.
+CACHE_BREAKPOINT_PROVIDERS = {"anthropic"}
+
+# Maximum number of cache breakpoints in an Anthropic request
+MAX_CACHE_BREAKPOINTS = 4
+
+
+def layered_system_message(
+    provider: Union[str, Enum], stable_layers: Sequence[str], volatile: str = ""
+) -> SystemMessage:
+    """Build a system message with its stable prefix first and its volatile part last.
+
+    The stable layers are ordered from the most to the least shared (e.g. the rules,
+    then the client profile, then the proposal), so consecutive calls send the same
+    prefix and the provider serves it from its prompt cache. For the providers with
+    explicit cache breakpoints, each stable layer ends with one.
+
+    Args:
+        provider: Provider of the model the message is sent to.
+        stable_layers: Parts of the prompt repeated across calls, most shared first.
+        volatile: Part of the prompt that changes with every call.
+
+    Returns:
+        SystemMessage: A text message, or text blocks with cache breakpoints.
+    """
+    provider = provider.value if isinstance(provider, Enum) else str(provider)
+    layers = [layer.strip() for layer in stable_layers if layer.strip()]
+    volatile = volatile.strip()
+
+    if provider not in CACHE_BREAKPOINT_PROVIDERS:
+        return SystemMessage(content="\n\n".join([*layers, volatile]).strip())
+
+    blocks = [{"type": "text", "text": layer} for layer in layers]
+    # A breakpoint caches the whole prefix before it, so keep the last ones
+    for block in blocks[-MAX_CACHE_BREAKPOINTS:]:
+        block["cache_control"] = {"type": "ephemeral"}
+    if volatile:
+        blocks.append({"type": "text", "text": volatile})
+    return SystemMessage(content=blocks)
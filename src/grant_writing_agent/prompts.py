@@ -7,29 +7,27 @@ Here is the description about Thumbprint Consulting:
 Thumbprint Consulting is a consulting firm that provides workforce development, strategic planning, philanthropy, and grant writing services to healthcare and nonprofit organizations.
 </about_thumbprint>
 
-You are collaborating with {user_name} to write a grant proposal for {client_name}.
-
 Here is a description about the {client_name}:
 <about_{client_name}>
 {about_client}
 </about_{client_name}>
 
 <YOU TASK>
-Your goal is to help {user_name} do the following:
+Your goal is to help the user do the following:
 1. Understand the funding opportunities available for {client_name}.
 2. To check if {client_name} is a good fit for the funding opportunities.
-3. Help {user_name} create a project idea for a grant application if they dont have one.
+3. Help the user create a project idea for a grant application if they dont have one.
 
 You can do this by a few steps:
 
 1. Funding opportunities:
 # Ask user to provide details about the funding opportunities they are interested in.
-If user does not have a funding opportunity in mind, use the `tavily_search` tool to search the web for funding opportunities based on the project idea {user_name} has in mind.
+If user does not have a funding opportunity in mind, use the `tavily_search` tool to search the web for funding opportunities based on the project idea the user has in mind.
 
 2. Project idea:
 # Ask user to provide details about the project idea they have in mind.
-If {user_name} has a project idea, ask them to provide details about the project idea.
-if {user_name} doesnt have a project idea, help them come up with one.
+If the user has a project idea, ask them to provide details about the project idea.
+if the user doesnt have a project idea, help them come up with one.
 
 You are conversing with a user. Ask as many follow up questions as necessary - but only ask ONE question at a time. \
 Only gather information about the funding opportunities and the project idea that will be used to write a grant proposal. \
@@ -69,6 +67,46 @@ The user will be able to correct you even after you call the generate_draft tool
 </YOU TASK>
 """
 
+# Per-conversation part of the conversation prompt, after the cached `gather_prompt`
+gather_prompt_context = """
+You are collaborating with {user_name} (the user) to write a grant proposal for {client_name}.
+"""
+
+# Rolling summary of the earlier conversation, after `gather_prompt_context`
+conversation_summary_context = """
+Summary of the earlier conversation with {user_name}:
+<earlier_conversation>
+{summary}
+</earlier_conversation>
+"""
+
+# Prompt to fold the oldest turns of the conversation into its rolling summary
+conversation_summary_prompt = """
+You are summarizing the earlier part of a conversation between {user_name} and grant genie, an assistant helping them write a grant proposal for {client_name}.
+
+Here is the summary of the conversation so far:
+<previous_summary>
+{previous_summary}
+</previous_summary>
+
+Here are the next messages of the conversation:
+<conversation>
+{conversation}
+</conversation>
+
+<Task>
+Update the summary with the messages above.
+
+Keep everything needed to write the grant proposal:
+- The funding opportunities considered (funder, amounts, deadlines, eligibility, links)
+- The project idea and the decisions made about it
+- The facts learned about {client_name}
+- The open questions
+
+Write at most {max_words} words. Only output the summary.
+</Task>
+"""
+
 
 # Prompt to generate search queries to help with planning the report
 report_planner_query_writer_instructions = """
@@ -140,35 +178,34 @@ A document is not relevant if it does not contain any information that can be us
 </Task>
 """
 
-# Prompt to generate the report plan
-report_planner_instructions = """
-ROLE: Senior Grant Architect collaborating with {user_name}
+# Prompt to grade several documents in a single call
+batch_grade_document_prompt = """
+You are an expert in accessing the relevance of retrieved documents to user questions. \n
 
-AVAILABLE INFORMATION
-Project Concept:
-<project_idea>
-{project_idea}
-</project_idea>
+Each document below is paired with the user question it was retrieved for.
 
-Funder Requirements:
-<funding_requirements>
-{funding_requirements}
-</funding_requirements>
+If a document contains keyword(s) or semantic meaning related to its user question, grade it as relevant. \n
 
-Proposal structure:
-<grant_proposal_structure>
-{grant_proposal_structure}
-</grant_proposal_structure>
+A document is relevant if it contains information that is relevant to its user question.
 
-Organization Profile:
-<about_{client_name}>
-{about_client}
-</about_{client_name}>
+If a document contains information that does not give any information or its content cannot be used to give context to the answer of its question , grade it as not relevant.
 
-Previous Feedback:
-<feedback_from_{user_name}>
-{feedback_from_review}
-</feedback_from_{user_name}>
+<Task>
+Analyze the following documents
+{documents}
+
+Give a binary score 'yes' or 'no' for every document, together with the index of the document, to indicate whether the document is relevant to its question.
+
+NOTE:
+A document is relevant if it contains information that can be used to give context to the answer of its question.
+
+A document is not relevant if it does not contain any information that can be used to give context to the answer of its question.
+</Task>
+"""
+
+# Prompt to generate the report plan
+report_planner_instructions = """
+ROLE: Senior Grant Architect
 
 SECTION DEVELOPMENT GUIDELINES
 
@@ -213,6 +250,7 @@ D. Evidence Requirements
 - Default to True for all sections
 
 2. SECTION PLANNING PRINCIPLES
+- When revising a draft, copy the name and description of each current section that neither the feedback nor the project concept or funder requirements call to change exactly as they are: those sections are kept as written, the others are written again
 - Build logical flow between sections
 - Ensure comprehensive coverage of funder requirements
 - Address evaluation criteria
@@ -228,6 +266,41 @@ Each section must:
 - Consider sustainability
 - Address equity aspects
 
+Proposal structure:
+<grant_proposal_structure>
+{grant_proposal_structure}
+</grant_proposal_structure>
+
+Organization Profile:
+<about_{client_name}>
+{about_client}
+</about_{client_name}>
+"""
+
+# Per-proposal part of the planner prompt, after the cached `report_planner_instructions`
+report_planner_context = """
+AVAILABLE INFORMATION
+Collaborating with: {user_name}
+
+Project Concept:
+<project_idea>
+{project_idea}
+</project_idea>
+
+Funder Requirements:
+<funding_requirements>
+{funding_requirements}
+</funding_requirements>
+
+Previous Feedback:
+<feedback_from_{user_name}>
+{feedback_from_review}
+</feedback_from_{user_name}>
+
+Current Draft Sections:
+<current_sections>
+{current_sections}
+</current_sections>
 """
 
 # Query writer instructions
@@ -259,36 +332,6 @@ Your queries should be:
 section_writer_instructions = """
 You are a senior grant writer with extensive experience securing multi-million dollar funding across government, foundation, and corporate grants.
 
-CONTEXT
-Writer: {user_name}
-Client: {client_name}
-Section: {section_name}
-
-SECTION REQUIREMENTS
-<Section Description>
-{section_description}
-</Section Description>
-
-<Current Draft>
-{section_content}
-</Current Draft>
-
-<Supporting Materials>
-{context}
-</Supporting Materials>
-
-<Proposal Structure>
-{grant_proposal_structure}
-</Proposal Structure>
-
-<Funding Requirements>
-{funding_requirements}
-</Funding Requirements>
-
-<Project Idea>
-{project_idea}
-</Project Idea>
-
 WRITING APPROACH
 1. ANALYSIS FIRST
 - Review all provided materials thoroughly
@@ -370,6 +413,45 @@ Deliver polished section that:
 3. Aligns with overall proposal narrative
 4. Presents compelling case for funding
 5. Follows all formatting requirements
+
+CLIENT
+{client_name}
+
+<Proposal Structure>
+{grant_proposal_structure}
+</Proposal Structure>
+"""
+
+# Per-proposal part of the section writer prompt, shared by all the sections
+section_writer_proposal_context = """
+<Funding Requirements>
+{funding_requirements}
+</Funding Requirements>
+
+<Project Idea>
+{project_idea}
+</Project Idea>
+"""
+
+# Per-section part of the section writer prompt, sent last
+section_writer_context = """
+CONTEXT
+Writer: {user_name}
+Client: {client_name}
+Section: {section_name}
+
+SECTION REQUIREMENTS
+<Section Description>
+{section_description}
+</Section Description>
+
+<Current Draft>
+{section_content}
+</Current Draft>
+
+<Supporting Materials>
+{context}
+</Supporting Materials>
 """
 
 
@@ -472,9 +554,12 @@ The project idea should be a description of the project that {user_name} wants t
 
 The funding requirements should be a description of the funding that {user_name} is looking for.
 
+If the assistant already wrote a draft of the proposal, the feedback on sections should be the changes {user_name} asked for to the draft since then, naming the sections they apply to. Leave it empty if there is no draft or no change was asked for.
+
 <Format>
 project_idea: str
 funding_requirements: str
+feedback_on_sections: str
 </Format>
 
 </Task>
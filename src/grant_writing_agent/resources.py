@@ -0,0 +1,139 @@
+import asyncio
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+DB_NAME = "vector_store"
+COLLECTION_NAME = "client_docs_vector_store"
+ATLAS_VECTOR_SEARCH_INDEX_NAME = "client_docs_vector_index"
+
+# Size of the connection pool shared by all the vector searches of a worker
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", 50))
+
+
+class ResourceRegistry:
+    """Lazily created, process-wide shared resources (clients, models, stores).
+
+    Resources are registered with a factory and created on first use, so importing
+    the graph needs neither network access nor credentials. Each resource is created
+    once per process and the time spent creating it is recorded as its cold-start
+    time. Resources can be overridden, e.g. with local fakes in benchmarks.
+    """
+
+    def __init__(self):
+        self._factories: dict[str, Callable[[], Any]] = {}
+        self._instances: dict[str, Any] = {}
+        self._timings: dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    def register(self, name: str, factory: Callable[[], Any]) -> None:
+        """Register the factory creating a resource."""
+        self._factories[name] = factory
+
+    def get(self, name: str) -> Any:
+        """Get a resource, creating it on first use."""
+        if name in self._instances:
+            return self._instances[name]
+
+        with self._lock:
+            if name not in self._instances:
+                start = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self._timings[name] = time.perf_counter() - start
+                logger.info("Created %s in %.1f ms", name, self._timings[name] * 1000)
+            return self._instances[name]
+
+    def is_created(self, name: str) -> bool:
+        """Whether a resource was created (or overridden) already."""
+        return name in self._instances
+
+    def record_timing(self, name: str, seconds: float) -> None:
+        """Record the cold-start time of a resource created outside the registry."""
+        self._timings[name] = seconds
+
+    def override(self, name: str, instance: Any) -> None:
+        """Use the given instance for a resource instead of creating it."""
+        with self._lock:
+            self._instances[name] = instance
+
+    def reset(self) -> None:
+        """Forget all the created resources, they are recreated on next use."""
+        with self._lock:
+            self._instances.clear()
+            self._timings.clear()
+
+    def cold_start_report(self) -> dict[str, float]:
+        """Get the time in seconds spent creating each resource."""
+        return dict(self._timings)
+
+
+registry = ResourceRegistry()
+
+
+def _create_mongo_client():
+    from pymongo import MongoClient
+
+    return MongoClient(os.getenv("MONGODB_URI"), maxPoolSize=MONGODB_MAX_POOL_SIZE)
+
+
+def _create_embeddings():
+    from langchain_openai import OpenAIEmbeddings
+
+    from src.grant_writing_agent.cache import PersistentLRUCache
+    from src.grant_writing_agent.embeddings import CachedEmbeddings
+
+    # Cache query embeddings in memory and on disk (text-embedding-3-large vectors are 12KB each)
+    return CachedEmbeddings(
+        OpenAIEmbeddings(model="text-embedding-3-large"),
+        cache=PersistentLRUCache(
+            path=os.getenv("EMBEDDING_CACHE_PATH", ".cache/embedding_cache.sqlite"),
+            table="embeddings",
+            max_entries=int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 50_000)),
+            max_memory_entries=int(
+                os.getenv("EMBEDDING_CACHE_MAX_MEMORY_ENTRIES", 2_000)
+            ),
+        ),
+    )
+
+
+registry.register("mongo_client", _create_mongo_client)
+registry.register("embeddings", _create_embeddings)
+
+
+def get_mongo_client():
+    """Get the shared (pooled) sync MongoDB client, used to export the local index.
+
+    The graph and the tools search Atlas with the async client.
+    """
+    return registry.get("mongo_client")
+
+
+def get_embeddings():
+    """Get the shared, cached embedding model."""
+    return registry.get("embeddings")
+
+
+# Motor clients are bound to the event loop they are first used on
+_async_mongo_clients: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_async_mongo_client():
+    """Get the async (Motor) MongoDB client of the running event loop."""
+    if registry.is_created("async_mongo_client"):
+        return registry.get("async_mongo_client")
+
+    loop = asyncio.get_running_loop()
+    if loop not in _async_mongo_clients:
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        start = time.perf_counter()
+        _async_mongo_clients[loop] = AsyncIOMotorClient(
+            os.getenv("MONGODB_URI"), maxPoolSize=MONGODB_MAX_POOL_SIZE
+        )
+        registry.record_timing("async_mongo_client", time.perf_counter() - start)
+    return _async_mongo_clients[loop]
@@ -0,0 +1,208 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, Optional
+
+from bson import ObjectId
+from langchain_core.documents import Document
+
+from src.grant_writing_agent.configuration import Configuration, RetrievalBackend
+from src.grant_writing_agent.metrics import record
+from src.grant_writing_agent.utils import chunk_id
+from src.grant_writing_agent.resources import (
+    DB_NAME,
+    COLLECTION_NAME,
+    ATLAS_VECTOR_SEARCH_INDEX_NAME,
+    get_async_mongo_client,
+    get_embeddings,
+)
+
+if TYPE_CHECKING:
+    from src.grant_writing_agent.local_index import LocalVectorIndex
+
+# Number of candidates considered by Atlas per result returned
+NUM_CANDIDATES_MULTIPLIER = 10
+
+# Rank constant of reciprocal rank fusion, dampening the weight of the top ranks
+RRF_K = 60
+
+
+def get_async_collection():
+    """Get the vector store collection through the async client of the running event loop."""
+    return get_async_mongo_client()[DB_NAME][COLLECTION_NAME]
+
+
+def vector_search_pipeline(
+    query_vector: list[float], k: int, pre_filter: Optional[dict[str, Any]] = None
+) -> list[dict[str, Any]]:
+    """Build the Atlas `$vectorSearch` aggregation pipeline for a query vector."""
+    vector_search = {
+        "index": ATLAS_VECTOR_SEARCH_INDEX_NAME,
+        "path": "embedding",
+        "queryVector": query_vector,
+        "numCandidates": k * NUM_CANDIDATES_MULTIPLIER,
+        "limit": k,
+    }
+    if pre_filter:
+        vector_search["filter"] = pre_filter
+
+    return [
+        {"$vectorSearch": vector_search},
+        {"$set": {"score": {"$meta": "vectorSearchScore"}}},
+        {"$project": {"embedding": 0}},
+    ]
+
+
+def _to_document(result: dict[str, Any]) -> tuple[Document, float]:
+    """Convert a `$vectorSearch` result into a document and its relevance score."""
+    text = result.pop("text", "")
+    score = result.pop("score", 0.0)
+    metadata = {
+        key: str(value) if isinstance(value, ObjectId) else value
+        for key, value in result.items()
+    }
+    return Document(page_content=text, metadata=metadata), score
+
+
+async def asimilarity_search_by_vector_with_score(
+    query_vector: list[float], k: int, pre_filter: Optional[dict[str, Any]] = None
+) -> list[tuple[Document, float]]:
+    """Search the vector store for the documents closest to a query vector."""
+    collection = get_async_collection()
+    cursor = collection.aggregate(vector_search_pipeline(query_vector, k, pre_filter))
+    return [_to_document(result) async for result in cursor]
+
+
+async def aget_vector_index(
+    configurable: Configuration,
+) -> Optional["LocalVectorIndex"]:
+    """Get the local index or snapshot of the configured client, or None to search Atlas."""
+    backend = RetrievalBackend(configurable.retrieval_backend)
+    if backend is RetrievalBackend.ATLAS:
+        return None
+
+    # NumPy is only imported when a local index is used
+    if backend is RetrievalBackend.SNAPSHOT:
+        from src.grant_writing_agent.snapshot import aget_client_snapshot
+
+        return await aget_client_snapshot(
+            configurable.client_id,
+            configurable.snapshot_dtype,
+            configurable.snapshot_check_interval_seconds,
+            configurable.snapshot_max_clients,
+            configurable.snapshot_idle_seconds,
+        )
+
+    from src.grant_writing_agent.local_index import get_local_index
+
+    return await asyncio.to_thread(
+        get_local_index, configurable.local_index_path, configurable.client_id
+    )
+
+
+def warm_vector_index(configurable: Configuration) -> None:
+    """Start loading the snapshot of the configured client, if snapshots are used."""
+    if RetrievalBackend(configurable.retrieval_backend) is RetrievalBackend.SNAPSHOT:
+        from src.grant_writing_agent.snapshot import warm_client_snapshot
+
+        warm_client_snapshot(
+            configurable.client_id,
+            configurable.snapshot_dtype,
+            configurable.snapshot_check_interval_seconds,
+            configurable.snapshot_max_clients,
+            configurable.snapshot_idle_seconds,
+        )
+
+
+async def asimilarity_search_many_with_score(
+    queries: list[str],
+    k: int,
+    pre_filter: Optional[dict[str, Any]] = None,
+    index: Optional["LocalVectorIndex"] = None,
+) -> list[list[tuple[Document, float]]]:
+    """Search the vector store for several queries concurrently.
+
+    All the queries are embedded in one request. They are then searched in the local
+    `index` if given, or concurrently in Atlas over the shared connection pool so no
+    search blocks the event loop.
+
+    Returns:
+        list[list[tuple[Document, float]]]: The documents found for each query and their
+            cosine scores (normalized to [0, 1]), in the order of `queries`.
+    """
+    if not queries:
+        return []
+
+    record("vector_queries", len(queries))
+    query_vectors = await get_embeddings().aembed_documents(queries)
+
+    if index is not None:
+        results = index.search_many_with_score(query_vectors, k, pre_filter)
+    else:
+        results = await asyncio.gather(
+            *(
+                asimilarity_search_by_vector_with_score(query_vector, k, pre_filter)
+                for query_vector in query_vectors
+            )
+        )
+    return list(results)
+
+
+async def asimilarity_search_many(
+    queries: list[str],
+    k: int,
+    pre_filter: Optional[dict[str, Any]] = None,
+    index: Optional["LocalVectorIndex"] = None,
+) -> list[list[Document]]:
+    """Search the vector store for several queries concurrently.
+
+    Returns:
+        list[list[Document]]: The documents found for each query, in the order of `queries`.
+    """
+    results = await asimilarity_search_many_with_score(queries, k, pre_filter, index)
+    return [[doc for doc, _ in docs_and_scores] for docs_and_scores in results]
+
+
+def reciprocal_rank_fusion(
+    queries: list[str],
+    results: list[list[tuple[Document, float]]],
+    rrf_k: int = RRF_K,
+) -> list[tuple[str, Document, float]]:
+    """Fuse the ranked results of several queries into one ranking.
+
+    Each document scores `1 / (rrf_k + rank)` for every query that found it, and
+    documents with the same content (by content hash) are counted once.
+
+    Returns:
+        list[tuple[str, Document, float]]: The unique documents, best first, each with
+            the query that ranked it highest and its vector score for that query.
+    """
+    fused: dict[str, list] = {}  # chunk ID -> [RRF score, best rank, query, doc, score]
+    for query, docs_and_scores in zip(queries, results):
+        for rank, (doc, score) in enumerate(docs_and_scores, start=1):
+            key = chunk_id(doc.page_content)
+            if key not in fused:
+                fused[key] = [0.0, rank, query, doc, score]
+            entry = fused[key]
+            entry[0] += 1 / (rrf_k + rank)
+            if rank < entry[1]:
+                entry[1:] = [rank, query, doc, score]
+
+    ranked = sorted(fused.values(), key=lambda entry: entry[0], reverse=True)
+    return [(query, doc, score) for _, _, query, doc, score in ranked]
+
+
+async def afused_search(
+    queries: list[str],
+    k: int,
+    pre_filter: Optional[dict[str, Any]] = None,
+    index: Optional["LocalVectorIndex"] = None,
+    max_candidates: Optional[int] = None,
+) -> list[tuple[str, Document, float]]:
+    """Search several queries at once and fuse their results with reciprocal rank fusion.
+
+    Returns:
+        list[tuple[str, Document, float]]: At most `max_candidates` unique documents,
+            best first, each with the query that ranked it highest (to grade it
+            against) and its vector score for that query.
+    """
+    results = await asimilarity_search_many_with_score(queries, k, pre_filter, index)
+    return reciprocal_rank_fusion(queries, results)[:max_candidates]
@@ -0,0 +1,250 @@
+import asyncio
+import hashlib
+import json
+import logging
+import re
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+from urllib.parse import urlsplit
+
+from src.grant_writing_agent.cache import PersistentLRUCache, get_page_cache
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.context import aget_encoding, truncate_to_tokens
+from src.grant_writing_agent.metrics import record
+from src.grant_writing_agent.resources import registry
+
+logger = logging.getLogger(__name__)
+
+# Connection pool limits of the HTTP client shared by all the scrapes
+HTTP_MAX_CONNECTIONS = 50
+HTTP_MAX_KEEPALIVE_CONNECTIONS = 10
+
+# Pages are read up to this size, the rest of the body is not downloaded
+MAX_DOWNLOAD_BYTES = 5 * 2**20
+
+USER_AGENT = "Mozilla/5.0 (compatible; GrantWritingAgent/1.0)"
+
+# Elements that are not part of the content of a page
+BOILERPLATE_TAGS = (
+    "script",
+    "style",
+    "noscript",
+    "template",
+    "svg",
+    "canvas",
+    "iframe",
+    "form",
+    "button",
+    "nav",
+    "header",
+    "footer",
+    "aside",
+)
+BOILERPLATE_ROLES = ("navigation", "banner", "contentinfo", "complementary", "search")
+
+TEXT_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+
+
+@dataclass
+class ScrapedPage:
+    """Text of a scraped page, or the error that prevented scraping it."""
+
+    url: str
+    title: str = ""
+    text: str = ""
+    error: Optional[str] = None
+    cached: bool = False  # Served from the page cache, as is or after a 304
+
+
+def _create_scraping_client():
+    import httpx
+
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+        headers={"User-Agent": USER_AGENT},
+        follow_redirects=True,
+    )
+
+
+registry.register("scraping_http_client", _create_scraping_client)
+
+
+def extract_text(html: bytes, encoding: Optional[str] = None) -> tuple[str, str]:
+    """Get the title and the main text of an HTML page, without its boilerplate.
+
+    Scripts, styles, forms, navigation, headers, footers and sidebars are removed, and
+    the text is taken from the `<main>` or `<article>` element when the page has one.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser", from_encoding=encoding)
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+
+    for element in soup(BOILERPLATE_TAGS):
+        element.decompose()
+    for element in soup.find_all(attrs={"role": BOILERPLATE_ROLES}):
+        element.decompose()
+
+    content = soup.find("main") or soup.find("article") or soup.body or soup
+    lines = (" ".join(line.split()) for line in content.get_text("\n").splitlines())
+    return title, "\n".join(line for line in lines if line)
+
+
+def _page_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()
+
+
+async def _acached_page(
+    cache: Optional[PersistentLRUCache], url: str
+) -> Optional[dict]:
+    if cache is None:
+        return None
+    value = await cache.aget(_page_key(url))
+    return json.loads(value) if value is not None else None
+
+
+def _cache_page(cache: Optional[PersistentLRUCache], url: str, entry: dict) -> None:
+    if cache is not None:
+        cache.set(_page_key(url), json.dumps(entry))
+
+
+async def _aread_body(response: Any) -> bytes:
+    """Read the body of a streamed response, up to `MAX_DOWNLOAD_BYTES`."""
+    chunks, size = [], 0
+    async for chunk in response.aiter_bytes():
+        chunks.append(chunk)
+        size += len(chunk)
+        if size >= MAX_DOWNLOAD_BYTES:
+            logger.info("Read the first %d bytes of %s", size, response.url)
+            break
+    return b"".join(chunks)[:MAX_DOWNLOAD_BYTES]
+
+
+async def _afetch_page(
+    url: str,
+    semaphore: asyncio.Semaphore,
+    cache: Optional[PersistentLRUCache],
+    configurable: Configuration,
+) -> ScrapedPage:
+    """Fetch a page, or get it from the cache (revalidated when it is stale)."""
+    entry = await _acached_page(cache, url)
+    if (
+        entry
+        and time.time() - entry["fetched_at"] < configurable.scrape_cache_fresh_seconds
+    ):
+        record("pages_cached")
+        return ScrapedPage(url, entry["title"], entry["text"], cached=True)
+
+    # Ask the server to only send the page if it changed since it was cached
+    headers = {}
+    if entry and entry.get("etag"):
+        headers["If-None-Match"] = entry["etag"]
+    if entry and entry.get("last_modified"):
+        headers["If-Modified-Since"] = entry["last_modified"]
+
+    client = registry.get("scraping_http_client")
+    timeout = configurable.scrape_timeout_seconds
+    # Bound the whole request, a slow server can send a byte at a time
+    async with semaphore, asyncio.timeout(timeout):
+        async with client.stream(
+            "GET", url, headers=headers, timeout=timeout
+        ) as response:
+            if response.status_code == 304 and entry:
+                record("pages_cached")
+                _cache_page(cache, url, {**entry, "fetched_at": time.time()})
+                return ScrapedPage(url, entry["title"], entry["text"], cached=True)
+
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "")
+            content_type = content_type.split(";")[0].strip().lower()
+            if content_type and content_type not in TEXT_CONTENT_TYPES:
+                return ScrapedPage(
+                    url, error=f"Unsupported content type {content_type}"
+                )
+
+            record("pages_fetched")
+            body = await _aread_body(response)
+            encoding = response.charset_encoding
+
+    # Parse outside of the event loop, large pages take a while
+    if content_type == "text/plain":
+        title, text = "", body.decode(encoding or "utf-8", errors="replace")
+    else:
+        title, text = await asyncio.to_thread(extract_text, body, encoding)
+
+    _cache_page(
+        cache,
+        url,
+        {
+            "title": title,
+            "text": text,
+            "etag": response.headers.get("etag"),
+            "last_modified": response.headers.get("last-modified"),
+            "fetched_at": time.time(),
+        },
+    )
+    return ScrapedPage(url, title, text)
+
+
+async def ascrape_pages(
+    urls: list[str], configurable: Configuration
+) -> list[ScrapedPage]:
+    """Scrape web pages concurrently, with at most a few requests per host at a time.
+
+    Pages are cached on disk. A page fetched less than `scrape_cache_fresh_seconds`
+    ago is served from the cache, and a stale one is requested again with its ETag
+    and Last-Modified date, so an unchanged page is not downloaded twice. The text of
+    each page is cut to `scrape_max_page_tokens` tokens.
+
+    Returns:
+        list[ScrapedPage]: The pages, in the order of the (deduplicated) URLs. A page
+            that could not be scraped has an error instead of a text.
+    """
+    cache = None
+    if configurable.scrape_cache_enabled:
+        cache = get_page_cache(
+            configurable.scrape_cache_path, configurable.scrape_cache_max_entries
+        )
+
+    urls = list(dict.fromkeys(url.strip() for url in urls if url.strip()))
+    await aget_encoding(configurable.writer_model)
+    semaphores: dict[str, asyncio.Semaphore] = {}
+    for url in urls:
+        host = urlsplit(url).netloc.lower()
+        semaphores.setdefault(
+            host, asyncio.Semaphore(configurable.scrape_max_concurrent_per_host)
+        )
+
+    async def scrape(url: str) -> ScrapedPage:
+        try:
+            page = await _afetch_page(
+                url, semaphores[urlsplit(url).netloc.lower()], cache, configurable
+            )
+        except Exception as error:
+            logger.warning("Could not scrape %s: %r", url, error)
+            return ScrapedPage(url, error=f"{type(error).__name__}: {error}")
+
+        page.text = truncate_to_tokens(
+            page.text, configurable.scrape_max_page_tokens, configurable.writer_model
+        )
+        return page
+
+    pages = await asyncio.gather(*(scrape(url) for url in urls))
+    if cache is not None:
+        await cache.aflush()
+    return pages
+
+
+def format_page(page: ScrapedPage) -> str:
+    """Format a scraped page for the assistant."""
+    title = re.sub(r'["<>]', "", page.title)
+    if page.error:
+        return (
+            f'<Document name="{title}" url="{page.url}">\n'
+            f"Could not scrape the page: {page.error}\n</Document>"
+        )
+    return f'<Document name="{title}" url="{page.url}">\n{page.text}\n</Document>'
@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Optional
+
+from src.grant_writing_agent.local_index import LocalVectorIndex
+from src.grant_writing_agent.retrieval import get_async_collection
+
+logger = logging.getLogger(__name__)
+
+
+# Default bounds of the snapshots kept in memory
+MAX_SNAPSHOTS = 20
+SNAPSHOT_IDLE_SECONDS = 60 * 60
+
+
+@dataclass
+class _Snapshot:
+    index: LocalVectorIndex
+    fingerprint: tuple
+    checked_at: float
+    used_at: float
+
+
+# Snapshots per (client, dtype), least recently used first
+_snapshots: OrderedDict[tuple[str, str], _Snapshot] = OrderedDict()
+
+# Snapshots being loaded, shared by the concurrent searches of a client
+_loading: dict[tuple[Any, str, str], asyncio.Task] = {}
+
+
+async def _afingerprint(client_id: str) -> tuple:
+    """Get the (number of documents, last `_id`) of a client in the Atlas collection.
+
+    Documents are only added and deleted (chunks are re-inserted when a document is
+    updated), so a change of either means the snapshot is out of date.
+    """
+    cursor = get_async_collection().aggregate(
+        [
+            {"$match": {"client_id": client_id}},
+            {
+                "$group": {
+                    "_id": None,
+                    "count": {"$sum": 1},
+                    "last_id": {"$max": "$_id"},
+                }
+            },
+        ]
+    )
+    async for result in cursor:
+        return (result["count"], str(result["last_id"]))
+    return (0, None)
+
+
+async def _aload_snapshot(client_id: str, dtype: str) -> _Snapshot:
+    """Read all the documents of a client from Atlas, in one bulk read."""
+    start = time.perf_counter()
+    fingerprint = await _afingerprint(client_id)
+    documents = [
+        document
+        async for document in get_async_collection().find({"client_id": client_id})
+    ]
+    index = await asyncio.to_thread(LocalVectorIndex.from_documents, documents, dtype)
+
+    logger.info(
+        "Loaded the %d documents of client %s (%.1f MB of %s embeddings) in %.0f ms",
+        len(index),
+        client_id,
+        index.embeddings.nbytes / 2**20,
+        dtype,
+        (time.perf_counter() - start) * 1000,
+    )
+    now = time.monotonic()
+    return _Snapshot(index, fingerprint, checked_at=now, used_at=now)
+
+
+def _evict_snapshots(max_snapshots: int, idle_seconds: float) -> None:
+    """Forget the snapshots unused for `idle_seconds`, and the least recently used
+    ones beyond `max_snapshots`."""
+    now = time.monotonic()
+    for key, snapshot in list(_snapshots.items()):
+        if len(_snapshots) > max_snapshots or now - snapshot.used_at > idle_seconds:
+            del _snapshots[key]
+            logger.info("Evicted the snapshot of client %s (%s)", *key)
+
+
+async def aget_client_snapshot(
+    client_id: str,
+    dtype: str = "float32",
+    check_interval_seconds: float = 60,
+    max_snapshots: int = MAX_SNAPSHOTS,
+    idle_seconds: float = SNAPSHOT_IDLE_SECONDS,
+) -> LocalVectorIndex:
+    """Get an in-memory index of a client's documents, read once from Atlas.
+
+    The snapshot is shared by all the threads of the client. At most every
+    `check_interval_seconds`, the client's documents are fingerprinted and the
+    snapshot is read again if they changed. At most `max_snapshots` snapshots are kept,
+    and a snapshot unused for `idle_seconds` is dropped.
+    """
+    key = (client_id, dtype)
+    _evict_snapshots(max_snapshots, idle_seconds)
+    snapshot = _snapshots.get(key)
+    if snapshot:
+        snapshot.used_at = time.monotonic()
+        _snapshots.move_to_end(key)
+        if time.monotonic() - snapshot.checked_at < check_interval_seconds:
+            return snapshot.index
+
+    # Share the load between the searches started before the snapshot is ready
+    loop_key = (asyncio.get_running_loop(), *key)
+    if loop_key not in _loading:
+        _loading[loop_key] = asyncio.create_task(
+            _arefresh(key, snapshot, max_snapshots, idle_seconds)
+        )
+        _loading[loop_key].add_done_callback(lambda _: _loading.pop(loop_key, None))
+    return await asyncio.shield(_loading[loop_key])
+
+
+async def _arefresh(
+    key: tuple[str, str],
+    snapshot: Optional[_Snapshot],
+    max_snapshots: int,
+    idle_seconds: float,
+):
+    client_id, dtype = key
+    if snapshot is not None:
+        if await _afingerprint(client_id) == snapshot.fingerprint:
+            snapshot.checked_at = time.monotonic()
+            return snapshot.index
+        logger.info("Documents of client %s changed, reloading them", client_id)
+
+    snapshot = await _aload_snapshot(client_id, dtype)
+    _snapshots[key] = snapshot
+    _snapshots.move_to_end(key)
+    _evict_snapshots(max_snapshots, idle_seconds)
+    return snapshot.index
+
+
+# Keep references to the warm-up tasks so they are not garbage collected
+_warmups: set[asyncio.Task] = set()
+
+
+def warm_client_snapshot(
+    client_id: str,
+    dtype: str = "float32",
+    check_interval_seconds: float = 60,
+    max_snapshots: int = MAX_SNAPSHOTS,
+    idle_seconds: float = SNAPSHOT_IDLE_SECONDS,
+) -> None:
+    """Start loading the snapshot of a client in the background."""
+    task = asyncio.create_task(
+        aget_client_snapshot(
+            client_id, dtype, check_interval_seconds, max_snapshots, idle_seconds
+        )
+    )
+    _warmups.add(task)
+    task.add_done_callback(_warmups.discard)
+    # The searches report the errors, don't log them twice
+    task.add_done_callback(lambda task: task.cancelled() or task.exception())
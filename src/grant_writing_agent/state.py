@@ -1,9 +1,10 @@
 from typing import Annotated, List, TypedDict, Literal
 from pydantic import BaseModel, Field
-import operator
 from langgraph.graph import MessagesState
 from langchain_core.documents import Document
 
+from src.grant_writing_agent.metrics import merge_run_metrics
+
 
 class SearchQuery(BaseModel):
     search_query: str = Field(
@@ -51,10 +52,12 @@ class Section(BaseModel):
     search_queries: list[SearchQuery] = Field(
         description="List of search queries"
     )  # List of search queries
-    documents: list[str] = Field(description="List of documents")  # List of documents
+    documents: list[str] = Field(
+        description="List of documents"
+    )  # IDs of the retrieved chunks, stored in the shared document store
     source_str: str = Field(
         description="String of formatted source content from data retrieval"
-    )
+    )  # Unused, the sources are built from the document store at write time
 
 
 class Sections(BaseModel):
@@ -63,6 +66,59 @@ class Sections(BaseModel):
     )
 
 
+def merge_sections(
+    left: list[Section] | None, right: list[Section] | None
+) -> list[Section]:
+    """Merge two lists of sections by name, keeping the order of first appearance.
+
+    Sections in `right` replace sections with the same name in `left`, so a section
+    drafted more than once (e.g. after feedback) only appears once.
+    """
+    merged = {section.name: section for section in left or []}
+    for section in right or []:
+        merged[section.name] = section
+    return list(merged.values())
+
+
+class ReplaceSections(BaseModel):
+    """Update of the `sections` channel replacing the whole list of sections."""
+
+    sections: list[Section]
+
+
+def update_sections(
+    left: list[Section] | None, right: list[Section] | ReplaceSections | None
+) -> list[Section]:
+    """Reducer of the `sections` channel.
+
+    Updates are merged by section name, so a node can write only the sections it
+    changed. A `ReplaceSections` update replaces the whole list (e.g. when the sections
+    are planned again).
+    """
+    if isinstance(right, ReplaceSections):
+        return list(right.sections)
+    return merge_sections(left, right)
+
+
+class ReplaceDocuments(BaseModel):
+    """Update of the `document_store` channel replacing the whole store."""
+
+    documents: dict[str, str]
+
+
+def update_document_store(
+    left: dict[str, str] | None, right: dict[str, str] | ReplaceDocuments | None
+) -> dict[str, str]:
+    """Reducer of the `document_store` channel.
+
+    Updates are added to the store. A `ReplaceDocuments` update replaces it (e.g. to
+    drop the chunks no section refers to anymore).
+    """
+    if isinstance(right, ReplaceDocuments):
+        return dict(right.documents)
+    return {**(left or {}), **(right or {})}
+
+
 class FundingRequirementsProjectIdea(BaseModel):
     project_idea: str = Field(
         description="""
@@ -79,6 +135,10 @@ class FundingRequirementsProjectIdea(BaseModel):
         
         """,
     )
+    feedback_on_sections: str = Field(
+        default="",
+        description="Changes the user asked for to the current draft, naming the sections they apply to. Empty if there is no draft or no change.",
+    )
 
 
 class Queries(BaseModel):
@@ -104,24 +164,44 @@ class GradeDocuments(BaseModel):
     )
 
 
+class DocumentGrade(BaseModel):
+    """Binary score for relevance check on one document of a batch."""
+
+    index: int = Field(description="Index of the graded document")
+    binary_score: str = Field(
+        description="Document is relevant to its question, 'yes' or 'no'"
+    )
+
+
+class BatchGradeDocuments(BaseModel):
+    """Binary scores for relevance check on a batch of retrieved documents."""
+
+    scores: List[DocumentGrade] = Field(
+        description="One relevance score per document in the batch"
+    )
+
+
 class AgentStateInput(MessagesState):
     """State input for the report state."""
 
 
 class AgentStateOutput(TypedDict):
     final_report: str  # Final report
+    run_metrics: Annotated[
+        dict, merge_run_metrics
+    ]  # Wall time, LLM calls, tokens, vector queries and gradings per node and section
 
 
 class AgentState(MessagesState):
     topic: str  # Report topic
     project_idea: str = None  # Project idea
     funding_requirements: str = None  # Funding requirements
-    sections: list[Section]  # List of report sections
+    sections: Annotated[list[Section], update_sections]  # List of report sections
     start_writing_sections: bool = False  # Whether to generate sections
     start_generating_queries: bool = False  # Whether to generate queries
-    completed_sections: list[
-        Section
-    ]  # Changed to be consistent with SectionOutputState
+    completed_sections: Annotated[
+        list[Section], merge_sections
+    ]  # Sections drafted in parallel, joined back by name
     report_sections_from_research: (
         str  # String of any completed sections from research to write final sections
     )
@@ -131,13 +211,30 @@ class AgentState(MessagesState):
     feedback_on_sections: str  # Feedback on the sections
     start_editing_sections: bool = False  # Whether to edit the sections
     search_iterations: int = 0  # Number of search iterations done
+    proposal_inputs_hash: str  # Hash of the config the sections were written for
+    document_store: Annotated[
+        dict[str, str], update_document_store
+    ]  # Retrieved chunks keyed by content hash, shared by all sections
+    conversation_summary: (
+        str  # Rolling summary of the turns left out of the assistant's prompt
+    )
+    summarized_messages: int  # Number of leading messages in the conversation summary
+    run_metrics: Annotated[
+        dict, merge_run_metrics
+    ]  # Wall time, LLM calls, tokens, vector queries and gradings per node and section
 
 
 class SectionState(TypedDict):
     section: Section  # Report section
+    section_index: int  # Position of the section in the plan
+    project_idea: str  # Project idea
+    funding_requirements: str  # Funding requirements
     search_iterations: int  # Number of search iterations done
     search_queries: list[SearchQuery]  # List of search queries
-    source_str: str  # String of formatted source content from web search
+    document_store: Annotated[
+        dict[str, str], update_document_store
+    ]  # Chunks retrieved for the section keyed by content hash
+    run_metrics: Annotated[dict, merge_run_metrics]  # Metrics of the section nodes
     feedback_on_sections: str  # Feedback on the sections
     report_sections_from_research: (
         str  # String of any completed sections from research to write final sections
@@ -146,6 +243,12 @@ class SectionState(TypedDict):
 
 
 class SectionOutputState(TypedDict):
-    completed_sections: list[
-        Section
+    completed_sections: Annotated[
+        list[Section], merge_sections
     ]  # Final key we duplicate in outer state for Send() API
+    document_store: Annotated[
+        dict[str, str], update_document_store
+    ]  # Chunks retrieved for the section, merged into the outer document store
+    run_metrics: Annotated[
+        dict, merge_run_metrics
+    ]  # Metrics of the section nodes, merged into the outer run metrics
@@ -0,0 +1,117 @@
+import json
+import threading
+from collections import OrderedDict
+from string import Formatter
+from typing import Any, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from src.grant_writing_agent import prompts
+
+# Maximum number of rendered static prompts kept per template
+MAX_RENDERED_PER_TEMPLATE = 128
+
+# Roles of the messages in a rendered conversation
+ROLES = {"human": "user", "ai": "assistant", "system": "system", "tool": "tool"}
+
+_formatter = Formatter()
+
+
+class PromptTemplate:
+    """A `str.format` prompt template, parsed once instead of on every render.
+
+    Renders give the same text as `template.format(**values)`. Parts of the prompts
+    repeated across calls (e.g. the rules with the client profile) can be rendered with
+    `render_static`, which renders each set of values once.
+    """
+
+    def __init__(self, name: str, template: str):
+        self.name = name
+        self.template = template
+        self._parts = list(_formatter.parse(template))
+        self.fields = frozenset(
+            field for _, field, _, _ in self._parts if field is not None
+        )
+        self._rendered: OrderedDict[tuple, str] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, **values: Any) -> str:
+        """Render the template with the values of its fields."""
+        rendered = []
+        for literal, field, format_spec, conversion in self._parts:
+            rendered.append(literal)
+            if field is None:
+                continue
+            try:
+                value = values[field]
+            except KeyError:
+                raise KeyError(f"{field} (in the {self.name} prompt)") from None
+            if conversion:
+                value = _formatter.convert_field(value, conversion)
+            rendered.append(
+                _formatter.format_field(value, format_spec)
+                if format_spec
+                else str(value)
+            )
+        return "".join(rendered)
+
+    def render_static(self, **values: Any) -> str:
+        """Render the template, reusing the text rendered earlier for the same values."""
+        key = tuple(sorted(values.items()))
+        with self._lock:
+            if key in self._rendered:
+                self._rendered.move_to_end(key)
+                return self._rendered[key]
+
+        rendered = self.render(**values)
+        with self._lock:
+            self._rendered[key] = rendered
+            if len(self._rendered) > MAX_RENDERED_PER_TEMPLATE:
+                self._rendered.popitem(last=False)
+        return rendered
+
+
+_templates: dict[str, PromptTemplate] = {}
+_lock = threading.Lock()
+
+
+def get_template(name: str) -> PromptTemplate:
+    """Get a prompt of `prompts.py` by name, parsed on first use."""
+    if name not in _templates:
+        with _lock:
+            if name not in _templates:
+                _templates[name] = PromptTemplate(name, getattr(prompts, name))
+    return _templates[name]
+
+
+def _message_text(message: BaseMessage) -> str:
+    """Get the text of a message, without the non-text content blocks (e.g. images)."""
+    if isinstance(message.content, str):
+        return message.content
+    return "\n".join(
+        block if isinstance(block, str) else block.get("text", "")
+        for block in message.content
+        if isinstance(block, str) or block.get("type") == "text"
+    )
+
+
+def format_conversation(messages: Sequence[BaseMessage]) -> str:
+    """Render messages as `role: content` lines, for the prompts quoting a conversation.
+
+    Unlike the `repr` of the messages, this leaves out their IDs, metadata and
+    non-text content. Tool calls are rendered as `assistant: called name(arguments)`.
+    """
+    lines = []
+    for message in messages:
+        role = ROLES.get(message.type, message.type)
+        if isinstance(message, ToolMessage) and message.name:
+            role = f"tool ({message.name})"
+
+        text = _message_text(message).strip()
+        if text:
+            lines.append(f"{role}: {text}")
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                arguments = json.dumps(tool_call["args"], ensure_ascii=False)
+                lines.append(f"{role}: called {tool_call['name']}({arguments})")
+    return "\n".join(lines)
@@ -1,29 +1,39 @@
-from langchain_community.document_loaders import WebBaseLoader
-from langchain_community.tools.tavily_search import TavilySearchResults
+import json
+import time
+from collections import OrderedDict
+
 from langchain_core.tools import tool
 from langchain_core.runnables import RunnableConfig
-from langchain_community.document_loaders import WebBaseLoader
-from typing import List, Annotated
+from typing import Any, List, Annotated, Union
 from langchain_core.tools.base import InjectedToolCallId
 from langchain_core.messages import ToolMessage
 from langchain_core.runnables import RunnableConfig
 from langgraph.types import Command
-from src.grant_writing_agent.prompts import (
-    grade_document_prompt,
-    extract_project_idea_and_funding_requirements_prompt,
+from src.grant_writing_agent.templates import format_conversation, get_template
+from src.grant_writing_agent.state import FundingRequirementsProjectIdea
+from src.grant_writing_agent.cache import (
+    get_web_search_cache,
+    normalize_text,
+    web_search_key,
 )
-from src.grant_writing_agent.state import GradeDocuments, FundingRequirementsProjectIdea
-from langchain_openai import ChatOpenAI
 from src.grant_writing_agent.configuration import Configuration
-from src.grant_writing_agent.utils import vector_store
-from langchain.retrievers.multi_query import MultiQueryRetriever
+from src.grant_writing_agent.grading import get_configured_grade_cache, grade_documents
+from src.grant_writing_agent.models import get_writer_model, get_structured_model
+from src.grant_writing_agent.resources import registry
+from src.grant_writing_agent.retrieval import (
+    aget_vector_index,
+    asimilarity_search_many_with_score,
+)
+from src.grant_writing_agent.context import aget_encoding, truncate_to_tokens
+from src.grant_writing_agent.metrics import record
+from src.grant_writing_agent.utils import (
+    chunk_id,
+    deduplicate_and_format_sources,
+    join_within_budget,
+)
 from langgraph.prebuilt import InjectedState, InjectedStore
 
 
-# Set writer model
-writer_model = ChatOpenAI(model=Configuration.writer_model, temperature=0)
-
-
 @tool
 async def generate_sections(
     tool_call_id: Annotated[str, InjectedToolCallId],
@@ -42,13 +52,15 @@ async def generate_sections(
     configurable = Configuration.from_runnable_config(config)
     user_name = configurable.user_name
 
-    system_message = extract_project_idea_and_funding_requirements_prompt.format(
-        conversation=messages, user_name=user_name
-    )
+    system_message = get_template(
+        "extract_project_idea_and_funding_requirements_prompt"
+    ).render(conversation=format_conversation(messages), user_name=user_name)
 
-    structured_llm = writer_model.with_structured_output(FundingRequirementsProjectIdea)
+    structured_llm = get_structured_model(
+        get_writer_model(configurable), FundingRequirementsProjectIdea
+    )
 
-    project_idea_x_funding_requirements = structured_llm.invoke(system_message)
+    project_idea_x_funding_requirements = await structured_llm.ainvoke(system_message)
 
     funding_requirements = project_idea_x_funding_requirements.funding_requirements
     project_idea = project_idea_x_funding_requirements.project_idea
@@ -57,6 +69,8 @@ async def generate_sections(
         update={
             "project_idea": project_idea,
             "funding_requirements": funding_requirements,
+            # The planner changes the sections the feedback is about, and keeps the others
+            "feedback_on_sections": project_idea_x_funding_requirements.feedback_on_sections,
             "start_writing_sections": True,
             # update the message history
             "messages": [
@@ -69,51 +83,123 @@ async def generate_sections(
     )
 
 
+# Depth of the Tavily searches, part of the cache key of their results
+TAVILY_SEARCH_DEPTH = "advanced"
+
+
+def _create_tavily_search(max_results: int):
+    """Create the Tavily search tool returning at most `max_results` results"""
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    # The answer and images are only in the tool's artifact, which the assistant
+    # never sees, so they are not requested
+    return TavilySearchResults(
+        max_results=max_results,
+        search_depth=TAVILY_SEARCH_DEPTH,
+        include_raw_content=True,
+    )
+
+
+registry.register("tavily_search_factory", lambda: _create_tavily_search)
+
+_tavily_searches: dict[tuple, Any] = {}
+
+
+def _get_tavily_search(max_results: int):
+    """Get the Tavily search tool for `max_results`, created once per factory"""
+    factory = registry.get("tavily_search_factory")
+    key = (factory, max_results)
+    if key not in _tavily_searches:
+        _tavily_searches[key] = factory(max_results)
+    return _tavily_searches[key]
+
+
+async def _asearch_web(query: str, configurable: Configuration) -> Union[list, str]:
+    """Search the web with Tavily, reusing the results of the same search if cached.
+
+    Returns:
+        The results (dicts with a title, URL, content and raw content), or the error
+        message of a failed search.
+    """
+    cache = None
+    if configurable.web_search_cache_enabled:
+        cache = get_web_search_cache(
+            configurable.web_search_cache_path,
+            configurable.web_search_cache_max_entries,
+            configurable.web_search_cache_ttl_seconds,
+        )
+        key = web_search_key(query, TAVILY_SEARCH_DEPTH, configurable.max_web_results)
+        cached = await cache.aget(key)
+        if cached is not None:
+            record("web_searches_cached")
+            return json.loads(cached)
+
+    record("web_searches")
+    results = await _get_tavily_search(configurable.max_web_results).ainvoke(
+        {"query": query}
+    )
+
+    # Failed searches return their error message, which is not cached
+    if cache is not None and isinstance(results, list):
+        cache.set(key, json.dumps(results))
+        await cache.aflush()
+    return results
+
+
 # Tavily Search
 @tool
-def tavily_search(query: str, config: RunnableConfig) -> str:
+async def tavily_search(query: str, config: RunnableConfig) -> str:
     """Performs a web search using Tavily search engine.
 
     Args:
         query: The search query string.
 
     Returns:
-        JSON string with search results including answer, results list, raw content, and images.
+        The title, URL, snippet and an excerpt of the content of each result.
     """
 
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
-    max_web_results = configurable.max_web_results
-
-    tavily_search = TavilySearchResults(
-        max_results=max_web_results,
-        search_depth="advanced",
-        include_answer=True,
+    max_tokens = configurable.web_search_max_tokens
+
+    results = await _asearch_web(query, configurable)
+    if isinstance(results, str):
+        return results
+
+    # Give each result an even share of the budget, half of it for the page content
+    # and the rest for the title, URL and snippet
+    await aget_encoding(configurable.writer_model)
+    formatted = deduplicate_and_format_sources(
+        [{"results": results}],
+        max_tokens_per_source=max_tokens // max(len(results), 1) // 2,
         include_raw_content=True,
-        include_images=True,
+        model=configurable.writer_model,
     )
-
-    # Use invoke for operation
-    result = tavily_search.invoke({"query": query})
-    return result
+    return truncate_to_tokens(formatted, max_tokens, configurable.writer_model)
 
 
 # Web Scraping
 @tool
-def scrape_webpages(urls: List[str]) -> str:
-    """Use requests and bs4 to scrape the provided web pages for detailed information."""
-    loader = WebBaseLoader(urls)
-    docs = loader.aload()  # Use aload for operation
-    return "\n\n".join(
-        [
-            f'<Document name="{doc.metadata.get("title", "")}">\n{doc.page_content}\n</Document>'
-            for doc in docs
-        ]
-    )
+async def scrape_webpages(urls: List[str], config: RunnableConfig) -> str:
+    """Scrape the provided web pages for detailed information.
+
+    Args:
+        urls: The URLs of the web pages.
+
+    Returns:
+        The title and main text of each page.
+    """
+    from src.grant_writing_agent.scraping import ascrape_pages, format_page
+
+    # Get configuration
+    configurable = Configuration.from_runnable_config(config)
+
+    pages = await ascrape_pages(urls, configurable)
+    return "\n\n".join(format_page(page) for page in pages)
 
 
 @tool
-def retrieve_client_info(query: str, config: RunnableConfig) -> str:
+async def retrieve_client_info(query: str, config: RunnableConfig) -> str:
     """
     Retrieve information about the client from the vector database.
 
@@ -127,47 +213,103 @@ def retrieve_client_info(query: str, config: RunnableConfig) -> str:
     # Get configuration
     configurable = Configuration.from_runnable_config(config)
     document_ids = configurable.context_document_ids
-    max_search_depth = configurable.max_search_depth
-    max_vector_results = configurable.max_vector_results
     client_id = configurable.client_id
-
-    for attempt in range(max_search_depth):
-        # Retrieve documents from vector store
-        if document_ids:
-            docs = vector_store.similarity_search(
-                query=query,
-                k=max_vector_results,
-                pre_filter={"document_id": {"$in": document_ids}},
-            )
+    thread_id = config.get("configurable", {}).get("thread_id")
+
+    # Retrieve documents from vector store
+    if document_ids:
+        pre_filter = {"document_id": {"$in": document_ids}}
+    else:
+        pre_filter = {"client_id": client_id}
+
+    # Reuse the chunks retrieved for the same query in this thread, unless they are
+    # old enough for the client's documents to have changed since
+    cache_key = (
+        thread_id,
+        json.dumps(pre_filter, sort_keys=True),
+        normalize_text(query),
+    )
+    chunks = None
+    if thread_id and cache_key in _client_info_results:
+        cached_chunks, retrieved_at = _client_info_results[cache_key]
+        if time.monotonic() - retrieved_at < configurable.client_info_cache_ttl_seconds:
+            chunks = cached_chunks
+            _client_info_results.move_to_end(cache_key)
         else:
-            docs = vector_store.similarity_search(
-                query=query, k=max_vector_results, pre_filter={"client_id": client_id}
-            )
+            del _client_info_results[cache_key]
 
-        all_docs = []
+    if chunks is None:
+        chunks = await _retrieve_relevant_chunks(query, pre_filter, configurable)
+        if thread_id:
+            _client_info_results[cache_key] = (chunks, time.monotonic())
+            if len(_client_info_results) > CLIENT_INFO_CACHE_MAX_ENTRIES:
+                _client_info_results.popitem(last=False)
 
-        # Grade documents
-        for doc in docs:
-            doc_content = doc.page_content
+    # If documents were found, return them
+    if chunks:
+        return join_within_budget(chunks, configurable.client_info_max_chars)
 
-            # Grade documents
-            grade_prompt = grade_document_prompt.format(
-                question=query, document=doc_content
-            )
+    return "No relevant document is found to answer the question.Please provide a document that will help answer the question."
 
-            structured_llm_grader = writer_model.with_structured_output(GradeDocuments)
 
-            score = structured_llm_grader.invoke(grade_prompt)
+# Relevant chunks already retrieved by `retrieve_client_info` (and when), per thread
+# and query
+CLIENT_INFO_CACHE_MAX_ENTRIES = 1024
+_client_info_results: OrderedDict[tuple, tuple[list[str], float]] = OrderedDict()
 
-            if score.binary_score == "yes":
-                all_docs.extend(docs)
-            else:
-                continue
 
-        # If documents were found, return them
-        if all_docs:
-            return "\n\n".join(doc.page_content for doc in all_docs)
+async def _retrieve_relevant_chunks(
+    query: str, pre_filter: dict, configurable: Configuration
+) -> list[str]:
+    """Search the client documents for a query and keep the relevant unique chunks.
 
-        # If this was the last attempt and no documents were found
-        if attempt == max_search_depth - 1:
-            return "No relevant document is found to answer the question.Please provide a document that will help answer the question."
+    Each attempt searches deeper (`max_vector_results` more documents) and only grades
+    the documents not graded yet, until relevant documents are found or
+    `max_search_depth` attempts were made.
+    """
+    index = await aget_vector_index(configurable)
+    graded = set()
+    relevant_chunks = {}
+
+    for attempt in range(configurable.max_search_depth):
+        [docs_and_scores] = await asimilarity_search_many_with_score(
+            [query],
+            k=configurable.max_vector_results * (attempt + 1),
+            pre_filter=pre_filter,
+            index=index,
+        )
+
+        # Only grade each unique chunk once
+        candidates = []
+        for doc, score in docs_and_scores:
+            key = chunk_id(doc.page_content)
+            if key not in graded:
+                graded.add(key)
+                candidates.append((key, doc, score))
+        if not candidates:
+            break
+
+        # Grade the documents concurrently
+        grades = await grade_documents(
+            get_writer_model(configurable),
+            [(query, doc) for _, doc, _ in candidates],
+            max_concurrency=configurable.max_concurrent_gradings,
+            batch_size=(
+                configurable.document_grading_batch_size
+                if configurable.batch_document_grading
+                else None
+            ),
+            cache=get_configured_grade_cache(configurable),
+            scores=[score for _, _, score in candidates],
+            auto_accept_score=configurable.auto_accept_score,
+            auto_reject_score=configurable.auto_reject_score,
+        )
+
+        for (key, doc, _), is_relevant in zip(candidates, grades):
+            if is_relevant:
+                relevant_chunks[key] = doc.page_content
+
+        if relevant_chunks:
+            break
+
+    return list(relevant_chunks.values())
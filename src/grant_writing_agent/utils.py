@@ -1,24 +1,18 @@
-import os
-import asyncio
-import requests
+import hashlib
 
+from src.grant_writing_agent.context import truncate_to_tokens
 from src.grant_writing_agent.state import Section
-from langsmith import traceable
-from langchain_mongodb import MongoDBAtlasVectorSearch
-from pymongo import MongoClient
-from langchain_openai import ChatOpenAI
-from langchain_openai import OpenAIEmbeddings
-from langchain.retrievers.multi_query import MultiQueryRetriever
-from langchain_core.runnables import RunnableConfig
-from src.grant_writing_agent.configuration import Configuration
 
 
 def deduplicate_and_format_sources(
-    search_response, max_tokens_per_source, include_raw_content=True
+    search_response,
+    max_tokens_per_source,
+    include_raw_content=True,
+    model="gpt-4o-mini",
 ):
     """
     Takes a list of search responses and formats them into a readable string.
-    Limits the raw_content to approximately max_tokens_per_source.
+    Limits the raw_content to max_tokens_per_source tokens of the model's tokenizer.
 
     Args:
         search_responses: List of search response dicts, each containing:
@@ -31,6 +25,7 @@ def deduplicate_and_format_sources(
                 - raw_content: str|None
         max_tokens_per_source: int
         include_raw_content: bool
+        model: str, the model whose tokenizer counts the tokens
 
     Returns:
         str: Formatted string with deduplicated sources
@@ -52,15 +47,14 @@ def deduplicate_and_format_sources(
             f"Most relevant content from source: {source['content']}\n===\n"
         )
         if include_raw_content:
-            # Using rough estimate of 4 characters per token
-            char_limit = max_tokens_per_source * 4
             # Handle None raw_content
             raw_content = source.get("raw_content", "")
             if raw_content is None:
                 raw_content = ""
                 print(f"Warning: No raw_content found for source {source['url']}")
-            if len(raw_content) > char_limit:
-                raw_content = raw_content[:char_limit] + "... [truncated]"
+            truncated = truncate_to_tokens(raw_content, max_tokens_per_source, model)
+            if len(truncated) < len(raw_content):
+                raw_content = truncated + "... [truncated]"
             formatted_text += f"Full source content limited to {max_tokens_per_source} tokens: {raw_content}\n\n"
 
     return formatted_text.strip()
@@ -86,33 +80,101 @@ Content:
     return formatted_str
 
 
-embeddings = OpenAIEmbeddings(model="text-embedding-3-large")
+def format_section_plan(sections: list[Section]) -> str:
+    """Format the names and descriptions of the sections of the current draft"""
+    if not sections:
+        return "None, this is the first draft."
+    return "\n".join(
+        f"<section>\nName: {section.name}\nDescription: {section.description}\n</section>"
+        for section in sections
+    )
 
-MONGODB_URI = os.getenv("MONGODB_URI")
 
-# initialize MongoDB python client
-client = MongoClient(MONGODB_URI)
+def compile_sections(sections: list[Section]) -> str:
+    """Join the content of the written sections, in plan order"""
+    return "".join(
+        f"\n\n{section.content}" for section in sections if section.is_written
+    )
 
-DB_NAME = "vector_store"
-COLLECTION_NAME = "client_docs_vector_store"
-ATLAS_VECTOR_SEARCH_INDEX_NAME = "client_docs_vector_index"
 
-MONGODB_COLLECTION = client[DB_NAME][COLLECTION_NAME]
+def _hash(*parts: str) -> str:
+    return hashlib.sha256("\0".join(part or "" for part in parts).encode()).hexdigest()
 
-vector_store = MongoDBAtlasVectorSearch(
-    collection=MONGODB_COLLECTION,
-    embedding=embeddings,
-    index_name=ATLAS_VECTOR_SEARCH_INDEX_NAME,
-    text_key="text",
-    embedding_key="embedding",
-    relevance_score_fn="cosine",
-)
 
+def chunk_id(content: str) -> str:
+    """Content-addressed ID of a document chunk"""
+    return _hash(content)[:16]
 
-llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
 
+def join_within_budget(
+    texts: list[str], max_chars: int, separator: str = "\n\n"
+) -> str:
+    """Join texts, in order, keeping the result within `max_chars` characters.
 
-# retriever = vector_store.as_retriever(search_kwargs={"k": 6, "lambda_mult": 0.25})
+    Texts that don't fit are dropped; the first one is truncated if it alone is over
+    the budget.
+    """
+    joined = []
+    size = 0
+    for text in texts:
+        added = len(text) + (len(separator) if joined else 0)
+        if size + added > max_chars:
+            if not joined:
+                joined.append(text[:max_chars])
+            break
+        joined.append(text)
+        size += added
+    return separator.join(joined)
+
+
+def rename_duplicate_sections(sections: list[Section]) -> list[Section]:
+    """Number the sections sharing a name, e.g. a second "Budget" becomes "Budget (2)".
+
+    Sections are merged by name in the state, so two planned sections with the same
+    name would otherwise collapse into one.
+    """
+    seen: dict[str, int] = {}
+    renamed = []
+    for section in sections:
+        seen[section.name] = seen.get(section.name, 0) + 1
+        if seen[section.name] > 1:
+            section = section.model_copy(
+                update={"name": f"{section.name} ({seen[section.name]})"}
+            )
+        renamed.append(section)
+    return renamed
+
+
+def section_fingerprint(section: Section) -> str:
+    """Hash the inputs of a section (its name and description)"""
+    return _hash(section.name, section.description)
+
+
+def proposal_inputs_hash(grant_proposal_structure: str, about_client: str) -> str:
+    """Hash the configured inputs shared by all the sections of a proposal.
 
-# # Create a MultiQueryRetriever that generates multiple queries
-# multi_query_retriever = MultiQueryRetriever.from_llm(retriever=retriever, llm=llm)
+    The project idea and funding requirements are left out: they are extracted from the
+    conversation again on every planning pass, so their wording changes between turns.
+    The planner keeps the description of the sections they do not affect instead.
+    """
+    return _hash(grant_proposal_structure, about_client)
+
+
+def reuse_unchanged_sections(
+    previous_sections: list[Section], planned_sections: list[Section]
+) -> list[Section]:
+    """Replace the planned sections whose inputs did not change by their written version.
+
+    Sections are matched by fingerprint (name and description). Matched sections keep
+    their content, search queries and retrieved documents, so only the new or changed
+    sections are researched and written again.
+    """
+    written_sections = {
+        section_fingerprint(section): section
+        for section in previous_sections
+        if section.is_written
+    }
+    return [
+        written_sections.get(section_fingerprint(section), section)
+        for section in planned_sections
+    ]
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.grant_writing_agent.context import OFFLINE_ENV_VAR
+from src.grant_writing_agent.models import clear_model_cache
+from src.grant_writing_agent.resources import registry
+
+# Estimate the tokens instead of downloading the tiktoken encodings
+os.environ.setdefault(OFFLINE_ENV_VAR, "1")
+
+LAST_MODIFIED = "Wed, 01 Oct 2025 08:00:00 GMT"
+
+
+def make_page(title: str, text: str) -> bytes:
+    """An HTML page with its text among navigation, scripts and a footer."""
+    return (
+        f"<html><head><title>{title}</title><script>var tracking = 1;</script>"
+        f"</head><body><nav>Home | Grants | Contact</nav>"
+        f"<main><h1>{title}</h1><p>{text}</p></main>"
+        f"<footer>Copyright</footer></body></html>"
+    ).encode()
+
+
+class PageServer:
+    """Local HTTP server for the scraping tests, recording the requests it serves.
+
+    Paths:
+        /etag/<name>: HTML page with an ETag, 304 when it matches If-None-Match.
+        /modified/<name>: HTML page with a Last-Modified date, 304 when it matches
+            If-Modified-Since.
+        /plain/<name>: Plain text page.
+        /pdf/<name>: A PDF.
+        /big/<name>: HTML page of `big_page_bytes` bytes.
+        /drip/<name>: HTML page sent a byte every 50 ms.
+    Pages wait `latency_seconds` before answering.
+    """
+
+    def __init__(self):
+        self.latency_seconds = 0.0
+        self.big_page_bytes = 2 * 2**20
+        self.requests: list[tuple[str, dict[str, str]]] = []
+        self.not_modified = 0
+        self.max_active: dict[str, int] = {}
+        self._active: dict[str, int] = {}
+        self._lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                host = self.headers.get("Host", "")
+                with server._lock:
+                    server.requests.append((self.path, dict(self.headers)))
+                    server._active[host] = server._active.get(host, 0) + 1
+                    server.max_active[host] = max(
+                        server.max_active.get(host, 0), server._active[host]
+                    )
+                try:
+                    time.sleep(server.latency_seconds)
+                    server.respond(self)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with server._lock:
+                        server._active[host] -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def url(self, path: str, host: str = "127.0.0.1") -> str:
+        return f"http://{host}:{self.port}{path}"
+
+    def respond(self, handler: BaseHTTPRequestHandler) -> None:
+        kind, _, name = handler.path.strip("/").partition("/")
+        headers = {"Content-Type": "text/html; charset=utf-8"}
+        body = make_page(f"Page {name}", f"Text of {name}.")
+
+        if kind == "etag":
+            headers["ETag"] = f'"{name}-v1"'
+            if handler.headers.get("If-None-Match") == headers["ETag"]:
+                return self._not_modified(handler, headers)
+        elif kind == "modified":
+            headers["Last-Modified"] = LAST_MODIFIED
+            if handler.headers.get("If-Modified-Since") == LAST_MODIFIED:
+                return self._not_modified(handler, headers)
+        elif kind == "plain":
+            headers["Content-Type"] = "text/plain; charset=utf-8"
+            body = f"Text of {name}.".encode()
+        elif kind == "pdf":
+            headers["Content-Type"] = "application/pdf"
+            body = b"%PDF-1.4 " + b"0" * 1000
+        elif kind == "big":
+            body = b"<html><body><main><p>" + b"grant " * (self.big_page_bytes // 6)
+        elif kind == "drip":
+            handler.send_response(200)
+            handler.send_header("Content-Type", "text/html")
+            handler.end_headers()
+            for byte in body:
+                handler.wfile.write(bytes([byte]))
+                handler.wfile.flush()
+                time.sleep(0.05)
+            return
+
+        handler.send_response(200)
+        for key, value in headers.items():
+            handler.send_header(key, value)
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    def _not_modified(self, handler: BaseHTTPRequestHandler, headers: dict) -> None:
+        with self._lock:
+            self.not_modified += 1
+        handler.send_response(304)
+        for key, value in headers.items():
+            if key != "Content-Type":
+                handler.send_header(key, value)
+        handler.end_headers()
+
+    def close(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def page_server():
+    server = PageServer()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def reset_resources():
+    """Forget the shared resources (clients, fakes) created or overridden by a test."""
+    yield registry
+    registry.reset()
+    clear_model_cache()
@@ -0,0 +1,131 @@
+import sqlite3
+import time
+
+from src.grant_writing_agent.cache import (
+    GradeCache,
+    PersistentLRUCache,
+    web_search_key,
+)
+
+
+def disk_rows(path: str, table: str = "cache") -> dict:
+    connection = sqlite3.connect(path)
+    rows = connection.execute(f"SELECT key, value, accessed_at FROM {table}")
+    return {key: (value, accessed_at) for key, value, accessed_at in rows}
+
+
+def test_memory_tier_evicts_the_least_recently_used():
+    cache = PersistentLRUCache(max_memory_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.get("a")
+    cache.set("c", "3")
+
+    assert cache.get_many(["a", "b", "c"]) == {"a": "1", "c": "3"}
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2}
+
+
+def test_entries_expire(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PersistentLRUCache(path, ttl_seconds=0.05)
+    cache.set("a", "1")
+    cache.flush()
+    time.sleep(0.1)
+
+    assert cache.get("a") is None
+    # Read from disk by a new process, then deleted on flush
+    reopened = PersistentLRUCache(path)
+    assert reopened.get("a") is None
+    reopened.flush()
+    assert disk_rows(path) == {}
+
+
+def test_writes_wait_for_flush(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PersistentLRUCache(path)
+    cache.set("a", "1")
+    cache.set("b", b"\x00\x01")
+
+    assert disk_rows(path) == {}
+    cache.flush()
+    assert {key: value for key, (value, _) in disk_rows(path).items()} == {
+        "a": "1",
+        "b": b"\x00\x01",
+    }
+    assert PersistentLRUCache(path).get_many(["a", "b", "c"]) == {
+        "a": "1",
+        "b": b"\x00\x01",
+    }
+
+
+def test_pending_writes_evicted_from_memory_are_found(tmp_path):
+    cache = PersistentLRUCache(str(tmp_path / "cache.sqlite"), max_memory_entries=1)
+    cache.set("a", "1")
+    cache.set("b", "2")
+
+    assert cache.get("a") == "1"
+
+
+def test_memory_hits_refresh_the_access_time_on_disk(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PersistentLRUCache(path)
+    cache.set("a", "1")
+    cache.flush()
+    written_at = disk_rows(path)["a"][1]
+
+    time.sleep(0.01)
+    assert cache.get("a") == "1"  # From memory
+    cache.flush()
+
+    assert disk_rows(path)["a"][1] > written_at
+
+
+def test_disk_tier_evicts_the_least_recently_used(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PersistentLRUCache(path, max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    cache.flush()
+    time.sleep(0.01)
+    cache.get("a")
+    cache.set("c", "3")
+    cache.flush()
+
+    assert set(disk_rows(path)) == {"a", "c"}
+
+
+async def test_async_lookups_and_flush(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = PersistentLRUCache(path)
+    cache.set("a", "1")
+    await cache.aflush()
+
+    reopened = PersistentLRUCache(path)
+    assert await reopened.aget_many(["a", "b"]) == {"a": "1"}
+    assert await reopened.aget("b") is None
+    assert reopened.stats() == {"hits": 1, "misses": 2, "size": 1}
+
+
+async def test_grade_cache_keys_normalize_the_question():
+    cache = GradeCache(PersistentLRUCache())
+    cache.set("Forest  Projects", "chunk", "gpt-4o-mini", True)
+    cache.set("forest projects", "other chunk", "gpt-4o-mini", False)
+
+    assert await cache.aget_many(
+        [
+            ("forest projects", "chunk"),
+            ("FOREST PROJECTS", "other chunk"),
+            ("forest projects", "new chunk"),
+        ],
+        "gpt-4o-mini",
+    ) == [True, False, None]
+    assert cache.get("forest projects", "chunk", "gpt-4o") is None
+
+
+def test_web_search_keys():
+    assert web_search_key("Climate  Funders", "advanced", 5) == web_search_key(
+        "climate funders", "advanced", 5
+    )
+    assert web_search_key("climate funders", "advanced", 5) != web_search_key(
+        "climate funders", "advanced", 10
+    )
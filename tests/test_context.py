@@ -0,0 +1,48 @@
+import asyncio
+import time
+
+import pytest
+
+from src.grant_writing_agent import context
+from src.grant_writing_agent.context import aget_encoding, count_tokens
+
+
+@pytest.fixture
+def encodings(monkeypatch):
+    """Start with no encoding loaded."""
+    monkeypatch.setattr(context, "_encodings", {})
+    return context._encodings
+
+
+def test_offline_tokenizer_estimates_tokens(encodings, monkeypatch):
+    monkeypatch.setenv(context.OFFLINE_ENV_VAR, "1")
+
+    assert context.get_encoding("gpt-4o-mini") is None
+    assert count_tokens("x" * 10, "gpt-4o-mini") == 3
+
+
+async def test_slow_encoding_load_does_not_block_the_loop(encodings, monkeypatch):
+    encoding = object()
+
+    def slow_load(model):
+        time.sleep(0.3)
+        return encoding
+
+    monkeypatch.setattr(context, "_load_encoding", slow_load)
+    monkeypatch.setattr(context, "ENCODING_LOAD_TIMEOUT_SECONDS", 0.05)
+
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker = asyncio.create_task(tick())
+    # Tokens are estimated while the encoding loads, then counted with it
+    assert await aget_encoding("gpt-4o-mini") is None
+    assert ticks >= 3
+    await asyncio.sleep(0.4)
+    ticker.cancel()
+    assert await aget_encoding("gpt-4o-mini") is encoding
@@ -0,0 +1,111 @@
+from collections import Counter
+
+import pytest
+from langchain_core.documents import Document
+
+from benchmarks.fakes import FakeChatModel, FakeSettings
+from src.grant_writing_agent.cache import GradeCache, PersistentLRUCache
+from src.grant_writing_agent import grading
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.grading import (
+    calibrate_thresholds,
+    grade_documents,
+    pre_grade,
+)
+
+
+@pytest.mark.parametrize(
+    "score, grade",
+    [(None, None), (0.95, True), (0.9, True), (0.7, None), (0.55, False), (0.2, False)],
+)
+def test_pre_grade_thresholds(score, grade):
+    assert pre_grade(score, auto_accept_score=0.9, auto_reject_score=0.55) is grade
+
+
+@pytest.mark.parametrize(
+    "auto_accept_score, auto_reject_score", [(None, None), (1.01, -0.01)]
+)
+def test_pre_grade_tiers_can_be_turned_off(auto_accept_score, auto_reject_score):
+    for score in (0.0, 0.5, 1.0):
+        assert pre_grade(score, auto_accept_score, auto_reject_score) is None
+
+
+def test_pre_grading_is_off_by_default():
+    configurable = Configuration()
+
+    assert configurable.auto_accept_score is None
+    assert configurable.auto_reject_score is None
+
+
+@pytest.fixture
+def grader() -> FakeChatModel:
+    return FakeChatModel(settings=FakeSettings(llm_latency_ms=0))
+
+
+def candidates(count: int) -> list[tuple[str, Document]]:
+    return [
+        ("community forest projects", Document(page_content=f"Chunk {i}"))
+        for i in range(count)
+    ]
+
+
+async def test_conclusive_scores_skip_the_grader(grader):
+    grades = await grade_documents(
+        grader,
+        candidates(3),
+        scores=[0.95, 0.7, 0.3],
+        auto_accept_score=0.9,
+        auto_reject_score=0.55,
+    )
+
+    assert grades[0] is True and grades[2] is False
+    assert grader.calls == 1
+
+
+async def test_cached_grades_skip_the_grader(grader, tmp_path, monkeypatch):
+    recorded = Counter()
+    monkeypatch.setattr(
+        grading, "record", lambda metric, value=1: recorded.update({metric: value})
+    )
+    path = str(tmp_path / "grades.sqlite")
+    cache = GradeCache(PersistentLRUCache(path, table="grades"))
+
+    first = await grade_documents(grader, candidates(4), cache=cache)
+    # A new process reads the grades from disk
+    cache = GradeCache(PersistentLRUCache(path, table="grades"))
+    second = await grade_documents(grader, candidates(4), cache=cache)
+
+    assert second == first
+    assert grader.calls == 4
+    assert cache.stats()["hits"] == 4
+    assert recorded["grade_cache_hits"] == 4
+    assert recorded["grade_cache_misses"] == 4
+
+
+def test_thresholds_are_calibrated_for_a_precision():
+    graded = [(score / 100, score >= 70) for score in range(40, 100)]
+    # One irrelevant document among the high scores, one relevant among the low ones
+    graded += [(0.95, False), (0.45, True)]
+
+    assert calibrate_thresholds(graded, precision=0.95, min_documents=10) == (
+        0.7,
+        0.69,
+    )
+    assert calibrate_thresholds(graded, precision=0.95, min_documents=100) == (
+        None,
+        None,
+    )
+
+
+async def test_grades_are_cached_with_their_vector_score(grader, tmp_path):
+    path = str(tmp_path / "grades.sqlite")
+    cache = GradeCache(PersistentLRUCache(path, table="grades"))
+    cache.set("forest", "Chunk", "grader", True)  # Graded without a score
+
+    grades = await grade_documents(
+        grader, candidates(2), cache=cache, scores=[0.8, 0.6]
+    )
+
+    cache = GradeCache(PersistentLRUCache(path, table="grades"))
+    assert sorted(cache.scored_grades()) == sorted(zip([0.8, 0.6], grades))
+    assert cache.get("forest", "Chunk", "grader") is True
@@ -0,0 +1,134 @@
+import pytest
+from langchain_core.messages import HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+
+from benchmarks.fakes import FakeSettings, install_fakes
+from src.grant_writing_agent import graph as graph_module
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.graph import builder
+from src.grant_writing_agent.state import SearchQuery
+
+SECTIONS = 3
+
+
+@pytest.fixture
+def graph(reset_resources):
+    """The compiled graph, running against the local fakes."""
+    settings = FakeSettings(
+        sections=SECTIONS,
+        queries=2,
+        corpus_size=50,
+        llm_latency_ms=0,
+        embedding_latency_ms=0,
+        search_latency_ms=0,
+        web_search_latency_ms=0,
+    )
+    install_fakes(settings, Configuration().client_id)
+    return builder.compile(checkpointer=MemorySaver())
+
+
+def thread_config(tmp_path, **configurable) -> dict:
+    return {
+        "configurable": {
+            "thread_id": "proposal",
+            "grade_cache_enabled": False,
+            "web_search_cache_enabled": False,
+            "local_index_path": str(tmp_path / "index"),
+            **configurable,
+        },
+        "recursion_limit": 200,
+    }
+
+
+def llm_calls(output: dict, node: str) -> float:
+    return output["run_metrics"]["nodes"].get(node, {}).get("llm_calls", 0)
+
+
+@pytest.mark.parametrize(
+    "configurable",
+    [{}, {"slim_state_updates": True}, {"parallel_section_writing": True}],
+)
+async def test_second_pass_reuses_unchanged_sections(graph, tmp_path, configurable):
+    config = thread_config(tmp_path, **configurable)
+    first = await graph.ainvoke(
+        {"messages": [HumanMessage(content="Help me write a grant proposal")]}, config
+    )
+    state = (await graph.aget_state(config)).values
+    draft = state["final_grant_proposal"]
+
+    second = await graph.ainvoke(
+        {"messages": [HumanMessage(content="Update the proposal")]}, config
+    )
+    state = (await graph.aget_state(config)).values
+
+    assert all(section.is_written for section in state["sections"])
+    assert state["final_grant_proposal"] == draft
+    # The second run plans the sections again, but writes none of them
+    assert llm_calls(first, "generate_sections") == llm_calls(
+        second, "generate_sections"
+    )
+    if configurable.get("parallel_section_writing"):
+        nodes = ["section_generate_queries", "section_write"]
+    else:
+        nodes = ["generate_queries", "write_section"]
+    for node in nodes:
+        assert llm_calls(first, node) >= SECTIONS
+        assert llm_calls(second, node) == 0
+    assert second["run_metrics"]["nodes"]["generate_sections"]["sections_reused"] == (
+        SECTIONS
+    )
+
+
+async def test_planning_again_drops_unreferenced_chunks(graph, tmp_path):
+    config = thread_config(tmp_path)
+    await graph.ainvoke({"messages": [HumanMessage(content="Write it")]}, config)
+    await graph.aupdate_state(
+        config, {"document_store": {"stale": "Old chunk"}}, as_node="gather_requirement"
+    )
+
+    await graph.ainvoke({"messages": [HumanMessage(content="Update it")]}, config)
+    state = (await graph.aget_state(config)).values
+
+    referenced = {chunk for section in state["sections"] for chunk in section.documents}
+    assert referenced
+    assert state["document_store"].keys() == referenced
+
+
+async def test_sections_are_written_again_when_the_structure_changes(graph, tmp_path):
+    config = thread_config(tmp_path)
+    await graph.ainvoke({"messages": [HumanMessage(content="Write it")]}, config)
+
+    config["configurable"]["grant_proposal_structure"] = "1. Summary\n2. Budget"
+    second = await graph.ainvoke(
+        {"messages": [HumanMessage(content="Write it again")]}, config
+    )
+
+    assert llm_calls(second, "write_section") >= SECTIONS
+
+
+async def test_each_retrieval_attempt_searches_deeper(reset_resources, monkeypatch):
+    # No document is relevant, so every attempt is made
+    settings = FakeSettings(
+        relevance=0, corpus_size=50, embedding_latency_ms=0, search_latency_ms=0
+    )
+    fakes = install_fakes(settings, Configuration().client_id)
+    graded = []
+
+    async def grade_documents(grader_model, candidates, **kwargs):
+        graded.append([document.page_content for _, document in candidates])
+        return [False] * len(candidates)
+
+    monkeypatch.setattr(graph_module, "grade_documents", grade_documents)
+    configurable = Configuration(
+        max_search_depth=3, max_vector_results=2, grade_cache_enabled=False
+    )
+
+    documents = await graph_module._retrieve_section_documents(
+        [SearchQuery(search_query="forest restoration")], configurable
+    )
+
+    assert documents == {}
+    assert [len(attempt) for attempt in graded] == [2, 2, 2]
+    # No chunk is graded twice
+    assert len({text for attempt in graded for text in attempt}) == 6
+    assert fakes.collection.queries == 3
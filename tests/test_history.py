@@ -0,0 +1,115 @@
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from benchmarks.fakes import FakeChatModel, FakeSettings, fake_text
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.history import acompact_history, message_tokens
+
+
+@pytest.fixture
+def writer(reset_resources) -> FakeChatModel:
+    """The fake writer model the summaries are written with."""
+    writer = FakeChatModel(settings=FakeSettings(llm_latency_ms=0, section_words=30))
+    reset_resources.override("chat_model_factory", lambda *args: writer)
+    return writer
+
+
+def make_conversation(turns: int) -> list:
+    """Turns of a question, a web search with a long output and an answer."""
+    messages = []
+    for turn in range(turns):
+        call_id = f"call_{turn}"
+        messages += [
+            HumanMessage(content=fake_text(f"question {turn}", 40)),
+            AIMessage(
+                content="",
+                tool_calls=[
+                    {
+                        "name": "tavily_search",
+                        "args": {"query": "funders"},
+                        "id": call_id,
+                    }
+                ],
+            ),
+            ToolMessage(
+                content=fake_text(f"results {turn}", 600), tool_call_id=call_id
+            ),
+            AIMessage(content=fake_text(f"answer {turn}", 40)),
+        ]
+    return messages
+
+
+def tokens(messages: list) -> int:
+    return sum(message_tokens(message, "gpt-4o-mini") for message in messages)
+
+
+async def test_short_histories_are_sent_whole(writer):
+    messages = make_conversation(1)
+
+    history = await acompact_history(messages, "", 0, Configuration())
+
+    assert history.messages == messages
+    assert (history.summary, history.summarized_messages) == ("", 0)
+    assert writer.calls == 0
+
+
+async def test_earlier_tool_outputs_are_truncated(writer):
+    messages = make_conversation(3)
+    configurable = Configuration(history_tool_output_max_tokens=50)
+
+    history = await acompact_history(messages, "", 0, configurable)
+
+    tool_outputs = [m.content for m in history.messages if isinstance(m, ToolMessage)]
+    assert all(
+        text.endswith("[Truncated earlier tool output]") for text in tool_outputs[:2]
+    )
+    assert tool_outputs[2] == messages[-2].content
+    assert len(history.messages) == len(messages)
+    assert writer.calls == 0
+
+
+async def test_oldest_turns_are_folded_into_the_summary(writer):
+    messages = make_conversation(12)
+    configurable = Configuration(
+        history_max_tokens=2000,
+        history_tool_output_max_tokens=50,
+        history_summary_max_tokens=100,
+    )
+
+    history = await acompact_history(messages, "", 0, configurable)
+
+    assert writer.calls == 1
+    assert history.summary
+    assert history.summarized_messages > 0
+    # Turns are cut whole, before a user message
+    assert isinstance(history.messages[0], HumanMessage)
+    assert len(history.messages) == len(messages) - history.summarized_messages
+    assert history.messages[-1] == messages[-1]
+    assert tokens(history.messages) <= configurable.history_max_tokens
+
+    # The next turn reuses the summary instead of writing it again
+    messages += make_conversation(1)
+    again = await acompact_history(
+        messages, history.summary, history.summarized_messages, configurable
+    )
+    assert writer.calls == 1
+    assert again.summary == history.summary
+
+
+async def test_summaries_of_replaced_messages_are_dropped(writer):
+    messages = make_conversation(1)
+
+    history = await acompact_history(messages, "Old summary", 10, Configuration())
+
+    assert history.messages == messages
+    assert (history.summary, history.summarized_messages) == ("", 0)
+
+
+async def test_compaction_can_be_turned_off(writer):
+    messages = make_conversation(12)
+
+    history = await acompact_history(
+        messages, "", 0, Configuration(history_max_tokens=0)
+    )
+
+    assert history.messages == messages
@@ -0,0 +1,21 @@
+from src.grant_writing_agent.metrics import ResetRunMetrics, merge_run_metrics
+
+
+def test_merge_run_metrics_sums_counters():
+    left = {"nodes": {"write_section": {"llm_calls": 2}}, "sections": {}}
+    right = {
+        "nodes": {"write_section": {"llm_calls": 1, "prompt_tokens": 10}},
+        "sections": {"Budget": {"llm_calls": 1}},
+    }
+
+    assert merge_run_metrics(left, right) == {
+        "nodes": {"write_section": {"llm_calls": 3, "prompt_tokens": 10}},
+        "sections": {"Budget": {"llm_calls": 1}},
+    }
+
+
+def test_merge_run_metrics_starts_over_on_a_new_run():
+    previous_runs = {"nodes": {"write_section": {"llm_calls": 20}}, "sections": {}}
+    new_run = {"nodes": {"gather_requirement": {"llm_calls": 1}}, "sections": {}}
+
+    assert merge_run_metrics(previous_runs, ResetRunMetrics(new_run)) == new_run
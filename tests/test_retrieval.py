@@ -0,0 +1,38 @@
+from langchain_core.documents import Document
+
+from src.grant_writing_agent.retrieval import reciprocal_rank_fusion
+
+
+def docs(*texts: str, score: float = 0.8) -> list[tuple[Document, float]]:
+    return [(Document(page_content=text), score) for text in texts]
+
+
+def test_documents_found_by_several_queries_rank_first():
+    fused = reciprocal_rank_fusion(
+        ["mission", "impact"],
+        [docs("a", "b", "c"), docs("c", "d", "b")],
+    )
+
+    assert [doc.page_content for _, doc, _ in fused] == ["c", "b", "a", "d"]
+
+
+def test_documents_keep_the_query_that_ranked_them_highest():
+    fused = reciprocal_rank_fusion(
+        ["mission", "impact"],
+        [
+            [(Document(page_content="a"), 0.7), (Document(page_content="b"), 0.6)],
+            [(Document(page_content="b"), 0.9)],
+        ],
+    )
+
+    assert [(query, doc.page_content, score) for query, doc, score in fused] == [
+        ("impact", "b", 0.9),
+        ("mission", "a", 0.7),
+    ]
+
+
+def test_duplicate_chunks_are_counted_once_per_query():
+    fused = reciprocal_rank_fusion(["mission"], [docs("a", "a", "b")])
+
+    assert [doc.page_content for _, doc, _ in fused] == ["a", "b"]
+    assert reciprocal_rank_fusion([], []) == []
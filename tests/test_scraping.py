@@ -0,0 +1,133 @@
+import time
+
+import pytest
+
+from src.grant_writing_agent import scraping
+from src.grant_writing_agent.configuration import Configuration
+from src.grant_writing_agent.scraping import ascrape_pages, extract_text
+
+
+@pytest.fixture(autouse=True)
+async def scraping_client(reset_resources):
+    """A client per test, since each test runs on its own event loop."""
+    client = scraping._create_scraping_client()
+    reset_resources.override("scraping_http_client", client)
+    yield client
+    await client.aclose()
+
+
+@pytest.fixture
+def configurable(tmp_path) -> Configuration:
+    return Configuration(scrape_cache_path=str(tmp_path / "pages.sqlite"))
+
+
+def test_extract_text_strips_boilerplate():
+    html = b"""<html><head><title>Call for proposals</title>
+    <style>p { color: red; }</style><script>track();</script></head>
+    <body><header>Logo</header><nav>Home | About</nav>
+    <div role="navigation">Skip links</div>
+    <main><h1>Climate grants</h1><p>Up to   $50,000
+    for restoration.</p></main>
+    <aside>Related calls</aside><footer>Contact us</footer></body></html>"""
+
+    title, text = extract_text(html)
+
+    assert title == "Call for proposals"
+    assert text == "Climate grants\nUp to $50,000\nfor restoration."
+
+
+async def test_fresh_pages_are_served_from_the_cache(page_server, configurable):
+    urls = [page_server.url(f"/etag/{i}") for i in range(3)]
+
+    cold = await ascrape_pages(urls, configurable)
+    cached = await ascrape_pages(urls, configurable)
+
+    assert len(page_server.requests) == 3
+    assert [page.error for page in cold] == [None] * 3
+    assert not any(page.cached for page in cold)
+    assert all(page.cached for page in cached)
+    assert [page.text for page in cached] == [page.text for page in cold]
+    assert cold[0].title == "Page 0"
+    assert cold[0].text == "Page 0\nText of 0."
+
+
+@pytest.mark.parametrize(
+    "path, header, value",
+    [
+        ("/etag/call", "If-None-Match", '"call-v1"'),
+        ("/modified/call", "If-Modified-Since", "Wed, 01 Oct 2025 08:00:00 GMT"),
+    ],
+)
+async def test_stale_pages_are_revalidated(
+    page_server, configurable, path, header, value
+):
+    url = page_server.url(path)
+    [cold] = await ascrape_pages([url], configurable)
+
+    configurable.scrape_cache_fresh_seconds = 0
+    [revalidated] = await ascrape_pages([url], configurable)
+
+    assert len(page_server.requests) == 2
+    assert page_server.requests[1][1].get(header) == value
+    assert page_server.not_modified == 1
+    assert revalidated.cached
+    assert (revalidated.title, revalidated.text) == (cold.title, cold.text)
+
+
+async def test_requests_per_host_are_bounded(page_server, configurable):
+    page_server.latency_seconds = 0.1
+    configurable.scrape_max_concurrent_per_host = 2
+    urls = [
+        page_server.url(f"/etag/{i}", host)
+        for host in ("127.0.0.1", "localhost")
+        for i in range(6)
+    ]
+
+    pages = await ascrape_pages(urls, configurable)
+
+    assert [page.error for page in pages] == [None] * 12
+    assert page_server.max_active == {
+        f"127.0.0.1:{page_server.port}": 2,
+        f"localhost:{page_server.port}": 2,
+    }
+
+
+async def test_slow_pages_time_out(page_server, configurable):
+    # Each byte comes well within the timeout, the whole page does not
+    configurable.scrape_timeout_seconds = 0.3
+
+    start = time.perf_counter()
+    [page] = await ascrape_pages([page_server.url("/drip/slow")], configurable)
+
+    assert time.perf_counter() - start < 2
+    assert page.error.startswith("TimeoutError")
+    assert page.text == ""
+
+
+async def test_large_pages_are_cut(page_server, configurable, monkeypatch):
+    monkeypatch.setattr(scraping, "MAX_DOWNLOAD_BYTES", 64 * 1024)
+    configurable.scrape_max_page_tokens = 100_000
+
+    [page] = await ascrape_pages([page_server.url("/big/page")], configurable)
+
+    assert page.error is None
+    assert page.text.startswith("grant grant")
+    assert len(page.text) <= 64 * 1024
+
+
+async def test_non_text_pages_are_reported(page_server, configurable):
+    pdf, plain = await ascrape_pages(
+        [page_server.url("/pdf/report"), page_server.url("/plain/notes")],
+        configurable,
+    )
+
+    assert pdf.error == "Unsupported content type application/pdf"
+    assert pdf.text == ""
+    assert plain.error is None
+    assert plain.text == "Text of notes."
+
+
+async def test_unreachable_pages_are_reported(configurable):
+    [page] = await ascrape_pages(["http://127.0.0.1:9/missing"], configurable)
+
+    assert page.error.startswith("ConnectError")
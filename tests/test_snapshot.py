@@ -0,0 +1,49 @@
+import pytest
+
+from benchmarks.fakes import FakeSettings, install_fakes
+from src.grant_writing_agent import snapshot as snapshot_module
+from src.grant_writing_agent.snapshot import aget_client_snapshot
+
+CLIENTS = ["client-a", "client-b", "client-c"]
+
+
+@pytest.fixture
+def collection(reset_resources):
+    """A fake Atlas collection with the documents of a few clients."""
+    settings = FakeSettings(corpus_size=10, search_latency_ms=0)
+    fakes = install_fakes(settings, CLIENTS[0])
+    for client_id in CLIENTS[1:]:
+        fakes.collection.documents += [
+            {
+                **document,
+                "_id": f"{client_id}-{document['_id']}",
+                "client_id": client_id,
+            }
+            for document in fakes.collection.documents[:10]
+        ]
+    snapshot_module._snapshots.clear()
+    yield fakes.collection
+    snapshot_module._snapshots.clear()
+
+
+async def test_least_recently_used_snapshots_are_evicted(collection):
+    for client_id in CLIENTS:
+        await aget_client_snapshot(client_id, max_snapshots=2)
+    assert [key[0] for key in snapshot_module._snapshots] == CLIENTS[1:]
+
+    # A use makes a snapshot the most recently used
+    await aget_client_snapshot(CLIENTS[1], max_snapshots=2)
+    await aget_client_snapshot(CLIENTS[0], max_snapshots=2)
+    assert [key[0] for key in snapshot_module._snapshots] == [CLIENTS[1], CLIENTS[0]]
+
+
+async def test_idle_snapshots_are_evicted(collection, monkeypatch):
+    await aget_client_snapshot(CLIENTS[0], idle_seconds=60)
+    used_at = snapshot_module._snapshots[(CLIENTS[0], "float32")].used_at
+
+    monkeypatch.setattr(snapshot_module.time, "monotonic", lambda: used_at + 61)
+    queries = collection.queries
+    await aget_client_snapshot(CLIENTS[1], idle_seconds=60)
+
+    assert [key[0] for key in snapshot_module._snapshots] == [CLIENTS[1]]
+    assert collection.queries - queries == 2  # The new client is fingerprinted and read
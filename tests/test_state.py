@@ -0,0 +1,99 @@
+from src.grant_writing_agent.state import (
+    ReplaceDocuments,
+    ReplaceSections,
+    Section,
+    merge_sections,
+    update_document_store,
+    update_sections,
+)
+from src.grant_writing_agent.utils import rename_duplicate_sections
+
+
+def make_section(name: str, content: str = "", is_written: bool = False) -> Section:
+    return Section(
+        name=name,
+        description=f"About {name}",
+        research=True,
+        content=content,
+        is_written=is_written,
+        is_active=False,
+        search_queries=[],
+        documents=[],
+        source_str="",
+    )
+
+
+def names_and_contents(sections: list[Section]) -> list[tuple[str, str]]:
+    return [(section.name, section.content) for section in sections]
+
+
+def test_merge_sections_replaces_by_name_in_first_order():
+    left = [make_section("Summary"), make_section("Budget")]
+    right = [make_section("Budget", "v2"), make_section("Impact", "v1")]
+
+    merged = merge_sections(left, right)
+
+    assert names_and_contents(merged) == [
+        ("Summary", ""),
+        ("Budget", "v2"),
+        ("Impact", "v1"),
+    ]
+
+
+def test_merge_sections_handles_missing_sides():
+    sections = [make_section("Summary")]
+
+    assert merge_sections(None, sections) == sections
+    assert merge_sections(sections, None) == sections
+    assert merge_sections(None, None) == []
+
+
+def test_update_sections_merges_partial_updates():
+    sections = [make_section("Summary"), make_section("Budget")]
+
+    updated = update_sections(sections, [make_section("Summary", "written", True)])
+
+    assert names_and_contents(updated) == [("Summary", "written"), ("Budget", "")]
+    assert updated[0].is_written
+
+
+def test_update_sections_replaces_the_whole_plan():
+    sections = [make_section("Summary", "old"), make_section("Budget", "old")]
+    planned = [make_section("Budget"), make_section("Timeline")]
+
+    updated = update_sections(sections, ReplaceSections(sections=planned))
+
+    assert names_and_contents(updated) == [("Budget", ""), ("Timeline", "")]
+
+
+def test_update_sections_keeps_sections_sharing_a_name():
+    sections = [make_section("Summary"), make_section("Budget"), make_section("Budget")]
+
+    updated = update_sections(sections, ReplaceSections(sections=sections))
+
+    assert len(updated) == 3
+
+
+def test_duplicate_section_names_are_numbered():
+    sections = rename_duplicate_sections(
+        [make_section("Budget"), make_section("Summary"), make_section("Budget")]
+    )
+
+    assert [section.name for section in sections] == ["Budget", "Summary", "Budget (2)"]
+    # Partial updates of the renamed plan are merged into the right sections
+    written = sections[2].model_copy(update={"content": "written"})
+    assert names_and_contents(update_sections(sections, [written])) == [
+        ("Budget", ""),
+        ("Summary", ""),
+        ("Budget (2)", "written"),
+    ]
+
+
+def test_update_document_store_adds_and_replaces_chunks():
+    store = update_document_store(None, {"a": "mission"})
+    store = update_document_store(store, {"b": "impact"})
+    assert store == {"a": "mission", "b": "impact"}
+
+    assert update_document_store(
+        store, ReplaceDocuments(documents={"b": "impact"})
+    ) == {"b": "impact"}
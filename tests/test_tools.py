@@ -0,0 +1,36 @@
+from collections import OrderedDict
+
+import pytest
+
+from src.grant_writing_agent import tools
+from src.grant_writing_agent.tools import retrieve_client_info
+
+
+@pytest.fixture
+def retrievals(monkeypatch) -> list[str]:
+    """Queries searched in the client documents, answered with a fixed chunk."""
+    queries = []
+
+    async def retrieve_relevant_chunks(query, pre_filter, configurable):
+        queries.append(query)
+        return ["Chunk about the forest project"]
+
+    monkeypatch.setattr(tools, "_retrieve_relevant_chunks", retrieve_relevant_chunks)
+    monkeypatch.setattr(tools, "_client_info_results", OrderedDict())
+    return queries
+
+
+@pytest.mark.parametrize("ttl_seconds, searches", [(300, 1), (0, 2)])
+async def test_client_info_is_reused_within_its_ttl(retrievals, ttl_seconds, searches):
+    config = {
+        "configurable": {
+            "thread_id": "proposal",
+            "client_info_cache_ttl_seconds": ttl_seconds,
+        }
+    }
+
+    for query in ["Forest project", "forest  PROJECT"]:
+        result = await retrieve_client_info.ainvoke({"query": query}, config)
+        assert result == "Chunk about the forest project"
+
+    assert len(retrievals) == searches